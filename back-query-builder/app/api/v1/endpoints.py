@@ -1,23 +1,100 @@
 import time
+import asyncio
 import asyncpg
+import datetime
+import httpx
 import logging
-import hashlib
 import json
-
-from fastapi import APIRouter, Depends, HTTPException
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
-from app.api.v1.schemas import QueryRequest, QueryResponse, DefinitionsResponse
+from app.api.v1.schemas import (
+    QueryRequest,
+    QueryResponse,
+    DefinitionsResponse,
+    ColumnarQueryResponse,
+    ArrowFormat,
+    BatchQueryRequest,
+    BatchQueryResponse,
+    ResponseFormat,
+    StreamFormat,
+)
 from app.services.ai_translator import AITranslator
 from app.core.config import settings
-from app.services.query_engine import QueryBuilder
+from app.core.http_client import get_http_client
+from app.core.tracing import stage
+from app.services.query_engine import QueryBuilder, plan_cache
 from app.services.semantic_layer import METRICS, DIMENSIONS
-from app.core.database import get_db_connection
+from app.services.rollup_refresh import rollup_refresh_stats
+from app.services.arrow_export import (
+    arrow_available,
+    build_table,
+    to_ipc_stream,
+    to_parquet,
+)
+from app.services.single_flight import SingleFlight
+from app.services.slow_query_log import slow_query_log
+from app.services import index_advisor
+from app.services.admission import (
+    QueryClass,
+    QueryRejectedError,
+    admission_stats,
+    admitted_connection,
+)
+from app.services.query_fusion import fuse_requests, plan_fusion, split_rows
+from app.services.result_formats import (
+    compress,
+    encode_columnar,
+    encode_csv,
+    encode_json,
+    encode_ndjson,
+    negotiate_encoding,
+    rows_from_records,
+)
+from app.services.result_cache import (
+    ResultCache,
+    canonical_request_key,
+    request_date_bounds,
+)
+from app.core.database import (
+    ConnectionFactory,
+    get_connection_factory,
+    read_connection,
+    pool_scheduler,
+    replica_router,
+    fetch_rows,
+    prepared_statement_stats,
+)
 
 from app.services.insight_generator import InsightGenerator
 
 
 router = APIRouter(prefix="/v1", tags=["Query Engine"])
 
+result_cache = ResultCache(
+    max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+    max_bytes=settings.RESULT_CACHE_MAX_BYTES,
+    default_ttl=settings.RESULT_CACHE_TTL_SECONDS,
+    stale_ttl=settings.RESULT_CACHE_STALE_SECONDS,
+)
+
+_background_tasks: Set[asyncio.Task] = set()
+
+query_flights = SingleFlight()
+
+COLUMNAR_MEDIA_TYPE = "application/vnd.querybuilder.columnar+json"
+
 
 @router.get("/definitions", response_model=DefinitionsResponse, tags=["Definitions"])
 async def get_definitions():
@@ -29,92 +106,648 @@ async def get_definitions():
     return {"metrics": METRICS, "dimensions": DIMENSIONS}
 
 
+@router.get("/cache/stats", tags=["Cache"])
+async def get_cache_stats():
+    """
+    Retorna os contadores dos caches de resultados, de planos SQL e de
+    prepared statements (hits, misses, evictions), as queries em execução
+    compartilhada (single-flight) com seus chamadores aguardando, a
+    última refresh de cada rollup (duração, lag e dias recalculados) e os
+    contadores do controle de admissão por custo e do escalonador do pool
+    (vagas em uso, fila, descartes e tempo de espera por classe) e o
+    estado das réplicas de leitura (atraso, saúde, leituras em andamento).
+    """
+
+    return {
+        "results": result_cache.stats(),
+        "plans": plan_cache.stats(),
+        "statements": prepared_statement_stats(),
+        "in_flight": query_flights.stats(),
+        "rollups": rollup_refresh_stats(),
+        "admission": admission_stats(),
+        "scheduler": pool_scheduler.stats(),
+        "replicas": replica_router.stats(),
+    }
+
+
+def _cache_ttl(request: QueryRequest) -> float:
+    """
+    TTL da entrada de cache: períodos que terminam antes de hoje não mudam
+    mais e podem ficar em cache por mais tempo.
+    """
+    bounds = request_date_bounds(request)
+    if bounds and bounds[1] <= datetime.date.today():
+        return settings.RESULT_CACHE_HISTORICAL_TTL_SECONDS
+    return settings.RESULT_CACHE_TTL_SECONDS
+
+
+async def _fetch_data(
+    conn: asyncpg.Connection, request: QueryRequest, sql: str, params: List[Any]
+) -> List[Dict[str, Any]]:
+    """
+    Executa o SQL e separa cada linha em métricas e dimensões.
+    """
+    results = await fetch_rows(conn, sql, *params)
+
+    with stage("convert"):
+        return rows_from_records(
+            results,
+            list(dict.fromkeys(request.metrics)),
+            list(dict.fromkeys(request.dimensions)),
+        )
+
+
+async def _revalidate_cache_entry(
+    request: QueryRequest, cache_key: str, sql: str, params: List[Any]
+):
+    """
+    Reexecuta uma query cujo resultado em cache expirou (stale) e
+    atualiza a entrada, usando uma conexão de leitura própria (réplica ou
+    primário).
+    """
+    try:
+        async with read_connection(settings.REPLICA_MAX_LAG_SECONDS) as conn:
+            data = await _fetch_data(conn, request, sql, params)
+        result_cache.set(cache_key, data, ttl=_cache_ttl(request))
+    except Exception as e:
+        logging.warning(f"Falha ao revalidar o cache da query: {e}")
+    finally:
+        result_cache.end_refresh(cache_key)
+
+
+def _schedule_revalidation(
+    request: QueryRequest, cache_key: str, sql: str, params: List[Any]
+):
+    """Agenda a revalidação de uma entrada stale, sem bloquear a resposta."""
+    if not result_cache.begin_refresh(cache_key):
+        return
+
+    task = asyncio.create_task(
+        _revalidate_cache_entry(request, cache_key, sql, params)
+    )
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def _generate_insights(request: QueryRequest, data: List[Dict[str, Any]]) -> List[str]:
+    """Gera os insights textuais do resultado (lista vazia em caso de erro)."""
+    try:
+        insight_text = InsightGenerator(request, data).generate_text()
+        return [insight_text] if insight_text else []
+    except Exception as e:
+        logging.error(f"Erro ao gerar insights: {e}")
+        return []
+
+
+async def _query_data(
+    request: QueryRequest,
+    sql: str,
+    params: List[Any],
+    connect: ConnectionFactory,
+    query_class: QueryClass = QueryClass.INTERACTIVE,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Obtém as linhas do resultado: do cache de resultados (agendando a
+    revalidação se estiverem stale) ou executando o SQL em uma conexão
+    obtida de 'connect' só quando necessário, depois de passar pelo
+    controle de admissão da classe da query. Chamadas concorrentes da
+    mesma query compartilham uma única execução (single-flight).
+    Retorna (data, cache_key).
+    """
+    request_key = canonical_request_key(request)
+
+    cache_key = None
+    if settings.RESULT_CACHE_ENABLED:
+        cache_key = request_key
+        data, is_stale = result_cache.get(cache_key)
+
+        if data is not None:
+            if is_stale:
+                _schedule_revalidation(request, cache_key, sql, params)
+            return data, cache_key
+
+    async def load() -> List[Dict[str, Any]]:
+        async with admitted_connection(connect, request, sql, params, query_class) as (conn, admitted):
+            # Só a execução: espera na fila, no pool e a admissão ficam
+            # de fora (aparecem nas etapas da entrada do log).
+            start_time = time.perf_counter()
+            data = await _fetch_data(conn, request, sql, params)
+            duration_ms = (time.perf_counter() - start_time) * 1000
+
+        slow_query_log.observe(request, sql, params, duration_ms, admitted.value)
+        index_advisor.workload.observe(request, sql, params, duration_ms)
+
+        if cache_key:
+            result_cache.set(cache_key, data, ttl=_cache_ttl(request))
+        return data
+
+    data = await query_flights.run(request_key, load)
+    return data, cache_key
+
+
+def _build_payload(
+    request: QueryRequest,
+    sql: str,
+    source: str,
+    data: List[Dict[str, Any]],
+    duration_ms: Optional[float],
+    response_format: ResponseFormat = ResponseFormat.ROWS,
+) -> Dict[str, Any]:
+    """
+    Monta o corpo da resposta (QueryResponse ou formato colunar) como dict.
+    Com 'duration_ms' None, o execution_time_ms fica de fora (ver
+    _with_execution_time).
+    """
+    if response_format == ResponseFormat.COLUMNAR:
+        rows = encode_columnar(
+            data,
+            list(dict.fromkeys(request.metrics)),
+            list(dict.fromkeys(request.dimensions)),
+        )
+    else:
+        rows = {"data": data}
+
+    payload = {
+        "query_sql": sql,
+        **rows,
+        "chart_suggestion": QueryBuilder(request).get_chart_suggestion(),
+        "source": source,
+        "insights": _generate_insights(request, data),
+    }
+    if duration_ms is not None:
+        payload["execution_time_ms"] = duration_ms
+    return payload
+
+
+def _with_execution_time(body: bytes, duration_ms: float) -> bytes:
+    """
+    Acrescenta o execution_time_ms da requisição atual a um corpo JSON
+    codificado sem ele (o corpo em cache é o mesmo para todas as
+    requisições; o tempo, não).
+    """
+    return body[:-1] + b',"execution_time_ms":' + encode_json(duration_ms) + b"}"
+
+
+def _query_error(e: Exception) -> HTTPException:
+    """Traduz um erro da execução de uma query no HTTPException correspondente."""
+    if isinstance(e, HTTPException):
+        return e
+
+    if isinstance(e, QueryRejectedError):
+        return HTTPException(status_code=422, detail=e.detail)
+
+    if isinstance(e, ValueError):
+        logging.warning(f"Erro de validação na query: {e}")
+        return HTTPException(status_code=400, detail=str(e))
+
+    if isinstance(e, asyncpg.PostgresError):
+        logging.error(f"Erro no PostgreSQL: {e}")
+        return HTTPException(status_code=500, detail=f"Erro no banco de dados: {e}")
+
+    logging.error(f"Erro inesperado no servidor: {e}")
+    return HTTPException(status_code=500, detail=f"Erro interno no servidor: {e}")
+
+
+def _encoded_response(
+    body: bytes, content_encoding: str, response_format: ResponseFormat
+) -> Response:
+    """Resposta com o corpo já serializado (e possivelmente comprimido)."""
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if content_encoding != "identity":
+        headers["Content-Encoding"] = content_encoding
+
+    media_type = "application/json"
+    if response_format == ResponseFormat.COLUMNAR:
+        media_type = COLUMNAR_MEDIA_TYPE
+
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
 async def _execute_query_logic(
     request: QueryRequest,
-    conn: asyncpg.Connection,
-) -> QueryResponse:
+    connect: ConnectionFactory,
+    response_format: ResponseFormat = ResponseFormat.ROWS,
+    accept_encoding: str = "",
+    query_class: QueryClass = QueryClass.INTERACTIVE,
+) -> Response:
     """
     Lógica compartilhada para executar a query e retornar a resposta.
+
+    Caminho rápido: as linhas vão dos registros do asyncpg para bytes JSON
+    (orjson) sem passar por modelos pydantic, com compressão opcional
+    (gzip/zstd). O corpo codificado (sem o execution_time_ms) fica anexado
+    à entrada do cache de resultados e é reaproveitado nas próximas
+    requisições iguais, só com o tempo delas acrescentado. A chave do cache
+    ignora a ordem das métricas e dimensões, mas o corpo não (SQL, colunas,
+    sugestão de gráfico): a variante é por formato, SQL e ordem dos campos.
+
+    A compressão roda a cada resposta, sobre o corpo já com o tempo da
+    requisição; só o corpo sem compressão fica em cache.
     """
     start_time = time.perf_counter()
 
     try:
-        builder = QueryBuilder(request)
+        builder = QueryBuilder(request, use_rollups=settings.ROLLUP_ROUTING_ENABLED)
         sql, params = builder.build()
 
-        chart_suggestion = builder.get_chart_suggestion()
-
         logging.debug(f"SQL Gerado: {sql}")
         logging.debug(f"Parâmetros: {params}")
 
-        results = await conn.fetch(sql, *params)
+        content_encoding = "identity"
+        if settings.RESPONSE_COMPRESSION_ENABLED:
+            content_encoding = negotiate_encoding(accept_encoding)
+        variant = (
+            response_format.value,
+            sql,
+            tuple(request.metrics),
+            tuple(request.dimensions),
+        )
 
-        end_time = time.perf_counter()
-        duration_ms = (end_time - start_time) * 1000
+        data, cache_key = await _query_data(
+            request, sql, params, connect, query_class
+        )
 
-        data = []
-        metric_keys = set(request.metrics)
-        dimension_keys = set(request.dimensions)
+        duration_ms = (time.perf_counter() - start_time) * 1000
 
-        for record in results:
-            record_dict = dict(record)
-            metrics_obj = {
-                key: record_dict[key] for key in metric_keys if key in record_dict
-            }
-            dimensions_obj = {
-                key: record_dict[key] for key in dimension_keys if key in record_dict
-            }
+        body = result_cache.get_variant(cache_key, variant) if cache_key else None
+        if body is None:
+            payload = _build_payload(
+                request, sql, builder.source, data, None, response_format
+            )
+            with stage("encode"):
+                body = encode_json(payload)
+            if cache_key:
+                result_cache.set_variant(cache_key, variant, body, len(body), source=data)
+
+        body = _with_execution_time(body, duration_ms)
+        if len(body) < settings.RESPONSE_COMPRESSION_MIN_BYTES:
+            content_encoding = "identity"
+        with stage("compress", encoding=content_encoding):
+            body = compress(body, content_encoding)
+
+        return _encoded_response(body, content_encoding, response_format)
+
+    except Exception as e:
+        raise _query_error(e)
+
+
+@router.post(
+    "/query",
+    response_model=QueryResponse,
+    responses={
+        200: {
+            "content": {COLUMNAR_MEDIA_TYPE: {"schema": ColumnarQueryResponse.model_json_schema()}},
+            "description": "Resultado em linhas (padrão) ou em colunas (format=columnar).",
+        }
+    },
+)
+async def run_query(
+    request: QueryRequest,
+    format: ResponseFormat = Query(ResponseFormat.ROWS),
+    accept: str = Header(""),
+    accept_encoding: str = Header(""),
+    connect: ConnectionFactory = Depends(get_connection_factory),
+):
+    """
+    Endpoint principal que recebe a definição da query (métricas,
+    dimensões, filtros) e retorna o resultado.
+
+    O formato colunar é pedido com `?format=columnar` ou com o header
+    `Accept: application/vnd.querybuilder.columnar+json`.
+    """
+    if COLUMNAR_MEDIA_TYPE in accept:
+        format = ResponseFormat.COLUMNAR
+
+    return await _execute_query_logic(request, connect, format, accept_encoding)
+
+
+async def _stream_rows(
+    connect: ConnectionFactory,
+    request: QueryRequest,
+    sql: str,
+    params: List[Any],
+    output_format: StreamFormat,
+) -> AsyncIterator[bytes]:
+    """
+    Lê o resultado por um cursor do servidor, em lotes, e codifica cada
+    lote assim que chega. O próximo lote só é buscado depois que o anterior
+    foi enviado, então a memória fica limitada a um lote e o ritmo segue o
+    do cliente.
+
+    A admissão roda na mesma vaga e na mesma conexão do cursor. O primeiro
+    item gerado é vazio e só indica que ela passou: o endpoint o consome
+    antes de a resposta começar, para que uma query recusada ainda responda
+    com 422 ou 503.
+    """
+    metric_keys = list(dict.fromkeys(request.metrics))
+    dimension_keys = list(dict.fromkeys(request.dimensions))
+    columns = metric_keys + dimension_keys
+
+    async with admitted_connection(
+        connect, request, sql, params, QueryClass.EXPORT
+    ) as (conn, _):
+        yield b""
+
+        if output_format == StreamFormat.CSV:
+            yield encode_csv([], columns, header=True)
+
+        try:
+            # Cursores do servidor só existem dentro de uma transação.
+            async with conn.transaction(readonly=True):
+                cursor = await conn.cursor(sql, *params)
+                while True:
+                    records = await cursor.fetch(settings.STREAM_BATCH_SIZE)
+                    if not records:
+                        break
+
+                    if output_format == StreamFormat.CSV:
+                        yield encode_csv(records, columns)
+                    else:
+                        yield encode_ndjson(records, metric_keys, dimension_keys)
 
-            data.append({"metrics": metrics_obj, "dimensions": dimensions_obj})
-
-        try: 
-            insight_generator = InsightGenerator(request, QueryResponse(
-                query_sql=sql,
-                data=data,
-                execution_time_ms=duration_ms,
-                chart_suggestion=chart_suggestion,
-            ))
-            insights = []
-            insight_text = insight_generator.generate_text()
-            if insight_text:
-                insights.append(insight_text)
         except Exception as e:
-            logging.error(f"Erro ao gerar insights: {e}")
-            insights = []
-
-        response_obj = QueryResponse(
-            query_sql=sql,
-            data=data,
-            execution_time_ms=duration_ms,
-            chart_suggestion=chart_suggestion,
-            insights=insights,
-        )
+            # Os cabeçalhos já foram enviados. O NDJSON sinaliza o erro na
+            # última linha; o CSV não tem como, então a resposta é
+            # interrompida (o cliente vê a transferência incompleta em vez
+            # de um arquivo truncado que parece completo).
+            logging.error(f"Erro durante o streaming da query: {e}")
+            if output_format == StreamFormat.CSV:
+                raise
+            yield (json.dumps({"error": str(e)}, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+@router.post("/query/stream")
+async def stream_query(
+    request: QueryRequest,
+    format: StreamFormat = Query(StreamFormat.NDJSON),
+    connect: ConnectionFactory = Depends(get_connection_factory),
+):
+    """
+    Variante em streaming do /query para exportações grandes: devolve as
+    linhas em NDJSON (uma DataRow por linha) ou CSV, sem montar o resultado
+    inteiro em memória. Não usa o cache de resultados nem gera insights.
+    """
+    try:
+        builder = QueryBuilder(request, use_rollups=settings.ROLLUP_ROUTING_ENABLED)
+        sql, params = builder.build()
 
-        return response_obj
+        rows = _stream_rows(connect, request, sql, params, format)
+        await rows.__anext__()
+    except Exception as e:
+        raise _query_error(e)
 
-    except ValueError as e:
-        logging.warning(f"Erro de validação na query: {e}")
-        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"X-Query-Source": builder.source}
+    if format == StreamFormat.CSV:
+        media_type = "text/csv; charset=utf-8"
+        headers["Content-Disposition"] = 'attachment; filename="query.csv"'
+    else:
+        media_type = "application/x-ndjson"
 
-    except asyncpg.PostgresError as e:
-        logging.error(f"Erro no PostgreSQL: {e}")
-        raise HTTPException(status_code=500, detail=f"Erro no banco de dados: {e}")
+    return StreamingResponse(rows, media_type=media_type, headers=headers)
+
+
+@router.post("/query/arrow")
+async def export_query_arrow(
+    request: QueryRequest,
+    format: ArrowFormat = Query(ArrowFormat.IPC),
+    connect: ConnectionFactory = Depends(get_connection_factory),
+):
+    """
+    Executa o mesmo SQL do /query e devolve o resultado em Apache Arrow
+    (IPC stream) ou Parquet, para carga direta em pandas/Polars. Os tipos
+    das colunas vêm da camada semântica (currency → decimal, time →
+    timestamp). Requer o pacote `pyarrow` (no requirements.txt).
+    """
+    if not arrow_available():
+        raise HTTPException(
+            status_code=501,
+            detail="Exportação Arrow indisponível: o pacote 'pyarrow' não está instalado.",
+        )
+
+    try:
+        builder = QueryBuilder(request, use_rollups=settings.ROLLUP_ROUTING_ENABLED)
+        sql, params = builder.build()
+
+        async with admitted_connection(
+            connect, request, sql, params, QueryClass.EXPORT
+        ) as (conn, _):
+            records = await fetch_rows(conn, sql, *params)
+
+        # Montar a tabela e serializá-la é CPU pura: roda fora do event loop.
+        body = await run_in_threadpool(
+            _serialize_arrow,
+            records,
+            request,
+            format,
+            {"query_sql": sql, "source": builder.source},
+        )
 
     except Exception as e:
-        logging.error(f"Erro inesperado no servidor: {e}")
-        raise HTTPException(status_code=500, detail=f"Erro interno no servidor: {e}")
+        raise _query_error(e)
+
+    headers = {"X-Query-Source": builder.source}
+    if format == ArrowFormat.PARQUET:
+        headers["Content-Disposition"] = 'attachment; filename="query.parquet"'
+        return Response(
+            content=body,
+            media_type="application/vnd.apache.parquet",
+            headers=headers,
+        )
 
+    return Response(
+        content=body,
+        media_type="application/vnd.apache.arrow.stream",
+        headers=headers,
+    )
 
-@router.post("/query", response_model=QueryResponse)
-async def run_query(
+
+def _serialize_arrow(
+    records: List[Any],
     request: QueryRequest,
-    conn: asyncpg.Connection = Depends(get_db_connection),
+    format: ArrowFormat,
+    metadata: Dict[str, str],
+) -> bytes:
+    """Monta a tabela Arrow do resultado e a serializa no formato pedido."""
+    table = build_table(
+        records,
+        list(dict.fromkeys(request.metrics)),
+        list(dict.fromkeys(request.dimensions)),
+        metadata=metadata,
+    )
+    if format == ArrowFormat.PARQUET:
+        return to_parquet(table)
+    return to_ipc_stream(table)
+
+
+async def _run_batch_item(
+    request: QueryRequest,
+    connect: ConnectionFactory,
+) -> Dict[str, Any]:
+    """
+    Executa uma query do lote em uma conexão própria do pool. Erros viram
+    um resultado com status e mensagem, sem derrubar o lote.
+    """
+    start_time = time.perf_counter()
+
+    try:
+        builder = QueryBuilder(request, use_rollups=settings.ROLLUP_ROUTING_ENABLED)
+        sql, params = builder.build()
+
+        data, _ = await _query_data(
+            request, sql, params, connect, QueryClass.BATCH
+        )
+
+        duration_ms = (time.perf_counter() - start_time) * 1000
+        return {
+            "status_code": 200,
+            "response": _build_payload(request, sql, builder.source, data, duration_ms),
+        }
+
+    except Exception as e:
+        error = _query_error(e)
+        return {"status_code": error.status_code, "error": error.detail}
+
+
+async def _run_fused_batch_items(
+    requests: List[QueryRequest],
+    connect: ConnectionFactory,
+) -> List[Dict[str, Any]]:
+    """
+    Executa um grupo de queries compatíveis como um único SQL (união das
+    métricas) e separa o resultado por query. Cada parte também é guardada
+    no cache de resultados com a chave da sua própria query.
+    """
+    start_time = time.perf_counter()
+    fused_request = fuse_requests(requests)
+
+    try:
+        builder = QueryBuilder(
+            fused_request, use_rollups=settings.ROLLUP_ROUTING_ENABLED
+        )
+        sql, params = builder.build()
+
+        data, _ = await _query_data(
+            fused_request, sql, params, connect, QueryClass.BATCH
+        )
+
+    except Exception as e:
+        error = _query_error(e)
+        return [
+            {"status_code": error.status_code, "error": error.detail}
+            for _ in requests
+        ]
+
+    duration_ms = (time.perf_counter() - start_time) * 1000
+
+    results = []
+    for request in requests:
+        request_data = split_rows(data, request)
+        if settings.RESULT_CACHE_ENABLED:
+            result_cache.set(
+                canonical_request_key(request), request_data, ttl=_cache_ttl(request)
+            )
+        results.append(
+            {
+                "status_code": 200,
+                "response": _build_payload(
+                    request, sql, builder.source, request_data, duration_ms
+                ),
+            }
+        )
+
+    return results
+
+
+@router.post("/query/batch", response_model=BatchQueryResponse)
+async def run_query_batch(
+    batch: BatchQueryRequest,
+    connect: ConnectionFactory = Depends(get_connection_factory),
 ):
     """
-    Endpoint principal que recebe a definição da query (métricas,
-    dimensões, filtros) e retorna o resultado.
+    Executa várias queries (ex: todos os widgets de um dashboard) em uma
+    única chamada. Queries idênticas rodam uma vez só, e queries que só
+    diferem nas métricas (mesmas dimensões, filtros, período, ordenação e
+    limite) são fundidas em um único SQL. Os grupos rodam em paralelo,
+    cada um na sua conexão do pool, com no máximo BATCH_MAX_CONCURRENCY ao
+    mesmo tempo. Os resultados voltam na ordem do pedido, com status e
+    erro por query.
     """
-    return await _execute_query_logic(request, conn)
+    start_time = time.perf_counter()
+
+    unique_requests: List[QueryRequest] = []
+    positions: Dict[str, int] = {}
+    order: List[int] = []
+
+    for request in batch.queries:
+        key = canonical_request_key(request)
+        if key not in positions:
+            positions[key] = len(unique_requests)
+            unique_requests.append(request)
+        order.append(positions[key])
+
+    groups = plan_fusion(unique_requests, settings.ROLLUP_ROUTING_ENABLED)
+    semaphore = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENCY)
+
+    async def run_group(group: List[int]) -> List[Dict[str, Any]]:
+        async with semaphore:
+            if len(group) == 1:
+                return [await _run_batch_item(unique_requests[group[0]], connect)]
+            return await _run_fused_batch_items(
+                [unique_requests[index] for index in group], connect
+            )
+
+    group_results = await asyncio.gather(*(run_group(group) for group in groups))
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(unique_requests)
+    for group, items in zip(groups, group_results):
+        for index, item in zip(group, items):
+            results[index] = item
+
+    payload = {
+        "results": [results[index] for index in order],
+        "execution_time_ms": (time.perf_counter() - start_time) * 1000,
+    }
+    return Response(content=encode_json(payload), media_type="application/json")
+
+
+@router.get("/admin/slow-queries", tags=["Admin"])
+async def get_slow_queries(limit: int = Query(50, ge=1, le=1000)):
+    """
+    Queries mais lentas que SLOW_QUERY_THRESHOLD_MS, das mais recentes
+    para as mais antigas: requisição, SQL, parâmetros, tempo por etapa e,
+    para uma amostra, o plano de EXPLAIN (ANALYZE, BUFFERS).
+    """
+    entries = slow_query_log.entries(limit)
+    return Response(
+        content=encode_json({"threshold_ms": slow_query_log.threshold_ms, "entries": entries}),
+        media_type="application/json",
+    )
+
+
+@router.delete("/admin/slow-queries", tags=["Admin"], status_code=204)
+async def clear_slow_queries():
+    """Limpa o log de queries lentas."""
+    slow_query_log.clear()
+    return Response(status_code=204)
+
+
+@router.get("/admin/index-advisor", tags=["Admin"])
+async def get_index_advice(
+    hypothetical: bool = Query(False),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """
+    Sugestões de índices (`CREATE INDEX CONCURRENTLY`) para as queries
+    executadas por este processo, ordenadas pelo benefício estimado. Com
+    `hypothetical=true` e a extensão hypopg, cada sugestão traz o custo do
+    EXPLAIN da query mais pesada antes e depois de um índice hipotético.
+    """
+    try:
+        return await index_advisor.advise(
+            index_advisor.workload.shapes(), hypothetical, limit
+        )
+    except asyncpg.PostgresError as e:
+        raise _query_error(e)
 
 
 class TextQueryRequest(BaseModel):
@@ -126,13 +759,14 @@ class TextQueryRequest(BaseModel):
 @router.post("/query-from-text", response_model=QueryResponse, tags=["AI Engine"])
 async def run_query_from_text(
     request: TextQueryRequest,
-    conn: asyncpg.Connection = Depends(get_db_connection),
+    connect: ConnectionFactory = Depends(get_connection_factory),
+    http_client: httpx.AsyncClient = Depends(get_http_client),
 ):
     """
     Executa uma query de analytics traduzindo linguagem natural (via IA)
     para o formato JSON do Query Builder.
     """
-    translator = AITranslator(api_key=settings.MARITACA_API_KEY)
+    translator = AITranslator(api_key=settings.MARITACA_API_KEY, client=http_client)
 
     try:
         query_json_string = await translator.generate_query_json(request.prompt)
@@ -147,7 +781,12 @@ async def run_query_from_text(
                 detail=f"A IA não conseguiu traduzir o pedido para uma query válida. Tente reformular. (Erro: {e})",
             )
 
-        return await _execute_query_logic(validated_request, conn)
+        return await _execute_query_logic(
+            validated_request, connect, query_class=QueryClass.AI
+        )
+
+    except HTTPException:
+        raise
 
     except Exception as e:
         logging.error(f"Erro no serviço de IA: {e}")
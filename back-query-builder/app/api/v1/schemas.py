@@ -26,6 +26,27 @@ class SortDirection(str, Enum):
     DESC = "desc"
 
 
+class ResponseFormat(str, Enum):
+    """Formatos de resposta do /query."""
+
+    ROWS = "rows"  # Uma DataRow por linha (padrão)
+    COLUMNAR = "columnar"  # Um array por coluna, dimensões com dicionário
+
+
+class StreamFormat(str, Enum):
+    """Formatos de saída do endpoint de streaming."""
+
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+class ArrowFormat(str, Enum):
+    """Formatos binários do endpoint de exportação Arrow."""
+
+    IPC = "ipc"  # Arrow IPC stream
+    PARQUET = "parquet"
+
+
 class Filter(BaseModel):
     """Define um único filtro a ser aplicado."""
 
@@ -33,10 +54,10 @@ class Filter(BaseModel):
     operator: FilterOperator
     value: Any
 
-    @field_validator("operator")
+    @field_validator("value")
     def validate_value_for_operator(cls, v, values):
-        operator = v
-        value = values.data.get("value")
+        operator = values.data.get("operator")
+        value = v
 
         if operator in [FilterOperator.IN, FilterOperator.NOT_IN]:
             if not isinstance(value, list):
@@ -138,12 +159,63 @@ class QueryResponse(BaseModel):
     data: List[DataRow]
     execution_time_ms: float
     chart_suggestion: str
+    source: str = Field(
+        "sales",
+        description="Tabela de onde os dados foram lidos ('sales' ou um rollup)."
+    )
     insights: List[str] = Field(
         [], 
         description="Uma lista de insights textuais gerados a partir dos dados."
     )
 
 
+class BatchQueryRequest(BaseModel):
+    """Um lote de queries executadas em uma única chamada."""
+
+    queries: List[QueryRequest] = Field(..., min_length=1, max_length=50)
+
+
+class BatchQueryResult(BaseModel):
+    """Resultado de uma query do lote: a resposta ou o erro."""
+
+    status_code: int
+    response: Optional[QueryResponse] = None
+    error: Optional[str] = None
+
+
+class BatchQueryResponse(BaseModel):
+    """Resultados do lote, na mesma ordem das queries enviadas."""
+
+    results: List[BatchQueryResult]
+    execution_time_ms: float
+
+
+class ColumnInfo(BaseModel):
+    """Cabeçalho de uma coluna da resposta colunar."""
+
+    name: str
+    role: str = Field(..., description="'metric' ou 'dimension'.")
+    type: Optional[str] = None
+    label: Optional[str] = None
+    encoding: str = Field(
+        "plain",
+        description="'plain' (array de valores) ou 'dictionary' ({dictionary, indices}).",
+    )
+
+
+class ColumnarQueryResponse(BaseModel):
+    """Resposta do /query no formato colunar (format=columnar)."""
+
+    query_sql: str
+    row_count: int
+    columns: List[ColumnInfo]
+    data: Dict[str, Any]
+    execution_time_ms: float
+    chart_suggestion: str
+    source: str = "sales"
+    insights: List[str] = []
+
+
 class DefinitionItem(BaseModel):
     """
     Descreve uma única Métrica ou Dimensão disponível.
@@ -153,6 +225,7 @@ class DefinitionItem(BaseModel):
     label: str
     type: Optional[str] = None
     joins_needed: Optional[List[str]] = []
+    grain: Optional[str] = None
 
 
 class DefinitionsResponse(BaseModel):
@@ -1,3 +1,6 @@
+from typing import Dict, List
+
+from pydantic import model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -18,6 +21,117 @@ class Settings(BaseSettings):
 
     MARITACA_API_KEY: str
 
+    DB_POOL_MIN_SIZE: int = 5
+    DB_POOL_MAX_SIZE: int = 20
+    DB_POOL_ACQUIRE_TIMEOUT_SECONDS: float = 10.0
+    DB_POOL_MAX_INACTIVE_CONNECTION_LIFETIME_SECONDS: float = 300.0
+    DB_POOL_MAX_QUERIES: int = 50_000
+
+    # Réplicas de leitura (lista JSON de URLs postgresql://), atraso máximo
+    # de replicação aceito nas leituras e intervalo da medição do atraso.
+    DB_REPLICA_URLS: List[str] = []
+    REPLICA_MAX_LAG_SECONDS: float = 30.0
+    REPLICA_LAG_CHECK_INTERVAL_SECONDS: float = 5.0
+
+    PREPARED_STATEMENT_CACHE_SIZE: int = 100
+
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_MAX_ENTRIES: int = 1024
+    RESULT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RESULT_CACHE_TTL_SECONDS: float = 60.0
+    RESULT_CACHE_HISTORICAL_TTL_SECONDS: float = 3600.0
+    RESULT_CACHE_STALE_SECONDS: float = 300.0
+
+    STREAM_BATCH_SIZE: int = 1000
+    BATCH_MAX_CONCURRENCY: int = 4
+
+    RESPONSE_COMPRESSION_ENABLED: bool = True
+    RESPONSE_COMPRESSION_MIN_BYTES: int = 1024
+
+    # Admissão por custo: orçamentos (custo e linhas estimados pelo planner)
+    # e statement_timeout por classe de query (interactive, batch, ai, export).
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_COST_BUDGETS: Dict[str, float] = {
+        "interactive": 2_000_000.0,
+        "batch": 2_000_000.0,
+        "ai": 1_000_000.0,
+        "export": 20_000_000.0,
+    }
+    ADMISSION_ROW_BUDGETS: Dict[str, float] = {
+        "interactive": 100_000.0,
+        "batch": 100_000.0,
+        "ai": 10_000.0,
+        "export": 10_000_000.0,
+    }
+    STATEMENT_TIMEOUTS_MS: Dict[str, int] = {
+        "interactive": 15_000,
+        "batch": 15_000,
+        "ai": 10_000,
+        "export": 120_000,
+        "background": 0,
+    }
+
+    # Escalonador do pool: vagas, peso e prazo de fila (ms) por classe. A
+    # classe "background" é a das tarefas internas (refresh dos rollups e
+    # EXPLAIN das queries lentas).
+    # As vagas ficam abaixo de DB_POOL_MAX_SIZE: a diferença é reservada ao
+    # que não passa pelo escalonador (ex: o index advisor).
+    SCHEDULER_MAX_CONCURRENCY: int = 16
+    SCHEDULER_WEIGHTS: Dict[str, float] = {
+        "interactive": 6.0,
+        "batch": 2.0,
+        "ai": 1.0,
+        "export": 1.0,
+        "background": 0.5,
+    }
+    SCHEDULER_DEADLINES_MS: Dict[str, int] = {
+        "interactive": 2_000,
+        "batch": 5_000,
+        "ai": 10_000,
+        "export": 30_000,
+        "background": 60_000,
+    }
+
+    # Log de queries lentas: limite, tamanho do buffer e fração das
+    # queries lentas reexecutadas com EXPLAIN (ANALYZE, BUFFERS), no máximo
+    # SLOW_QUERY_EXPLAIN_MAX_CONCURRENCY ao mesmo tempo.
+    SLOW_QUERY_THRESHOLD_MS: float = 1000.0
+    SLOW_QUERY_LOG_SIZE: int = 200
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE: float = 0.1
+    SLOW_QUERY_EXPLAIN_MAX_CONCURRENCY: int = 1
+
+    # Exportador dos spans por requisição: "" (desligado), "console" ou "file".
+    TRACING_EXPORTER: str = ""
+    TRACING_FILE_PATH: str = "traces.jsonl"
+
+    # Cliente HTTP compartilhado da API de IA: conexões, keep-alive, HTTP/2
+    # (exige o pacote h2), timeouts e retentativas em erros 5xx.
+    AI_API_URL: str = "https://chat.maritaca.ai/api/chat/inference"
+    AI_HTTP_MAX_CONNECTIONS: int = 20
+    AI_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    AI_HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 60.0
+    AI_HTTP2_ENABLED: bool = False
+    AI_HTTP_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    AI_HTTP_READ_TIMEOUT_SECONDS: float = 30.0
+    AI_HTTP_MAX_RETRIES: int = 2
+    AI_HTTP_RETRY_BACKOFF_SECONDS: float = 0.5
+
+    ROLLUP_ROUTING_ENABLED: bool = False
+    ROLLUP_REFRESH_INTERVAL_SECONDS: float = 0.0
+    ROLLUP_REFRESH_LATE_WINDOW_SECONDS: float = 6 * 3600.0
+    # Releitura da cobertura dos rollups quando a refresh roda em outro processo.
+    ROLLUP_COVERAGE_RELOAD_SECONDS: float = 60.0
+
+    @model_validator(mode="after")
+    def _check_pool_headroom(self) -> "Settings":
+        """As vagas do escalonador precisam deixar conexões livres no pool."""
+        if self.SCHEDULER_MAX_CONCURRENCY >= self.DB_POOL_MAX_SIZE:
+            raise ValueError(
+                f"SCHEDULER_MAX_CONCURRENCY ({self.SCHEDULER_MAX_CONCURRENCY}) deve ser "
+                f"menor que DB_POOL_MAX_SIZE ({self.DB_POOL_MAX_SIZE})."
+            )
+        return self
+
     @property
     def DATABASE_URL(self) -> str:
         return f"postgresql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
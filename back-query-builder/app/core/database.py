@@ -1,41 +1,507 @@
+import asyncio
 import asyncpg
+import hashlib
+import json
 import logging
-from typing import AsyncGenerator
-from fastapi import HTTPException
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import (
+    Any,
+    AsyncContextManager,
+    AsyncGenerator,
+    AsyncIterator,
+    Callable,
+    Dict,
+    List,
+    Optional,
+)
+from fastapi import HTTPException, Request
 from app.core.config import settings
+from app.core.lru import LRUCache
+from app.core.metrics import Counter, Gauge, Histogram, registry
+from app.core.replicas import ReplicaRouter
+from app.core.scheduler import FairScheduler, QueueShedError
+from app.core.tracing import stage
 
 db_pool: asyncpg.Pool = None
 
+pool_scheduler = FairScheduler(
+    capacity=settings.SCHEDULER_MAX_CONCURRENCY,
+    weights=settings.SCHEDULER_WEIGHTS,
+    deadlines_ms=settings.SCHEDULER_DEADLINES_MS,
+)
+
+
+def _resize_scheduler():
+    """
+    Vagas do escalonador: as do primário mais as de cada réplica em
+    rotação no momento. Sem réplicas elegíveis as leituras vão todas ao
+    primário, e as vagas voltam à capacidade dele.
+    """
+    eligible = replica_router.eligible_count(settings.REPLICA_MAX_LAG_SECONDS)
+    pool_scheduler.resize(settings.SCHEDULER_MAX_CONCURRENCY * (1 + eligible))
+
+
+replica_router = ReplicaRouter(
+    settings.REPLICA_LAG_CHECK_INTERVAL_SECONDS, on_change=_resize_scheduler
+)
+
+# Erros de conexão ao obter uma conexão de réplica: a leitura vai para o primário.
+REPLICA_CONNECTION_ERRORS = (OSError, asyncpg.PostgresConnectionError, asyncpg.InterfaceError)
+
+ConnectionFactory = Callable[..., AsyncContextManager[asyncpg.Connection]]
+
+_schema_generation: int = 0
+
+_statement_counters: Dict[str, int] = {
+    "hits": 0,
+    "misses": 0,
+    "evictions": 0,
+    "invalidations": 0,
+}
+
+
+def _pool_connection_gauge():
+    if not db_pool:
+        return []
+    idle = db_pool.get_idle_size()
+    return [(("in_use",), db_pool.get_size() - idle), (("idle",), idle)]
+
+
+def _pool_limits_gauge():
+    return [
+        (("min",), settings.DB_POOL_MIN_SIZE),
+        (("max",), settings.DB_POOL_MAX_SIZE),
+    ]
+
+
+POOL_CONNECTIONS = registry.register(
+    Gauge(
+        "querybuilder_pool_connections",
+        "Conexões abertas no pool, por estado.",
+        _pool_connection_gauge,
+        labelnames=("state",),
+    )
+)
+POOL_LIMITS = registry.register(
+    Gauge(
+        "querybuilder_pool_size_limit",
+        "Tamanho mínimo e máximo configurado do pool.",
+        _pool_limits_gauge,
+        labelnames=("bound",),
+    )
+)
+POOL_ACQUIRE_WAIT = registry.register(
+    Histogram(
+        "querybuilder_pool_acquire_wait_seconds",
+        "Tempo de espera para obter uma conexão do pool.",
+    )
+)
+POOL_ACQUIRE_TIMEOUTS = registry.register(
+    Counter(
+        "querybuilder_pool_acquire_timeouts_total",
+        "Esperas por conexão que excederam DB_POOL_ACQUIRE_TIMEOUT_SECONDS.",
+    )
+)
+POOL_CONNECTIONS_OPENED = registry.register(
+    Counter("querybuilder_pool_connections_opened_total", "Conexões abertas pelo pool.")
+)
+POOL_CONNECTIONS_CLOSED = registry.register(
+    Counter("querybuilder_pool_connections_closed_total", "Conexões do pool encerradas.")
+)
+QUERY_DURATION = registry.register(
+    Histogram(
+        "querybuilder_query_duration_seconds",
+        "Tempo de execução das queries geradas, por formato de SQL (hash do texto).",
+        labelnames=("shape",),
+    )
+)
+
+
+SCHEDULER_QUEUE_DEPTH = registry.register(
+    Gauge(
+        "querybuilder_scheduler_queue_depth",
+        "Pedidos aguardando vaga no escalonador, por classe de query.",
+        lambda: [
+            ((name,), stats["depth"])
+            for name, stats in pool_scheduler.stats()["classes"].items()
+        ],
+        labelnames=("query_class",),
+    )
+)
+
+REPLICA_LAG = registry.register(
+    Gauge(
+        "querybuilder_replica_lag_seconds",
+        "Atraso de replicação medido em cada réplica.",
+        lambda: [
+            ((replica.name,), replica.lag_seconds)
+            for replica in replica_router.replicas
+            if replica.lag_seconds is not None
+        ],
+        labelnames=("replica",),
+    )
+)
+REPLICA_HEALTHY = registry.register(
+    Gauge(
+        "querybuilder_replica_healthy",
+        "1 se a réplica está na rotação de leituras, 0 caso contrário.",
+        lambda: [((replica.name,), int(replica.healthy)) for replica in replica_router.replicas],
+        labelnames=("replica",),
+    )
+)
+REPLICA_OUTSTANDING = registry.register(
+    Gauge(
+        "querybuilder_replica_outstanding_requests",
+        "Leituras em andamento em cada réplica.",
+        lambda: [((replica.name,), replica.outstanding) for replica in replica_router.replicas],
+        labelnames=("replica",),
+    )
+)
+READ_ROUTING = registry.register(
+    Counter(
+        "querybuilder_read_routing_total",
+        "Leituras por destino (nome da réplica ou 'primary').",
+        labelnames=("target",),
+    )
+)
+
+
+def query_shape(sql: str) -> str:
+    """Identificador curto e estável do formato de uma query (hash do SQL)."""
+    return hashlib.sha1(sql.encode("utf-8")).hexdigest()[:12]
+
+
+def invalidate_prepared_statements():
+    """
+    Invalida os prepared statements de todas as conexões. Deve ser chamada
+    após mudanças de schema (DDL) feitas pela própria aplicação.
+    """
+    global _schema_generation
+    _schema_generation += 1
+
+
+def prepared_statement_stats() -> Dict[str, Any]:
+    """Contadores agregados dos caches de prepared statements."""
+    lookups = _statement_counters["hits"] + _statement_counters["misses"]
+    return {
+        **_statement_counters,
+        "hit_rate": _statement_counters["hits"] / lookups if lookups else 0.0,
+    }
+
+
+class QueryConnection(asyncpg.Connection):
+    """
+    Conexão asyncpg com um cache LRU explícito de prepared statements,
+    indexado pelo texto SQL (que é estável por formato de query graças ao
+    cache de planos do QueryBuilder). Assim o parse/plan de cada formato
+    é pago uma única vez por conexão.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._prepared = LRUCache(settings.PREPARED_STATEMENT_CACHE_SIZE)
+        self._prepared_generation = _schema_generation
+        # None: statement_timeout padrão do servidor (sem SET nesta sessão).
+        self._statement_timeout_ms: Optional[int] = None
+
+    async def reset(self, *, timeout=None):
+        """
+        Chamado pelo pool ao devolver a conexão. O RESET ALL do asyncpg
+        volta o statement_timeout ao padrão do servidor.
+        """
+        await super().reset(timeout=timeout)
+        self._statement_timeout_ms = None
+
+    async def set_statement_timeout(self, timeout_ms: int):
+        """Aplica o statement_timeout da classe da query, se for diferente."""
+        if self._statement_timeout_ms == timeout_ms:
+            return
+        await self.execute(f"SET statement_timeout = {int(timeout_ms)}")
+        self._statement_timeout_ms = timeout_ms
+
+    async def explain(self, sql: str, *params) -> Dict[str, Any]:
+        """Plano estimado (EXPLAIN em JSON, sem executar) do nó raiz da query."""
+        plan = await self.fetchval(f"EXPLAIN (FORMAT JSON) {sql}", *params)
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]["Plan"]
+
+    async def _get_prepared(self, sql: str) -> asyncpg.prepared_stmt.PreparedStatement:
+        """Busca o statement no cache ou o prepara no servidor."""
+        if self._prepared_generation != _schema_generation:
+            self._prepared.clear()
+            self._prepared_generation = _schema_generation
+            _statement_counters["invalidations"] += 1
+
+        statement = self._prepared.get(sql)
+        if statement is not None:
+            _statement_counters["hits"] += 1
+            return statement
+
+        _statement_counters["misses"] += 1
+        statement = await self.prepare(sql)
+        if self._prepared.put(sql, statement) is not None:
+            _statement_counters["evictions"] += 1
+
+        return statement
+
+    async def fetch_prepared(self, sql: str, *params) -> List[asyncpg.Record]:
+        """
+        Executa o SQL via prepared statement em cache. Se o schema mudou
+        no servidor, descarta os statements da conexão e prepara de novo.
+        """
+        statement = await self._get_prepared(sql)
+        try:
+            return await statement.fetch(*params)
+        except (
+            asyncpg.exceptions.InvalidCachedStatementError,
+            asyncpg.exceptions.OutdatedSchemaCacheError,
+        ):
+            self._prepared.clear()
+            _statement_counters["invalidations"] += 1
+            if self.is_in_transaction():
+                raise
+
+            statement = await self._get_prepared(sql)
+            return await statement.fetch(*params)
+
+
+def _on_connection_closed(connection: asyncpg.Connection):
+    POOL_CONNECTIONS_CLOSED.inc()
+
+
+async def _on_connection_opened(connection: asyncpg.Connection):
+    """Chamado pelo pool para cada conexão nova (rotatividade do pool)."""
+    POOL_CONNECTIONS_OPENED.inc()
+    connection.add_termination_listener(_on_connection_closed)
+
+
+async def _create_pool(dsn: str) -> asyncpg.Pool:
+    return await asyncpg.create_pool(
+        dsn=dsn,
+        min_size=settings.DB_POOL_MIN_SIZE,
+        max_size=settings.DB_POOL_MAX_SIZE,
+        max_queries=settings.DB_POOL_MAX_QUERIES,
+        max_inactive_connection_lifetime=settings.DB_POOL_MAX_INACTIVE_CONNECTION_LIFETIME_SECONDS,
+        init=_on_connection_opened,
+        connection_class=QueryConnection,
+    )
+
 
 async def connect_to_db():
-    """Cria o pool de conexões."""
+    """
+    Cria o pool de conexões do primário e um pool por réplica de leitura.
+    Uma réplica que não conecta é ignorada (as leituras vão ao primário).
+    """
     global db_pool
     try:
-        db_pool = await asyncpg.create_pool(
-            dsn=settings.DATABASE_URL,
-            min_size=5,
-            max_size=20,
-        )
+        db_pool = await _create_pool(settings.DATABASE_URL)
         logging.info("Pool de conexões com o PostgreSQL criado com sucesso.")
     except Exception as e:
         logging.critical(f"Falha ao criar o pool de conexões: {e}")
         raise e
 
+    for index, dsn in enumerate(settings.DB_REPLICA_URLS, start=1):
+        name = f"replica-{index}"
+        try:
+            replica_router.add(name, await _create_pool(dsn))
+            logging.info(f"Pool de conexões com a réplica {name} criado com sucesso.")
+        except Exception as e:
+            logging.error(f"Falha ao criar o pool da réplica {name}: {e}")
+
+    if replica_router.replicas:
+        # A medição ajusta as vagas do escalonador às réplicas em rotação.
+        await replica_router.check_all()
+
 
 async def close_db_connection():
-    """Fecha o pool de conexões."""
+    """Fecha os pools de conexões (primário e réplicas)."""
     global db_pool
+    for replica in replica_router.replicas:
+        await replica.pool.close()
+    replica_router.clear()
+    _resize_scheduler()
+
     if db_pool:
         await db_pool.close()
         logging.info("Pool de conexões com o PostgreSQL fechado.")
 
 
-async def get_db_connection() -> AsyncGenerator[asyncpg.Connection, None]:
-    """Fornece uma conexão do pool para uso em requisições."""
+async def _acquire(pool: asyncpg.Pool) -> asyncpg.Connection:
+    """Obtém uma conexão do pool, com timeout (503) e métricas de espera."""
+    start_time = time.perf_counter()
+    try:
+        with stage("acquire"):
+            return await pool.acquire(timeout=settings.DB_POOL_ACQUIRE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        POOL_ACQUIRE_TIMEOUTS.inc()
+        raise HTTPException(
+            status_code=503, detail="Nenhuma conexão com o banco disponível no momento."
+        )
+    finally:
+        POOL_ACQUIRE_WAIT.observe(time.perf_counter() - start_time)
+
+
+@asynccontextmanager
+async def acquire_connection() -> AsyncIterator[asyncpg.Connection]:
+    """
+    Obtém uma conexão do pool do primário fora do ciclo de uma requisição
+    (ex: tarefas em background).
+    """
     if not db_pool:
         raise HTTPException(
             status_code=500, detail="O pool de conexões não foi inicializado."
         )
 
-    async with db_pool.acquire() as connection:
+    connection = await _acquire(db_pool)
+    try:
+        yield connection
+    finally:
+        await db_pool.release(connection)
+
+
+@asynccontextmanager
+async def read_connection(max_lag_seconds: float) -> AsyncIterator[asyncpg.Connection]:
+    """
+    Obtém uma conexão para leitura: da réplica elegível (atraso de até
+    'max_lag_seconds') com menos leituras em andamento, ou do primário se
+    não houver réplica elegível ou se a réplica escolhida não conectar.
+    """
+    replica = replica_router.choose(max_lag_seconds)
+    if replica is not None:
+        with replica_router.track(replica):
+            try:
+                connection = await _acquire(replica.pool)
+            except REPLICA_CONNECTION_ERRORS as e:
+                replica_router.mark_unhealthy(replica, e)
+            else:
+                READ_ROUTING.inc(target=replica.name)
+                try:
+                    yield connection
+                finally:
+                    await replica.pool.release(connection)
+                return
+
+    READ_ROUTING.inc(target="primary")
+    async with acquire_connection() as connection:
+        yield connection
+
+
+async def fetch_rows(
+    conn: asyncpg.Connection, sql: str, *params
+) -> List[asyncpg.Record]:
+    """
+    Executa uma query gerada pelo QueryBuilder, usando o cache de prepared
+    statements quando a conexão for uma QueryConnection.
+    """
+    shape = query_shape(sql)
+    start_time = time.perf_counter()
+    try:
+        with stage("db", shape=shape):
+            fetch_prepared = getattr(conn, "fetch_prepared", None)
+            if fetch_prepared is None:
+                return await conn.fetch(sql, *params)
+            return await fetch_prepared(sql, *params)
+    finally:
+        QUERY_DURATION.observe(time.perf_counter() - start_time, shape=shape)
+
+
+async def apply_statement_timeout(conn: asyncpg.Connection, timeout_ms: int):
+    """
+    Aplica o statement_timeout na conexão, quando ela for uma
+    QueryConnection (em outras conexões, não faz nada).
+    """
+    set_statement_timeout = getattr(conn, "set_statement_timeout", None)
+    if set_statement_timeout is not None:
+        await set_statement_timeout(timeout_ms)
+
+
+@asynccontextmanager
+async def scheduled_connection(
+    query_class: str = "interactive",
+    client_id: str = "anonymous",
+    max_lag_seconds: Optional[float] = None,
+) -> AsyncIterator[asyncpg.Connection]:
+    """
+    Obtém uma conexão do pool passando pelo escalonador: a vaga é
+    concedida conforme o peso da classe e o rodízio entre clientes, ou
+    recusada com 503 se não sair dentro do prazo da classe. A conexão
+    vem com o statement_timeout da classe. Com 'max_lag_seconds', a
+    conexão é de leitura (réplica ou primário).
+    """
+    try:
+        with stage("queue", query_class=query_class):
+            granted_at = await pool_scheduler.acquire(query_class, client_id)
+    except QueueShedError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=e.detail,
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+        )
+
+    if max_lag_seconds is None:
+        connection_source = acquire_connection()
+    else:
+        connection_source = read_connection(max_lag_seconds)
+
+    try:
+        async with connection_source as connection:
+            await apply_statement_timeout(
+                connection, settings.STATEMENT_TIMEOUTS_MS[query_class]
+            )
+            yield connection
+    finally:
+        pool_scheduler.release(granted_at)
+
+
+def _client_id(request: Request) -> str:
+    """Identifica o cliente pelo header X-Client-Id ou pelo IP."""
+    client_id = request.headers.get("X-Client-Id")
+    if client_id:
+        return client_id
+    return request.client.host if request.client else "anonymous"
+
+
+async def get_db_connection(request: Request) -> AsyncGenerator[asyncpg.Connection, None]:
+    """Fornece uma conexão do pool (classe interactive) para uso em requisições."""
+    async with scheduled_connection("interactive", _client_id(request)) as connection:
         yield connection
+
+
+def _max_lag_seconds(request: Request) -> float:
+    """
+    Atraso de replicação aceito pela requisição: REPLICA_MAX_LAG_SECONDS,
+    ou menos se pedido no header X-Max-Staleness (segundos).
+    """
+    max_lag_seconds = settings.REPLICA_MAX_LAG_SECONDS
+    header = request.headers.get("X-Max-Staleness")
+    if header is None:
+        return max_lag_seconds
+
+    try:
+        requested = float(header)
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="O header X-Max-Staleness deve ser um número de segundos.",
+        )
+    return min(max_lag_seconds, max(requested, 0.0))
+
+
+def get_connection_factory(request: Request) -> ConnectionFactory:
+    """
+    Fornece a fábrica de conexões para endpoints que só obtêm a conexão
+    quando precisam dela (ex: streaming, em que a conexão precisa viver
+    até o fim da resposta). A fábrica recebe a classe da query e passa
+    pelo escalonador em nome do cliente da requisição. As queries são só
+    leitura: as conexões vêm das réplicas quando possível.
+    """
+    client_id = _client_id(request)
+    max_lag_seconds = _max_lag_seconds(request)
+
+    def connect(query_class: str = "interactive") -> AsyncContextManager[asyncpg.Connection]:
+        return scheduled_connection(query_class, client_id, max_lag_seconds)
+
+    return connect
@@ -0,0 +1,155 @@
+"""
+Cliente HTTP compartilhado para chamadas a serviços externos (API de IA).
+
+Um único httpx.AsyncClient, criado no lifespan, mantém as conexões abertas
+(keep-alive) entre as requisições: só a primeira chamada paga DNS, TCP e
+TLS. Com AI_HTTP2_ENABLED (e o pacote h2 instalado) as chamadas são
+multiplexadas em HTTP/2.
+
+Respostas 5xx e falhas de conexão são repetidas até AI_HTTP_MAX_RETRIES
+vezes, com backoff exponencial e jitter. Timeouts de leitura não são
+repetidos: a chamada já esperou o tempo todo.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.metrics import Counter, Histogram, registry
+
+try:
+    import h2  # noqa: F401
+except ImportError:  # h2 é opcional; sem ele, HTTP/1.1.
+    h2 = None
+
+HTTP_REQUESTS = registry.register(
+    Counter(
+        "querybuilder_http_client_requests_total",
+        "Requisições do cliente HTTP compartilhado, por conexão nova ou reaproveitada.",
+        labelnames=("connection",),
+    )
+)
+HTTP_RETRIES = registry.register(
+    Counter(
+        "querybuilder_http_client_retries_total",
+        "Retentativas do cliente HTTP compartilhado, por motivo.",
+        labelnames=("reason",),
+    )
+)
+HTTP_REQUEST_DURATION = registry.register(
+    Histogram(
+        "querybuilder_http_client_request_seconds",
+        "Duração de cada tentativa do cliente HTTP compartilhado.",
+        buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+    )
+)
+
+# Falhas em que a requisição não chegou a ser processada pelo servidor.
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+
+http_client: Optional[httpx.AsyncClient] = None
+
+
+def create_http_client(**kwargs: Any) -> httpx.AsyncClient:
+    """Cria o cliente com os limites, timeouts e versão HTTP configurados."""
+    http2 = settings.AI_HTTP2_ENABLED
+    if http2 and h2 is None:
+        logging.warning("AI_HTTP2_ENABLED ativo, mas o pacote h2 não está instalado: usando HTTP/1.1.")
+        http2 = False
+
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.AI_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.AI_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.AI_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        timeout=httpx.Timeout(
+            settings.AI_HTTP_READ_TIMEOUT_SECONDS,
+            connect=settings.AI_HTTP_CONNECT_TIMEOUT_SECONDS,
+        ),
+        **kwargs,
+    )
+
+
+async def start_http_client():
+    """Cria o cliente compartilhado (chamado no startup)."""
+    global http_client
+    http_client = create_http_client()
+
+
+async def close_http_client():
+    """Fecha o cliente compartilhado e suas conexões (chamado no shutdown)."""
+    global http_client
+    if http_client:
+        await http_client.aclose()
+        http_client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Fornece o cliente compartilhado para uso em requisições."""
+    if http_client is None:
+        raise HTTPException(
+            status_code=500, detail="O cliente HTTP não foi inicializado."
+        )
+    return http_client
+
+
+def _backoff(attempt: int) -> float:
+    """Espera antes da retentativa 'attempt' (a partir de 1): full jitter."""
+    return random.uniform(0, settings.AI_HTTP_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+
+
+async def post_with_retries(
+    client: httpx.AsyncClient,
+    url: str,
+    *,
+    json: Any,
+    headers: Dict[str, str],
+    max_retries: Optional[int] = None,
+    sleep: Callable[[float], Any] = asyncio.sleep,
+) -> httpx.Response:
+    """
+    POST com retentativas em respostas 5xx e falhas de conexão. Retorna a
+    última resposta (que pode ser um erro, para o chamador tratar).
+    """
+    if max_retries is None:
+        max_retries = settings.AI_HTTP_MAX_RETRIES
+
+    attempt = 0
+    while True:
+        opened_connection = False
+
+        async def trace(event_name: str, info: Dict[str, Any]):
+            nonlocal opened_connection
+            if event_name == "connection.connect_tcp.complete":
+                opened_connection = True
+
+        start_time = time.perf_counter()
+        try:
+            response = await client.post(
+                url, json=json, headers=headers, extensions={"trace": trace}
+            )
+        except RETRYABLE_ERRORS as e:
+            if attempt >= max_retries:
+                raise
+            reason = type(e).__name__
+        else:
+            HTTP_REQUESTS.inc(connection="new" if opened_connection else "reused")
+            if response.status_code < 500 or attempt >= max_retries:
+                return response
+            reason = str(response.status_code)
+        finally:
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - start_time)
+
+        attempt += 1
+        HTTP_RETRIES.inc(reason=reason)
+        delay = _backoff(attempt)
+        logging.warning(f"Chamada a {url} falhou ({reason}); nova tentativa em {delay:.2f} s.")
+        await sleep(delay)
@@ -0,0 +1,191 @@
+"""
+Roteamento das leituras entre réplicas.
+
+Cada réplica (DB_REPLICA_URLS) tem seu próprio pool. Uma leitura vai para
+a réplica saudável com menos requisições em andamento, desde que o atraso
+de replicação medido esteja dentro do limite de frescor da requisição
+(REPLICA_MAX_LAG_SECONDS, que o header X-Max-Staleness pode reduzir).
+Sem réplica elegível, a leitura vai para o primário.
+
+O atraso é medido em background a cada REPLICA_LAG_CHECK_INTERVAL_SECONDS.
+Uma réplica que falha na medição (ou ao entregar uma conexão) sai da
+rotação até a próxima medição bem-sucedida; uma medição antiga demais
+(mais de STALE_CHECK_INTERVALS intervalos) também a tira da rotação.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import asyncpg
+
+# Réplica em dia (tudo o que recebeu já foi aplicado) e ainda conectada
+# ao primário tem atraso zero, mesmo que o primário esteja sem escritas há
+# muito tempo. Desconectada, ela não sabe o que deixou de receber: o
+# atraso é o tempo desde a última transação aplicada.
+LAG_SQL = """
+WITH receiver AS (
+    SELECT EXISTS (
+        SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming'
+    ) AS streaming
+)
+SELECT
+    CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN receiver.streaming
+            AND pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END AS lag_seconds,
+    receiver.streaming
+FROM receiver
+"""
+
+STALE_CHECK_INTERVALS = 3
+LAG_CHECK_TIMEOUT_SECONDS = 2.0
+
+
+class Replica:
+    """Pool de uma réplica e o estado usado no roteamento."""
+
+    def __init__(self, name: str, pool: asyncpg.Pool):
+        self.name = name
+        self.pool = pool
+        self.outstanding = 0
+        self.healthy = False
+        self.lag_seconds: Optional[float] = None
+        self.streaming: Optional[bool] = None
+        self.checked_at: Optional[float] = None
+        self.routed = 0
+        self.last_error: Optional[str] = None
+
+
+class ReplicaRouter:
+    """Escolhe a réplica de cada leitura e mede o atraso das réplicas."""
+
+    def __init__(
+        self,
+        check_interval_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+        on_change: Optional[Callable[[], None]] = None,
+    ):
+        self.check_interval_seconds = check_interval_seconds
+        self.replicas: List[Replica] = []
+        self.primary_fallbacks = 0
+        # Chamado quando o conjunto de réplicas em rotação pode ter mudado.
+        self.on_change = on_change
+        self._clock = clock
+        self._next = 0
+
+    def add(self, name: str, pool: asyncpg.Pool) -> Replica:
+        replica = Replica(name, pool)
+        self.replicas.append(replica)
+        return replica
+
+    def clear(self):
+        self.replicas.clear()
+
+    def _is_eligible(self, replica: Replica, max_lag_seconds: float, now: float) -> bool:
+        if not replica.healthy or replica.lag_seconds is None or replica.checked_at is None:
+            return False
+        if now - replica.checked_at > STALE_CHECK_INTERVALS * self.check_interval_seconds:
+            return False
+        return replica.lag_seconds <= max_lag_seconds
+
+    def eligible_count(self, max_lag_seconds: float) -> int:
+        """Réplicas que podem receber leituras com esse limite de atraso agora."""
+        now = self._clock()
+        return sum(self._is_eligible(replica, max_lag_seconds, now) for replica in self.replicas)
+
+    def _changed(self):
+        if self.on_change:
+            self.on_change()
+
+    def choose(self, max_lag_seconds: float) -> Optional[Replica]:
+        """
+        Réplica elegível com menos requisições em andamento (empates em
+        rodízio), ou None se a leitura deve ir para o primário.
+        """
+        if not self.replicas:
+            return None
+
+        now = self._clock()
+        start = self._next % len(self.replicas)
+        self._next += 1
+        candidates = [
+            replica
+            for replica in self.replicas[start:] + self.replicas[:start]
+            if self._is_eligible(replica, max_lag_seconds, now)
+        ]
+        if not candidates:
+            self.primary_fallbacks += 1
+            return None
+
+        replica = min(candidates, key=lambda candidate: candidate.outstanding)
+        replica.routed += 1
+        return replica
+
+    @contextmanager
+    def track(self, replica: Replica) -> Iterator[Replica]:
+        """Conta a requisição como em andamento na réplica enquanto durar."""
+        replica.outstanding += 1
+        try:
+            yield replica
+        finally:
+            replica.outstanding -= 1
+
+    def mark_unhealthy(self, replica: Replica, error: Exception):
+        """Tira a réplica da rotação até a próxima medição bem-sucedida."""
+        replica.healthy = False
+        replica.last_error = str(error)
+        logging.warning(f"Réplica {replica.name} fora da rotação: {error}")
+        self._changed()
+
+    async def check(self, replica: Replica):
+        """Mede o atraso de replicação de uma réplica."""
+        try:
+            async with replica.pool.acquire(timeout=LAG_CHECK_TIMEOUT_SECONDS) as conn:
+                row = await conn.fetchrow(LAG_SQL, timeout=LAG_CHECK_TIMEOUT_SECONDS)
+        except Exception as e:
+            if replica.healthy:
+                self.mark_unhealthy(replica, e)
+            replica.last_error = str(e)
+            return
+
+        if not replica.healthy:
+            logging.info(f"Réplica {replica.name} de volta à rotação.")
+        lag = row["lag_seconds"]
+        replica.lag_seconds = float(lag) if lag is not None else None
+        replica.streaming = row["streaming"]
+        replica.checked_at = self._clock()
+        replica.healthy = True
+        replica.last_error = None
+
+    async def check_all(self):
+        await asyncio.gather(*(self.check(replica) for replica in self.replicas))
+        self._changed()
+
+    async def run_lag_monitor(self):
+        """Laço da medição do atraso (iniciado no lifespan)."""
+        while True:
+            await self.check_all()
+            await asyncio.sleep(self.check_interval_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado de cada réplica e leituras desviadas para o primário."""
+        return {
+            "primary_fallbacks": self.primary_fallbacks,
+            "replicas": [
+                {
+                    "name": replica.name,
+                    "healthy": replica.healthy,
+                    "lag_seconds": replica.lag_seconds,
+                    "streaming": replica.streaming,
+                    "outstanding": replica.outstanding,
+                    "routed": replica.routed,
+                    "last_error": replica.last_error,
+                }
+                for replica in self.replicas
+            ],
+        }
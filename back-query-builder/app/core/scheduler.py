@@ -0,0 +1,254 @@
+"""
+Escalonador de acesso ao pool de conexões.
+
+Em vez de o pool atender por ordem de chegada, cada requisição pede uma
+vaga ao escalonador informando sua classe (interactive, batch, export,
+ai) e o cliente que a fez:
+- entre classes, as vagas são divididas por peso (stride scheduling):
+  com pesos 6/2/1/1, widgets interativos recebem 60% das vagas quando
+  todas as classes têm fila;
+- dentro de uma classe, os clientes são atendidos em rodízio, então um
+  cliente com muitas queries não monopoliza a classe;
+- cada pedido tem um prazo (por classe). Pedidos que não serão atendidos
+  a tempo são descartados logo na chegada (pela estimativa de espera) ou
+  quando o prazo vence na fila.
+"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+WAIT_SAMPLES = 1024
+
+
+class QueueShedError(Exception):
+    """Pedido descartado por não conseguir uma vaga dentro do prazo."""
+
+    def __init__(self, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    """Um pedido de vaga na fila."""
+
+    __slots__ = ("future", "client_id", "enqueued_at", "deadline")
+
+    def __init__(
+        self, future: asyncio.Future, client_id: str, enqueued_at: float, deadline: float
+    ):
+        self.future = future
+        self.client_id = client_id
+        self.enqueued_at = enqueued_at
+        self.deadline = deadline
+
+
+class _ClassQueue:
+    """Fila de uma classe: um deque de pedidos por cliente, em rodízio."""
+
+    def __init__(self, weight: float, deadline: float):
+        self.weight = weight
+        self.deadline = deadline
+        self.clients: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self.depth = 0
+        self.pass_value = 0.0
+
+        self.granted = 0
+        self.shed = 0
+        self.waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+
+    def push(self, waiter: _Waiter):
+        self.clients.setdefault(waiter.client_id, deque()).append(waiter)
+        self.depth += 1
+
+    def pop(self) -> _Waiter:
+        """Próximo pedido do primeiro cliente, que vai para o fim do rodízio."""
+        client_id, waiters = next(iter(self.clients.items()))
+        waiter = waiters.popleft()
+        if waiters:
+            self.clients.move_to_end(client_id)
+        else:
+            del self.clients[client_id]
+        self.depth -= 1
+        return waiter
+
+    def remove(self, waiter: _Waiter):
+        waiters = self.clients.get(waiter.client_id)
+        if waiters is None or waiter not in waiters:
+            return
+        waiters.remove(waiter)
+        if not waiters:
+            del self.clients[waiter.client_id]
+        self.depth -= 1
+
+
+class FairScheduler:
+    """
+    Controla quantas conexões do pool estão em uso (no máximo 'capacity') e
+    a ordem em que os pedidos em espera são atendidos.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        weights: Dict[str, float],
+        deadlines_ms: Dict[str, float],
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.capacity = capacity
+        self.in_use = 0
+        self._clock = clock
+        self._queues = {
+            name: _ClassQueue(weight, deadlines_ms[name] / 1000)
+            for name, weight in weights.items()
+        }
+        self._virtual_time = 0.0
+        # Média móvel do tempo em que uma vaga fica ocupada (segundos).
+        self._hold_time = 0.05
+
+    def _expected_wait(self, queue: _ClassQueue) -> float:
+        """
+        Espera estimada de um novo pedido: a fila da classe à frente dele,
+        atendida na fração das vagas que cabe à classe.
+        """
+        active_weight = sum(
+            q.weight for q in self._queues.values() if q.depth or q is queue
+        )
+        slots = self.capacity * queue.weight / active_weight
+        return (queue.depth + 1) / slots * self._hold_time
+
+    async def acquire(self, query_class: str, client_id: str) -> float:
+        """
+        Aguarda uma vaga. Retorna o instante da concessão, que deve ser
+        passado para release(). Levanta QueueShedError se o prazo da classe
+        não puder ser cumprido.
+        """
+        queue = self._queues[query_class]
+        now = self._clock()
+
+        if self.in_use < self.capacity and not any(q.depth for q in self._queues.values()):
+            self.in_use += 1
+            self._record_grant(queue, 0.0)
+            return now
+
+        expected_wait = self._expected_wait(queue)
+        if expected_wait > queue.deadline:
+            queue.shed += 1
+            raise QueueShedError(
+                f"Servidor sobrecarregado: espera estimada de {expected_wait * 1000:.0f} ms "
+                f"para queries '{query_class}'. Tente novamente em instantes.",
+                retry_after=expected_wait,
+            )
+
+        if not queue.depth:
+            # Uma classe que volta a ter fila não acumula crédito do tempo ociosa.
+            queue.pass_value = max(queue.pass_value, self._virtual_time)
+
+        waiter = _Waiter(
+            asyncio.get_running_loop().create_future(),
+            client_id,
+            now,
+            now + queue.deadline,
+        )
+        queue.push(waiter)
+
+        try:
+            return await asyncio.wait_for(waiter.future, timeout=queue.deadline)
+        except asyncio.TimeoutError:
+            queue.remove(waiter)
+            queue.shed += 1
+            raise QueueShedError(
+                f"Servidor sobrecarregado: nenhuma conexão livre em "
+                f"{queue.deadline * 1000:.0f} ms para queries '{query_class}'.",
+                retry_after=queue.deadline,
+            )
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # A vaga foi concedida, mas quem pediu desistiu.
+                self.release(waiter.future.result())
+            else:
+                queue.remove(waiter)
+            raise
+
+    def resize(self, capacity: int):
+        """
+        Muda o número de vagas. Com mais vagas, atende a fila na hora; com
+        menos, as vagas em uso são devolvidas normalmente e só as novas
+        concessões respeitam o limite.
+        """
+        self.capacity = capacity
+        self._dispatch()
+
+    def release(self, granted_at: float):
+        """Devolve uma vaga e a concede ao próximo pedido da fila."""
+        self.in_use -= 1
+        self._hold_time = 0.8 * self._hold_time + 0.2 * (self._clock() - granted_at)
+        self._dispatch()
+
+    def _next_queue(self) -> Optional[_ClassQueue]:
+        """Classe com fila de menor 'pass' (a mais atrasada em relação ao seu peso)."""
+        candidates = [q for q in self._queues.values() if q.depth]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda q: q.pass_value)
+
+    def _dispatch(self):
+        while self.in_use < self.capacity:
+            queue = self._next_queue()
+            if queue is None:
+                return
+
+            waiter = queue.pop()
+            now = self._clock()
+            if waiter.future.done():
+                continue
+            if now > waiter.deadline:
+                queue.shed += 1
+                waiter.future.set_exception(
+                    QueueShedError("Prazo da fila esgotado.", retry_after=queue.deadline)
+                )
+                continue
+
+            self._virtual_time = queue.pass_value
+            queue.pass_value += 1 / queue.weight
+            self.in_use += 1
+            self._record_grant(queue, now - waiter.enqueued_at)
+            waiter.future.set_result(now)
+
+    def _record_grant(self, queue: _ClassQueue, wait: float):
+        queue.granted += 1
+        queue.waits.append(wait)
+
+    def stats(self) -> Dict[str, Any]:
+        """Vagas em uso, e por classe: fila, clientes, concessões, descartes e espera."""
+        classes = {}
+        for name, queue in self._queues.items():
+            waits = sorted(queue.waits)
+            classes[name] = {
+                "weight": queue.weight,
+                "depth": queue.depth,
+                "clients": len(queue.clients),
+                "granted": queue.granted,
+                "shed": queue.shed,
+                "wait_ms": {
+                    "p50": _percentile(waits, 0.50) * 1000,
+                    "p95": _percentile(waits, 0.95) * 1000,
+                    "max": (waits[-1] if waits else 0.0) * 1000,
+                },
+            }
+
+        return {
+            "capacity": self.capacity,
+            "in_use": self.in_use,
+            "hold_time_ms": self._hold_time * 1000,
+            "classes": classes,
+        }
+
+
+def _percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, math.ceil(fraction * len(values)) - 1)]
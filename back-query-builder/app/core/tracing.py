@@ -0,0 +1,205 @@
+"""
+Latência por etapa da requisição.
+
+Cada etapa (`stage`/`traced`) mede sua duração e:
+- soma o tempo na requisição corrente, que vira o header Server-Timing
+  (ex: `queue;dur=0.1, db;dur=41.7, encode;dur=1.3, total;dur=45.0`);
+- gera um span (trace_id, span_id, pai), enviado ao fim da requisição ao
+  exportador configurado em TRACING_EXPORTER ("console" ou "file"; o
+  arquivo é escrito por uma thread, fora do event loop);
+- se o opentelemetry-api estiver instalado, abre também um span no tracer
+  do OpenTelemetry (sem SDK configurado, é no-op).
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import queue
+import secrets
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.core.config import settings
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # opentelemetry é opcional.
+    otel_trace = None
+
+_tracer = otel_trace.get_tracer("querybuilder") if otel_trace is not None else None
+
+_span_logger = logging.getLogger("querybuilder.spans")
+_span_listener: Optional[QueueListener] = None
+
+
+class Span:
+    """Um intervalo medido de uma requisição."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time_ns": self.start_ns,
+            "end_time_ns": self.end_ns,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+        }
+
+
+class RequestTrace:
+    """Spans e tempo acumulado por etapa de uma requisição."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = secrets.token_hex(16)
+        self.spans: List[Span] = []
+        self.durations: Dict[str, float] = {}
+
+    def record(self, span: Span):
+        self.spans.append(span)
+        self.durations[span.name] = self.durations.get(span.name, 0.0) + span.duration_ms
+
+    def server_timing(self) -> str:
+        """Valor do header Server-Timing (duração em ms de cada etapa)."""
+        return ", ".join(f"{name};dur={duration:.1f}" for name, duration in self.durations.items())
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_durations() -> Dict[str, float]:
+    """Tempo (ms) acumulado por etapa na requisição corrente, até agora."""
+    request_trace = _current_trace.get()
+    return dict(request_trace.durations) if request_trace is not None else {}
+
+
+@contextmanager
+def stage(name: str, **attributes: Any) -> Iterator[None]:
+    """Mede uma etapa da requisição corrente (sem requisição, não faz nada)."""
+    request_trace = _current_trace.get()
+    if request_trace is None:
+        yield
+        return
+
+    parent = _current_span.get()
+    span = Span(name, request_trace.trace_id, parent.span_id if parent else None, attributes)
+    token = _current_span.set(span)
+
+    with ExitStack() as stack:
+        if _tracer is not None:
+            stack.enter_context(_tracer.start_as_current_span(name, attributes=attributes))
+        try:
+            yield
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+            request_trace.record(span)
+
+
+def traced(name: str) -> Callable:
+    """Decorator que mede a função (síncrona ou async) como uma etapa."""
+
+    def decorator(function: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(function):
+
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with stage(name):
+                    return await function(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def request_trace(name: str) -> Iterator[RequestTrace]:
+    """
+    Abre o rastreamento de uma requisição, com a etapa 'total' como span
+    raiz, e exporta os spans ao final.
+    """
+    current = RequestTrace(name)
+    token = _current_trace.set(current)
+    try:
+        with stage("total", request=name):
+            yield current
+    finally:
+        _current_trace.reset(token)
+        _export(current)
+
+
+def _export(current: RequestTrace):
+    exporter = settings.TRACING_EXPORTER
+    if not exporter:
+        return
+
+    lines = [json.dumps(span.to_dict(), default=str, ensure_ascii=False) for span in current.spans]
+    if exporter == "file":
+        # Só enfileira: a escrita no arquivo é da thread do QueueListener.
+        _file_span_logger().info("\n".join(lines))
+    elif exporter == "console":
+        for line in lines:
+            logging.info(f"span {line}")
+
+
+def _file_span_logger() -> logging.Logger:
+    """
+    Logger dos spans do exportador "file". Na primeira chamada, liga o
+    logger a uma fila esvaziada por um QueueListener, que escreve em
+    TRACING_FILE_PATH em uma thread própria.
+    """
+    global _span_listener
+    if _span_listener is None:
+        span_queue: queue.SimpleQueue = queue.SimpleQueue()
+        file_handler = logging.FileHandler(settings.TRACING_FILE_PATH, encoding="utf-8", delay=True)
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        _span_listener = QueueListener(span_queue, file_handler)
+        _span_listener.start()
+
+        _span_logger.addHandler(QueueHandler(span_queue))
+        _span_logger.setLevel(logging.INFO)
+        _span_logger.propagate = False
+    return _span_logger
+
+
+def close_span_exporter():
+    """Escreve os spans ainda na fila e fecha o arquivo do exportador "file"."""
+    global _span_listener
+    if _span_listener is None:
+        return
+
+    _span_listener.stop()
+    for handler in _span_listener.handlers:
+        handler.close()
+    for handler in list(_span_logger.handlers):
+        _span_logger.removeHandler(handler)
+    _span_listener = None
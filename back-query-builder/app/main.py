@@ -1,9 +1,20 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 
-from app.core.database import connect_to_db, close_db_connection
+from app.core.config import settings
+from app.core.database import connect_to_db, close_db_connection, replica_router
+from app.core.http_client import start_http_client, close_http_client
+from app.core import metrics
+from app.core.tracing import close_span_exporter, request_trace
+from app.services.rollup_refresh import (
+    load_rollup_coverage,
+    run_periodic_coverage_reload,
+    run_periodic_refresh,
+)
 from app.api.v1.endpoints import router as api_v1_router
 
 logging.basicConfig(level=logging.INFO)
@@ -13,16 +24,48 @@ logging.basicConfig(level=logging.INFO)
 async def lifespan(app: FastAPI):
     """
     Gerencia o startup e shutdown da aplicação.
-    Conecta ao banco antes da aplicação começar a receber requests
-    e desconecta quando a aplicação está desligando.
+    Conecta ao banco e cria o cliente HTTP compartilhado antes da
+    aplicação começar a receber requests, e os fecha quando a aplicação
+    está desligando.
+    Se configurada, inicia a refresh periódica dos rollups (ou, com o
+    roteamento ligado e a refresh em outro processo, a releitura da
+    cobertura deles); com réplicas de leitura, inicia a medição periódica
+    do atraso de replicação.
     """
     logging.info("Iniciando aplicação")
     await connect_to_db()
+    await start_http_client()
+
+    if settings.ROLLUP_ROUTING_ENABLED:
+        await load_rollup_coverage()
+
+    refresh_task = None
+    if settings.ROLLUP_REFRESH_INTERVAL_SECONDS > 0:
+        refresh_task = asyncio.create_task(
+            run_periodic_refresh(settings.ROLLUP_REFRESH_INTERVAL_SECONDS)
+        )
+    elif settings.ROLLUP_ROUTING_ENABLED:
+        refresh_task = asyncio.create_task(
+            run_periodic_coverage_reload(settings.ROLLUP_COVERAGE_RELOAD_SECONDS)
+        )
+
+    lag_task = None
+    if replica_router.replicas:
+        lag_task = asyncio.create_task(replica_router.run_lag_monitor())
 
     yield
 
     logging.info("Desligando aplicação")
+    for task in (refresh_task, lag_task):
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    await close_http_client()
     await close_db_connection()
+    close_span_exporter()
 
 
 app = FastAPI(
@@ -43,9 +86,33 @@ app.add_middleware(
 app.include_router(api_v1_router, prefix="/api")
 
 
+@app.middleware("http")
+async def add_server_timing(request: Request, call_next):
+    """
+    Mede as etapas de cada requisição (fila, pool, planejamento, banco,
+    serialização...) e as devolve no header Server-Timing.
+    """
+    with request_trace(f"{request.method} {request.url.path}") as trace:
+        response = await call_next(request)
+    response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
+
 @app.get("/", tags=["Health Check"])
 def read_root():
     """
     Endpoint "Health Check" para verificar se a API está online.
     """
     return {"status": "ok", "message": "Analytics API está no ar!"}
+
+
+@app.get("/metrics", tags=["Health Check"], include_in_schema=False)
+async def get_metrics():
+    """
+    Métricas no formato do Prometheus: espera e timeouts ao obter conexões,
+    conexões em uso/ociosas, rotatividade do pool, fila do escalonador e
+    tempo de execução por formato de query.
+    """
+    # Roda no loop (e não no threadpool): a coleta lê o estado do
+    # escalonador, do pool e das réplicas, que o loop altera.
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,180 @@
+"""
+Controle de admissão por custo.
+
+Antes de executar uma query, obtém o custo e as linhas estimados pelo
+planner (EXPLAIN, sem executar) e os compara aos orçamentos da classe da
+query (a query cabe no orçamento se couber nos dois):
+- dentro do orçamento: a query roda na sua classe;
+- acima do orçamento da classe, mas dentro do de 'export': é rebaixada
+  para 'export' e roda com uma vaga e o statement_timeout de 'export'
+  (a vaga da classe pedida é devolvida ao escalonador);
+- acima do orçamento de 'export': é recusada com 422.
+
+As estimativas ficam em cache por formato de SQL e tamanho do período
+(a mesma SQL com 7 ou 365 dias tem custos bem diferentes).
+"""
+
+import logging
+import math
+from contextlib import asynccontextmanager
+from enum import Enum
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import asyncpg
+
+from app.api.v1.schemas import QueryRequest
+from app.core.config import settings
+from app.core.database import ConnectionFactory, apply_statement_timeout
+from app.core.lru import LRUCache
+from app.core.tracing import traced
+from app.services.result_cache import request_date_bounds
+
+ESTIMATE_CACHE_SIZE = 1024
+
+
+class QueryClass(str, Enum):
+    INTERACTIVE = "interactive"
+    BATCH = "batch"
+    AI = "ai"
+    EXPORT = "export"
+
+
+class QueryRejectedError(Exception):
+    """Query recusada por exceder o orçamento de custo."""
+
+    def __init__(self, detail: str, cost: float, rows: float):
+        super().__init__(detail)
+        self.detail = detail
+        self.cost = cost
+        self.rows = rows
+
+
+estimate_cache = LRUCache(ESTIMATE_CACHE_SIZE)
+
+_counters: Dict[str, int] = {"admitted": 0, "downgraded": 0, "rejected": 0}
+
+
+def admission_stats() -> Dict[str, Any]:
+    """Contadores de admissão e do cache de estimativas."""
+    return {**_counters, "estimates": estimate_cache.stats()}
+
+
+def _period_bucket(request: QueryRequest) -> Optional[int]:
+    """Tamanho do período em potências de 2 de dias (None sem filtro de período)."""
+    bounds = request_date_bounds(request)
+    if bounds is None:
+        return None
+    days = max((bounds[1] - bounds[0]).days, 1)
+    return math.ceil(math.log2(days))
+
+
+async def estimate_cost(
+    conn: asyncpg.Connection, request: QueryRequest, sql: str, params: List[Any]
+) -> Optional[Tuple[float, float]]:
+    """
+    Custo total e linhas estimadas pelo planner, ou None se a conexão não
+    suportar EXPLAIN (ex: conexões de teste).
+    """
+    explain = getattr(conn, "explain", None)
+    if explain is None:
+        return None
+
+    key = (sql, _period_bucket(request))
+    estimate = estimate_cache.get(key)
+    if estimate is None:
+        plan = await explain(sql, *params)
+        estimate = (float(plan["Total Cost"]), float(plan["Plan Rows"]))
+        estimate_cache.put(key, estimate)
+    return estimate
+
+
+@traced("admission")
+async def admit_query(
+    conn: asyncpg.Connection,
+    request: QueryRequest,
+    sql: str,
+    params: List[Any],
+    query_class: QueryClass,
+) -> QueryClass:
+    """
+    Decide a classe em que a query roda (ou a recusa). Se a query fica na
+    classe pedida, aplica o statement_timeout dela na conexão; uma query
+    rebaixada precisa de outra conexão (ver admitted_connection).
+    """
+    admitted = query_class
+    if settings.ADMISSION_ENABLED:
+        admitted = await _admitted_class(conn, request, sql, params, query_class)
+
+    if admitted == query_class:
+        await apply_statement_timeout(conn, settings.STATEMENT_TIMEOUTS_MS[query_class.value])
+    return admitted
+
+
+@asynccontextmanager
+async def admitted_connection(
+    connect: ConnectionFactory,
+    request: QueryRequest,
+    sql: str,
+    params: List[Any],
+    query_class: QueryClass,
+) -> AsyncIterator[Tuple[asyncpg.Connection, QueryClass]]:
+    """
+    Conexão em que a query roda, já admitida, e a classe em que foi
+    admitida. Uma query rebaixada devolve a vaga e a conexão da classe
+    pedida e roda em uma conexão obtida com a vaga de 'export', com o
+    statement_timeout de 'export'.
+    """
+    async with connect(query_class.value) as conn:
+        admitted = await admit_query(conn, request, sql, params, query_class)
+        if admitted == query_class:
+            yield conn, admitted
+            return
+
+    async with connect(admitted.value) as conn:
+        await apply_statement_timeout(conn, settings.STATEMENT_TIMEOUTS_MS[admitted.value])
+        yield conn, admitted
+
+
+async def _admitted_class(
+    conn: asyncpg.Connection,
+    request: QueryRequest,
+    sql: str,
+    params: List[Any],
+    query_class: QueryClass,
+) -> QueryClass:
+    estimate = await estimate_cost(conn, request, sql, params)
+    if estimate is None:
+        return query_class
+
+    cost, rows = estimate
+
+    if _within_budget(query_class, cost, rows):
+        _counters["admitted"] += 1
+        return query_class
+
+    if _within_budget(QueryClass.EXPORT, cost, rows):
+        _counters["downgraded"] += 1
+        logging.info(
+            f"Query rebaixada de '{query_class.value}' para 'export' "
+            f"(custo estimado {cost:.0f}, {rows:.0f} linhas)."
+        )
+        return QueryClass.EXPORT
+
+    _counters["rejected"] += 1
+    logging.warning(f"Query recusada (custo estimado {cost:.0f}, {rows:.0f} linhas).")
+    raise QueryRejectedError(
+        f"Query muito custosa para executar (custo estimado {cost:.0f}, "
+        f"orçamento {settings.ADMISSION_COST_BUDGETS[QueryClass.EXPORT.value]:.0f}; "
+        f"{rows:.0f} linhas estimadas, "
+        f"orçamento {settings.ADMISSION_ROW_BUDGETS[QueryClass.EXPORT.value]:.0f}). "
+        "Reduza o período, o número de dimensões ou adicione filtros.",
+        cost,
+        rows,
+    )
+
+
+def _within_budget(query_class: QueryClass, cost: float, rows: float) -> bool:
+    return (
+        cost <= settings.ADMISSION_COST_BUDGETS[query_class.value]
+        and rows <= settings.ADMISSION_ROW_BUDGETS[query_class.value]
+    )
@@ -1,6 +1,9 @@
 import httpx
 import logging
 import json
+from app.core.config import settings
+from app.core.http_client import post_with_retries
+from app.core.tracing import traced
 from app.services.semantic_layer import METRICS, DIMENSIONS
 
 SIMPLE_METRICS = {k: v["label"] for k, v in METRICS.items()}
@@ -126,13 +129,22 @@ JSON:
 
 
 class AITranslator:
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        client: httpx.AsyncClient,
+        api_url: str = settings.AI_API_URL,
+    ):
         self.api_key = api_key
-        self.api_url = "https://chat.maritaca.ai/api/chat/inference"
+        self.client = client
+        self.api_url = api_url
 
+    @traced("ai")
     async def generate_query_json(self, user_prompt: str) -> str:
         """
-        Chama a API da Maritaca AI para traduzir o texto em JSON.
+        Chama a API da Maritaca AI para traduzir o texto em JSON, usando o
+        cliente HTTP compartilhado (conexões reaproveitadas e retentativas
+        em erros 5xx).
         """
         headers = {
             "Authorization": f"Key {self.api_key}",
@@ -151,31 +163,30 @@ class AITranslator:
             "top_p": 0.1,
         }
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    self.api_url, json=payload, headers=headers, timeout=30.0
-                )
-                response.raise_for_status()
-
-                data = response.json()
-
-                json_output = data["answer"]
-
-                json_output = (
-                    json_output.strip()
-                    .replace("```json", "")
-                    .replace("```", "")
-                    .strip()
-                )
-
-                return json_output
-
-            except httpx.HTTPStatusError as e:
-                logging.error(
-                    f"Erro da API Maritaca ({e.response.status_code}): {e.response.text}"
-                )
-                raise Exception(f"Erro na API da IA: {e.response.status_code}")
-            except Exception as e:
-                logging.error(f"Erro ao chamar AITranslator: {e}")
-                raise e
+        try:
+            response = await post_with_retries(
+                self.client, self.api_url, json=payload, headers=headers
+            )
+            response.raise_for_status()
+
+            data = response.json()
+
+            json_output = data["answer"]
+
+            json_output = (
+                json_output.strip()
+                .replace("```json", "")
+                .replace("```", "")
+                .strip()
+            )
+
+            return json_output
+
+        except httpx.HTTPStatusError as e:
+            logging.error(
+                f"Erro da API Maritaca ({e.response.status_code}): {e.response.text}"
+            )
+            raise Exception(f"Erro na API da IA: {e.response.status_code}")
+        except Exception as e:
+            logging.error(f"Erro ao chamar AITranslator: {e}")
+            raise e
@@ -0,0 +1,119 @@
+"""
+Exportação de resultados em Apache Arrow (IPC stream) e Parquet.
+
+O pyarrow é opcional: sem ele, `arrow_available()` retorna False e o
+endpoint responde 501.
+"""
+
+import decimal
+import io
+from typing import Any, Dict, List, Mapping, Sequence
+
+from app.services.semantic_layer import METRICS, DIMENSIONS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+CURRENCY_PRECISION = 38
+CURRENCY_SCALE = 2
+_CURRENCY_QUANTUM = decimal.Decimal(1).scaleb(-CURRENCY_SCALE)
+
+
+def arrow_available() -> bool:
+    """Indica se o pyarrow está instalado."""
+    return pa is not None
+
+
+def _first_value(values: List[Any]) -> Any:
+    return next((value for value in values if value is not None), None)
+
+
+def _to_currency(value: Any) -> decimal.Decimal:
+    if not isinstance(value, decimal.Decimal):
+        value = decimal.Decimal(str(value))
+    return value.quantize(_CURRENCY_QUANTUM)
+
+
+def _build_column(values: List[Any], semantic_type: str) -> "pa.Array":
+    """
+    Constrói o array Arrow de uma coluna, com o tipo derivado do campo
+    'type' da camada semântica (currency → decimal, time → timestamp,
+    number/percentage → float64, categorias → dicionário). Campos cujos
+    valores não batem com o tipo declarado (ex: hora_venda é 'category'
+    mas numérica) têm o tipo inferido pelo pyarrow.
+    """
+    first = _first_value(values)
+
+    if semantic_type == "currency":
+        return pa.array(
+            [None if v is None else _to_currency(v) for v in values],
+            type=pa.decimal128(CURRENCY_PRECISION, CURRENCY_SCALE),
+        )
+
+    if semantic_type in ("number", "percentage"):
+        return pa.array(
+            [None if v is None else float(v) for v in values], type=pa.float64()
+        )
+
+    if semantic_type == "time" and hasattr(first, "tzinfo"):
+        timezone = "UTC" if first.tzinfo is not None else None
+        return pa.array(values, type=pa.timestamp("us", tz=timezone))
+
+    if isinstance(first, str):
+        array = pa.array(values, type=pa.string())
+        if semantic_type in ("category", "geographic"):
+            return array.dictionary_encode()
+        return array
+
+    return pa.array(values)
+
+
+def build_table(
+    records: Sequence[Mapping[str, Any]],
+    metric_keys: List[str],
+    dimension_keys: List[str],
+    metadata: Dict[str, str],
+) -> "pa.Table":
+    """
+    Monta a tabela Arrow coluna a coluna a partir dos registros do asyncpg.
+    Rótulo e papel de cada campo vão nos metadados do schema.
+    """
+    arrays = []
+    fields = []
+
+    columns = [(key, "metric", METRICS.get(key, {})) for key in metric_keys]
+    columns += [(key, "dimension", DIMENSIONS.get(key, {})) for key in dimension_keys]
+
+    for key, role, info in columns:
+        values = [record[key] for record in records]
+        array = _build_column(values, info.get("type", ""))
+        arrays.append(array)
+        fields.append(
+            pa.field(
+                key,
+                array.type,
+                metadata={"role": role, "label": info.get("label", key)},
+            )
+        )
+
+    schema = pa.schema(fields, metadata=metadata)
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def to_ipc_stream(table: "pa.Table") -> bytes:
+    """Serializa a tabela no formato Arrow IPC (stream)."""
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def to_parquet(table: "pa.Table") -> bytes:
+    """Serializa a tabela em Parquet (compressão zstd)."""
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, compression="zstd")
+    return buffer.getvalue()
@@ -0,0 +1,641 @@
+"""
+Gerador de dados sintéticos para as tabelas do JOIN_PATHS.
+
+Gera um volume realista (de 10 mil a 100 milhões de vendas) para testar
+joins, rollups e índices:
+- popularidade de lojas, produtos e clientes com distribuição de Zipf
+  (poucas lojas e produtos concentram a maior parte das vendas);
+- `created_at` com picos de almoço e jantar, fins de semana mais cheios e
+  crescimento ao longo do período;
+- canais de delivery com taxa de entrega, endereço e entregador; vendas
+  presenciais com taxa de serviço e mais pessoas por mesa.
+
+As tabelas de cadastro (lojas, produtos, canais...) são carregadas
+primeiro; clientes e vendas (com produtos, adicionais, pagamentos, cupons
+e entregas) são gerados em blocos de ids, carregados em paralelo por
+processos via `copy_records_to_table`. Cada bloco tem sua própria semente
+derivada de --seed, então a mesma semente e o mesmo --chunk-size geram os
+mesmos dados, com qualquer número de workers.
+
+Os ids das tabelas filhas são derivados do id do pai (ex: product_sales
+= sale_id * 8 + posição), para não depender da ordem de carga: são
+únicos, mas não contíguos.
+
+Uso:
+    python -m app.services.data_generator --sales 1000000 --create-schema --truncate
+    python -m app.services.data_generator --sales 100000000 --workers 16 --seed 7
+"""
+
+import argparse
+import asyncio
+import bisect
+import datetime
+import decimal
+import itertools
+import logging
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import asyncpg
+
+from app.core.config import settings
+
+MIN_SALES = 10_000
+MAX_SALES = 100_000_000
+DEFAULT_CHUNK_SIZE = 50_000
+
+ZIPF_EXPONENT = 1.1
+
+# Limites por venda: usados também para derivar os ids das tabelas filhas.
+MAX_PRODUCTS_PER_SALE = 8
+MAX_ADDONS_PER_PRODUCT = 4
+MAX_PAYMENTS_PER_SALE = 2
+
+Row = Tuple[Any, ...]
+
+# Colunas de cada tabela, na ordem de carga (cadastros antes dos fatos).
+SCHEMA: Dict[str, List[Tuple[str, str]]] = {
+    "brands": [("id", "INTEGER PRIMARY KEY"), ("name", "TEXT NOT NULL")],
+    "sub_brands": [
+        ("id", "INTEGER PRIMARY KEY"),
+        ("brand_id", "INTEGER NOT NULL"),
+        ("name", "TEXT NOT NULL"),
+    ],
+    "stores": [
+        ("id", "INTEGER PRIMARY KEY"),
+        ("brand_id", "INTEGER"),
+        ("sub_brand_id", "INTEGER"),
+        ("name", "TEXT NOT NULL"),
+        ("city", "TEXT"),
+        ("state", "TEXT"),
+        ("district", "TEXT"),
+        ("is_own", "BOOLEAN"),
+    ],
+    "channels": [
+        ("id", "INTEGER PRIMARY KEY"),
+        ("name", "TEXT NOT NULL"),
+        ("type", "CHAR(1) NOT NULL"),
+    ],
+    "categories": [("id", "INTEGER PRIMARY KEY"), ("name", "TEXT NOT NULL")],
+    "products": [
+        ("id", "INTEGER PRIMARY KEY"),
+        ("category_id", "INTEGER"),
+        ("name", "TEXT NOT NULL"),
+    ],
+    "items": [("id", "INTEGER PRIMARY KEY"), ("name", "TEXT NOT NULL")],
+    "option_groups": [("id", "INTEGER PRIMARY KEY"), ("name", "TEXT NOT NULL")],
+    "payment_types": [("id", "INTEGER PRIMARY KEY"), ("description", "TEXT NOT NULL")],
+    "coupons": [
+        ("id", "INTEGER PRIMARY KEY"),
+        ("code", "TEXT NOT NULL"),
+        ("discount_type", "TEXT NOT NULL"),
+    ],
+    "customers": [
+        ("id", "BIGINT PRIMARY KEY"),
+        ("gender", "TEXT"),
+        ("registration_origin", "TEXT"),
+    ],
+    "sales": [
+        ("id", "BIGINT PRIMARY KEY"),
+        ("store_id", "INTEGER NOT NULL"),
+        ("channel_id", "INTEGER NOT NULL"),
+        ("customer_id", "BIGINT"),
+        ("created_at", "TIMESTAMP NOT NULL"),
+        ("sale_status_desc", "TEXT NOT NULL"),
+        ("origin", "TEXT"),
+        ("total_amount_items", "NUMERIC(12, 2)"),
+        ("total_discount", "NUMERIC(12, 2)"),
+        ("total_increase", "NUMERIC(12, 2)"),
+        ("delivery_fee", "NUMERIC(12, 2)"),
+        ("service_tax_fee", "NUMERIC(12, 2)"),
+        ("total_amount", "NUMERIC(12, 2)"),
+        ("value_paid", "NUMERIC(12, 2)"),
+        ("people_quantity", "INTEGER"),
+        ("production_seconds", "INTEGER"),
+        ("delivery_seconds", "INTEGER"),
+    ],
+    "product_sales": [
+        ("id", "BIGINT PRIMARY KEY"),
+        ("sale_id", "BIGINT NOT NULL"),
+        ("product_id", "INTEGER NOT NULL"),
+        ("quantity", "INTEGER NOT NULL"),
+        ("total_price", "NUMERIC(12, 2)"),
+    ],
+    "item_product_sales": [
+        ("id", "BIGINT PRIMARY KEY"),
+        ("product_sale_id", "BIGINT NOT NULL"),
+        ("item_id", "INTEGER NOT NULL"),
+        ("option_group_id", "INTEGER"),
+        ("quantity", "INTEGER NOT NULL"),
+        ("additional_price", "NUMERIC(12, 2)"),
+    ],
+    "payments": [
+        ("id", "BIGINT PRIMARY KEY"),
+        ("sale_id", "BIGINT NOT NULL"),
+        ("payment_type_id", "INTEGER NOT NULL"),
+        ("value", "NUMERIC(12, 2)"),
+        ("is_online", "BOOLEAN"),
+    ],
+    "coupon_sales": [
+        ("id", "BIGINT PRIMARY KEY"),
+        ("sale_id", "BIGINT NOT NULL"),
+        ("coupon_id", "INTEGER NOT NULL"),
+        ("value", "NUMERIC(12, 2)"),
+    ],
+    "delivery_sales": [
+        ("id", "BIGINT PRIMARY KEY"),
+        ("sale_id", "BIGINT NOT NULL"),
+        ("courier_name", "TEXT"),
+        ("courier_fee", "NUMERIC(12, 2)"),
+        ("delivered_by", "TEXT"),
+        ("delivery_type", "TEXT"),
+    ],
+    "delivery_addresses": [
+        ("id", "BIGINT PRIMARY KEY"),
+        ("sale_id", "BIGINT NOT NULL"),
+        ("neighborhood", "TEXT"),
+        ("city", "TEXT"),
+    ],
+}
+
+CATALOG_TABLES = [
+    "brands",
+    "sub_brands",
+    "stores",
+    "channels",
+    "categories",
+    "products",
+    "items",
+    "option_groups",
+    "payment_types",
+    "coupons",
+]
+SALES_TABLES = [
+    "sales",
+    "product_sales",
+    "item_product_sales",
+    "payments",
+    "coupon_sales",
+    "delivery_sales",
+    "delivery_addresses",
+]
+
+BRANDS = {
+    "Sabor da Casa": ["Sabor da Casa Express", "Sabor da Casa Bistrô"],
+    "Burguer Prime": ["Burguer Prime", "Prime Smash"],
+    "Pizza Nostra": ["Pizza Nostra", "Nostra Delivery"],
+}
+CITIES = {
+    ("São Paulo", "SP"): ["Pinheiros", "Moema", "Tatuapé", "Santana", "Vila Mariana", "Itaim Bibi"],
+    ("Rio de Janeiro", "RJ"): ["Copacabana", "Tijuca", "Barra da Tijuca", "Botafogo"],
+    ("Belo Horizonte", "MG"): ["Savassi", "Pampulha", "Lourdes"],
+    ("Curitiba", "PR"): ["Batel", "Água Verde", "Centro Cívico"],
+    ("Porto Alegre", "RS"): ["Moinhos de Vento", "Cidade Baixa"],
+}
+# (nome, tipo, peso): tipo 'P' é presencial e 'D' é delivery.
+CHANNELS = [
+    ("Presencial", "P", 35),
+    ("iFood", "D", 30),
+    ("Rappi", "D", 10),
+    ("Uber Eats", "D", 5),
+    ("WhatsApp", "D", 8),
+    ("App Próprio", "D", 12),
+]
+# (categoria, faixa de preço em centavos)
+CATEGORIES = [
+    ("Lanches", (1800, 4500)),
+    ("Pizzas", (3500, 8900)),
+    ("Bebidas", (500, 1500)),
+    ("Sobremesas", (900, 2500)),
+    ("Porções", (2200, 5500)),
+    ("Saladas", (2000, 4200)),
+    ("Combos", (3500, 7900)),
+]
+ITEMS = ["Bacon", "Queijo Extra", "Cheddar", "Ovo", "Catupiry", "Borda Recheada", "Molho Especial", "Cebola Crispy"]
+OPTION_GROUPS = ["Adicionais", "Molhos", "Bordas", "Acompanhamentos"]
+# (descrição, online?)
+PAYMENT_TYPES = [
+    ("Cartão de Crédito", False),
+    ("Cartão de Débito", False),
+    ("Pix", False),
+    ("Dinheiro", False),
+    ("Vale-Refeição", False),
+    ("Pagamento Online", True),
+]
+GENDERS = ["F", "M", "O"]
+REGISTRATION_ORIGINS = ["app", "site", "ifood", "loja", "whatsapp"]
+COUPON_COUNT = 50
+COURIER_COUNT = 200
+
+# Peso de cada hora do dia: pico do almoço (11h-14h) e do jantar (18h-22h).
+HOUR_WEIGHTS = [
+    1, 0.5, 0.2, 0.1, 0.1, 0.1, 0.3, 1, 2, 3, 6, 14,
+    20, 15, 6, 3, 3, 6, 12, 18, 20, 14, 7, 3,
+]
+# Peso de cada dia da semana (segunda a domingo).
+WEEKDAY_WEIGHTS = [0.8, 0.85, 0.9, 1.0, 1.25, 1.4, 1.2]
+# Crescimento do movimento do primeiro ao último dia do período.
+PERIOD_GROWTH = 0.3
+
+
+def _cumulative(weights: Sequence[float]) -> List[float]:
+    return list(itertools.accumulate(weights))
+
+
+def zipf_weights(count: int, exponent: float = ZIPF_EXPONENT) -> List[float]:
+    """Peso do item de posição k (a partir de 1) proporcional a 1 / k^exponent."""
+    return [1.0 / (rank**exponent) for rank in range(1, count + 1)]
+
+
+def _money(cents: int) -> decimal.Decimal:
+    return decimal.Decimal(cents).scaleb(-2)
+
+
+class Catalog:
+    """
+    Cadastros (lojas, canais, produtos...) e as distribuições usadas na
+    geração das vendas. Depende só da semente e dos tamanhos, para que
+    cada worker reconstrua exatamente o mesmo catálogo.
+    """
+
+    def __init__(
+        self,
+        seed: int,
+        stores: int,
+        products: int,
+        customers: int,
+        start_date: datetime.date,
+        days: int,
+    ):
+        rng = random.Random(f"{seed}:catalog")
+        self.customers = customers
+        self.start_date = start_date
+        self.days = days
+        self.rows: Dict[str, List[Row]] = {}
+
+        self.rows["brands"] = [(i, name) for i, name in enumerate(BRANDS, start=1)]
+        sub_brand_ids: Dict[int, List[int]] = {}
+        sub_brands = []
+        for brand_id, name in self.rows["brands"]:
+            for sub_name in BRANDS[name]:
+                sub_brands.append((len(sub_brands) + 1, brand_id, sub_name))
+                sub_brand_ids.setdefault(brand_id, []).append(len(sub_brands))
+        self.rows["sub_brands"] = sub_brands
+
+        locations = [(city, state, d) for (city, state), ds in CITIES.items() for d in ds]
+        self.rows["stores"] = []
+        self.store_location: List[Tuple[str, List[str]]] = []
+        for store_id in range(1, stores + 1):
+            brand_id, brand_name = rng.choice(self.rows["brands"])
+            city, state, district = rng.choice(locations)
+            self.rows["stores"].append(
+                (
+                    store_id,
+                    brand_id,
+                    rng.choice(sub_brand_ids[brand_id]),
+                    f"{brand_name} {district} {store_id}",
+                    city,
+                    state,
+                    district,
+                    rng.random() < 0.7,
+                )
+            )
+            self.store_location.append((city, CITIES[(city, state)]))
+
+        self.rows["channels"] = [(i, name, kind) for i, (name, kind, _) in enumerate(CHANNELS, start=1)]
+        self.channel_is_delivery = [kind == "D" for _, kind, _ in CHANNELS]
+
+        self.rows["categories"] = [(i, name) for i, (name, _) in enumerate(CATEGORIES, start=1)]
+        self.rows["products"] = []
+        self.product_prices: List[int] = []
+        for product_id in range(1, products + 1):
+            category_index = rng.randrange(len(CATEGORIES))
+            category, (low, high) = CATEGORIES[category_index]
+            self.rows["products"].append((product_id, category_index + 1, f"{category} {product_id}"))
+            # Preços "quebrados" (ex: 29,90).
+            self.product_prices.append(rng.randint(low // 100, high // 100) * 100 - 10)
+
+        self.rows["items"] = [(i, name) for i, name in enumerate(ITEMS, start=1)]
+        self.rows["option_groups"] = [(i, name) for i, name in enumerate(OPTION_GROUPS, start=1)]
+        self.rows["payment_types"] = [(i, name) for i, (name, _) in enumerate(PAYMENT_TYPES, start=1)]
+        self.rows["coupons"] = [
+            (i, f"CUPOM{i:03d}", "percentage" if rng.random() < 0.6 else "fixed")
+            for i in range(1, COUPON_COUNT + 1)
+        ]
+        self.coupon_is_percentage = [row[2] == "percentage" for row in self.rows["coupons"]]
+
+        # A popularidade não segue a ordem dos ids: a loja 1 não é sempre a líder.
+        store_weights = zipf_weights(stores)
+        rng.shuffle(store_weights)
+        self.store_cum_weights = _cumulative(store_weights)
+        product_weights = zipf_weights(products)
+        rng.shuffle(product_weights)
+        self.product_cum_weights = _cumulative(product_weights)
+        self.item_cum_weights = _cumulative(zipf_weights(len(ITEMS)))
+        self.coupon_cum_weights = _cumulative(zipf_weights(COUPON_COUNT))
+        self.channel_cum_weights = _cumulative([weight for _, _, weight in CHANNELS])
+        self.hour_cum_weights = _cumulative(HOUR_WEIGHTS)
+        self.day_cum_weights = _cumulative(
+            [
+                WEEKDAY_WEIGHTS[(start_date + datetime.timedelta(days=day)).weekday()]
+                * (1 + PERIOD_GROWTH * day / max(days - 1, 1))
+                for day in range(days)
+            ]
+        )
+
+
+def _pick(rng: random.Random, cum_weights: List[float]) -> int:
+    """Índice (a partir de 0) sorteado segundo os pesos acumulados."""
+    return bisect.bisect(cum_weights, rng.random() * cum_weights[-1])
+
+
+def _zipf_id(rng: random.Random, count: int) -> int:
+    """Id de 1 a count com P(k) ~ 1/k, sem tabela de pesos (para milhões de clientes)."""
+    return min(int(count ** rng.random()), count)
+
+
+def generate_customers(seed: int, first_id: int, count: int) -> List[Row]:
+    rng = random.Random(f"{seed}:customers:{first_id}")
+    return [
+        (
+            customer_id,
+            rng.choice(GENDERS) if rng.random() < 0.9 else None,
+            rng.choice(REGISTRATION_ORIGINS),
+        )
+        for customer_id in range(first_id, first_id + count)
+    ]
+
+
+def generate_sales(catalog: Catalog, seed: int, first_id: int, count: int) -> Dict[str, List[Row]]:
+    """
+    Gera as vendas de ids [first_id, first_id + count) e as linhas das
+    tabelas filhas. O resultado depende só de (seed, first_id, count).
+    """
+    rng = random.Random(f"{seed}:sales:{first_id}")
+    rows: Dict[str, List[Row]] = {table: [] for table in SALES_TABLES}
+    start = datetime.datetime.combine(catalog.start_date, datetime.time())
+
+    for sale_id in range(first_id, first_id + count):
+        store_index = _pick(rng, catalog.store_cum_weights)
+        channel_index = _pick(rng, catalog.channel_cum_weights)
+        is_delivery = catalog.channel_is_delivery[channel_index]
+        created_at = start + datetime.timedelta(
+            days=_pick(rng, catalog.day_cum_weights),
+            hours=_pick(rng, catalog.hour_cum_weights),
+            seconds=rng.randrange(3600),
+        )
+        customer_id = _zipf_id(rng, catalog.customers) if rng.random() < 0.7 else None
+        cancelled = rng.random() < 0.04
+
+        items_cents = 0
+        product_count = 1 + min(int(rng.expovariate(1.2)), MAX_PRODUCTS_PER_SALE - 1)
+        for position in range(product_count):
+            product_index = _pick(rng, catalog.product_cum_weights)
+            quantity = 1 + (rng.random() < 0.25) + (rng.random() < 0.08)
+            price_cents = catalog.product_prices[product_index] * quantity
+            product_sale_id = sale_id * MAX_PRODUCTS_PER_SALE + position
+            rows["product_sales"].append(
+                (product_sale_id, sale_id, product_index + 1, quantity, _money(price_cents))
+            )
+            items_cents += price_cents
+
+            addon_count = 0 if rng.random() < 0.6 else rng.randint(1, MAX_ADDONS_PER_PRODUCT - 1)
+            for addon_position in range(addon_count):
+                additional_cents = rng.randrange(100, 800, 50)
+                rows["item_product_sales"].append(
+                    (
+                        product_sale_id * MAX_ADDONS_PER_PRODUCT + addon_position,
+                        product_sale_id,
+                        _pick(rng, catalog.item_cum_weights) + 1,
+                        rng.randint(1, len(OPTION_GROUPS)) if rng.random() < 0.9 else None,
+                        1,
+                        _money(additional_cents),
+                    )
+                )
+                items_cents += additional_cents
+
+        discount_cents = 0
+        if rng.random() < 0.08:
+            coupon_index = _pick(rng, catalog.coupon_cum_weights)
+            if catalog.coupon_is_percentage[coupon_index]:
+                coupon_cents = items_cents * rng.choice([5, 10, 15, 20]) // 100
+            else:
+                coupon_cents = min(rng.choice([500, 1000, 1500]), items_cents // 2)
+            rows["coupon_sales"].append((sale_id, sale_id, coupon_index + 1, _money(coupon_cents)))
+            discount_cents += coupon_cents
+        if rng.random() < 0.05:
+            discount_cents += items_cents * rng.randint(1, 10) // 100
+
+        increase_cents = rng.randrange(100, 500) if rng.random() < 0.02 else 0
+        delivery_fee_cents = 0
+        service_tax_cents = 0
+        delivery_seconds = None
+        people = 1
+
+        if is_delivery:
+            takeout = rng.random() < 0.15
+            if not takeout:
+                delivery_fee_cents = 0 if rng.random() < 0.2 else rng.randrange(499, 1299, 100)
+                delivery_seconds = max(600, int(rng.gauss(2100, 600)))
+                city, districts = catalog.store_location[store_index]
+                rows["delivery_addresses"].append((sale_id, sale_id, rng.choice(districts), city))
+            rows["delivery_sales"].append(
+                (
+                    sale_id,
+                    sale_id,
+                    None if takeout else f"Entregador {rng.randint(1, COURIER_COUNT)}",
+                    _money(0 if takeout else rng.randrange(400, 1000, 50)),
+                    "Loja" if takeout or rng.random() < 0.3 else "Marketplace",
+                    "TAKEOUT" if takeout else "DELIVERY",
+                )
+            )
+        else:
+            people = 1 + min(int(rng.expovariate(0.8)), 7)
+            if rng.random() < 0.5:
+                service_tax_cents = items_cents // 10
+
+        total_cents = items_cents - discount_cents + increase_cents + delivery_fee_cents + service_tax_cents
+        paid_cents = 0 if cancelled else total_cents
+
+        if not cancelled:
+            online = is_delivery and CHANNELS[channel_index][0] != "WhatsApp"
+            split = 2 if rng.random() < 0.15 else 1
+            remaining = total_cents
+            for position in range(split):
+                value_cents = remaining if position == split - 1 else total_cents // 2
+                remaining -= value_cents
+                payment_type = len(PAYMENT_TYPES) if online else rng.randint(1, len(PAYMENT_TYPES) - 1)
+                rows["payments"].append(
+                    (
+                        sale_id * MAX_PAYMENTS_PER_SALE + position,
+                        sale_id,
+                        payment_type,
+                        _money(value_cents),
+                        online,
+                    )
+                )
+
+        rows["sales"].append(
+            (
+                sale_id,
+                store_index + 1,
+                channel_index + 1,
+                customer_id,
+                created_at,
+                "CANCELLED" if cancelled else "COMPLETED",
+                "POS" if not is_delivery else "ONLINE",
+                _money(items_cents),
+                _money(discount_cents),
+                _money(increase_cents),
+                _money(delivery_fee_cents),
+                _money(service_tax_cents),
+                _money(total_cents),
+                _money(paid_cents),
+                people,
+                max(120, int(rng.gauss(900, 300))),
+                delivery_seconds,
+            )
+        )
+
+    return rows
+
+
+def _create_table_sql(table: str) -> str:
+    columns = ",\n    ".join(f"{name} {spec}" for name, spec in SCHEMA[table])
+    return f"CREATE TABLE IF NOT EXISTS {table} (\n    {columns}\n)"
+
+
+async def _copy(conn: asyncpg.Connection, table: str, records: List[Row]):
+    if records:
+        await conn.copy_records_to_table(
+            table, records=records, columns=[name for name, _ in SCHEMA[table]]
+        )
+
+
+def _connection_kwargs() -> Dict[str, Any]:
+    return {
+        "host": settings.DB_HOST,
+        "port": settings.DB_PORT,
+        "user": settings.DB_USER,
+        "password": settings.DB_PASSWORD,
+        "database": settings.DB_NAME,
+    }
+
+
+# Catálogo de cada processo worker, montado uma vez no initializer.
+_worker_catalog: Optional[Catalog] = None
+
+
+def _init_worker(catalog: Catalog):
+    global _worker_catalog
+    _worker_catalog = catalog
+
+
+def _load_chunk(seed: int, kind: str, first_id: int, count: int) -> int:
+    """Gera e carrega um bloco (em um processo worker). Retorna as linhas carregadas."""
+    if kind == "customers":
+        tables = {"customers": generate_customers(seed, first_id, count)}
+    else:
+        tables = generate_sales(_worker_catalog, seed, first_id, count)
+
+    async def load():
+        conn = await asyncpg.connect(**_connection_kwargs())
+        try:
+            async with conn.transaction():
+                for table, records in tables.items():
+                    await _copy(conn, table, records)
+        finally:
+            await conn.close()
+
+    asyncio.run(load())
+    return sum(len(records) for records in tables.values())
+
+
+def _chunks(total: int, chunk_size: int) -> List[Tuple[int, int]]:
+    return [(first, min(chunk_size, total - first + 1)) for first in range(1, total + 1, chunk_size)]
+
+
+async def _prepare(catalog: Catalog, create_schema: bool, truncate: bool):
+    conn = await asyncpg.connect(**_connection_kwargs())
+    try:
+        if create_schema:
+            for table in SCHEMA:
+                await conn.execute(_create_table_sql(table))
+        if truncate:
+            await conn.execute(f"TRUNCATE {', '.join(SCHEMA)}")
+        async with conn.transaction():
+            for table in CATALOG_TABLES:
+                await _copy(conn, table, catalog.rows[table])
+    finally:
+        await conn.close()
+
+
+async def _analyze():
+    conn = await asyncpg.connect(**_connection_kwargs())
+    try:
+        for table in SCHEMA:
+            await conn.execute(f"ANALYZE {table}")
+    finally:
+        await conn.close()
+
+
+def generate(args: argparse.Namespace):
+    customers = args.customers or max(args.sales // 8, 100)
+    catalog = Catalog(args.seed, args.stores, args.products, customers, args.start_date, args.days)
+
+    started = time.perf_counter()
+    asyncio.run(_prepare(catalog, args.create_schema, args.truncate))
+    logging.info(f"Cadastros carregados ({', '.join(CATALOG_TABLES)}).")
+
+    tasks = [("customers", first, count) for first, count in _chunks(customers, args.chunk_size)]
+    tasks += [("sales", first, count) for first, count in _chunks(args.sales, args.chunk_size)]
+
+    loaded_rows = 0
+    with ProcessPoolExecutor(
+        max_workers=args.workers, initializer=_init_worker, initargs=(catalog,)
+    ) as executor:
+        futures = [executor.submit(_load_chunk, args.seed, *task) for task in tasks]
+        for done, future in enumerate(as_completed(futures), start=1):
+            loaded_rows += future.result()
+            if done % max(len(futures) // 20, 1) == 0 or done == len(futures):
+                elapsed = time.perf_counter() - started
+                logging.info(
+                    f"{done}/{len(futures)} blocos, {loaded_rows} linhas "
+                    f"({loaded_rows / elapsed:,.0f} linhas/s)."
+                )
+
+    asyncio.run(_analyze())
+    logging.info(
+        f"{args.sales} vendas e {customers} clientes gerados em "
+        f"{time.perf_counter() - started:.1f} s (semente {args.seed})."
+    )
+
+
+def _sales_count(value: str) -> int:
+    count = int(value)
+    if not MIN_SALES <= count <= MAX_SALES:
+        raise argparse.ArgumentTypeError(f"use entre {MIN_SALES} e {MAX_SALES} vendas.")
+    return count
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Gera dados sintéticos de vendas no banco.")
+    parser.add_argument("--sales", type=_sales_count, default=100_000, help="Número de vendas.")
+    parser.add_argument("--seed", type=int, default=42, help="Semente (mesma semente, mesmos dados).")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processos de carga.")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Vendas por bloco.")
+    parser.add_argument("--stores", type=int, default=50)
+    parser.add_argument("--products", type=int, default=300)
+    parser.add_argument("--customers", type=int, help="Padrão: uma para cada 8 vendas.")
+    parser.add_argument(
+        "--start-date", type=datetime.date.fromisoformat, default=datetime.date(2025, 1, 1)
+    )
+    parser.add_argument("--days", type=int, default=365, help="Dias do período das vendas.")
+    parser.add_argument("--create-schema", action="store_true", help="Cria as tabelas que não existirem.")
+    parser.add_argument("--truncate", action="store_true", help="Esvazia as tabelas antes de carregar.")
+    generate(parser.parse_args())
@@ -0,0 +1,468 @@
+"""
+Sugestão de índices a partir das queries realmente executadas.
+
+O advisor junta a carga observada (formatos de query gerados pelo
+QueryBuilder, com contagem e tempo total), mapeia os campos filtrados e
+os joins de volta às colunas das tabelas via DIMENSIONS e JOIN_PATHS, e
+propõe `CREATE INDEX CONCURRENTLY` ordenados pelo benefício estimado
+(tempo gasto pelas queries que usariam o índice, ponderado pela
+seletividade vinda do pg_stats). Índices que já existem (pg_indexes) são
+descartados. Com a extensão hypopg instalada, cada sugestão pode ser
+conferida com um índice hipotético e EXPLAIN (custo antes/depois).
+
+Uso via CLI:
+    python -m app.services.index_advisor [--requests ARQUIVO.json] [--hypothetical] [--offline]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import asyncpg
+
+from app.api.v1.schemas import FilterOperator, QueryRequest
+from app.core.database import (
+    acquire_connection,
+    close_db_connection,
+    connect_to_db,
+    query_shape,
+)
+from app.services.query_engine import QueryBuilder, _build_date_filter
+from app.services.semantic_layer import DIMENSIONS, JOIN_PATHS, ROLLUPS
+
+MAX_SHAPES = 500
+DEFAULT_SELECTIVITY = 0.1
+
+# Peso de cada tipo de uso no benefício estimado.
+RANGE_FACTOR = 0.5
+JOIN_FACTOR = 0.5
+
+EQUALITY_OPERATORS = {FilterOperator.EQ, FilterOperator.IN}
+RANGE_OPERATORS = {
+    FilterOperator.GT,
+    FilterOperator.GTE,
+    FilterOperator.LT,
+    FilterOperator.LTE,
+    FilterOperator.BETWEEN,
+}
+
+DATE_COLUMN = ("sales", "created_at")
+
+_COLUMN_RE = re.compile(r"^(\w+)\.(\w+)$")
+_REFERENCE_RE = re.compile(r"\b([a-z_]+)\.([a-z_]+)\b")
+_JOIN_ON_RE = re.compile(r"^\s*(\w+)\.(\w+)\s*=\s*(\w+)\.(\w+)\s*$")
+_AGGREGATE_RE = re.compile(r"\b(SUM|COUNT|AVG|MIN|MAX)\s*\(", re.IGNORECASE)
+_TIME_FUNCTION_RE = re.compile(r"\b(DATE_TRUNC|EXTRACT|DATE)\s*\(", re.IGNORECASE)
+
+
+class WorkloadCollector:
+    """Formatos de query executados, com contagem e tempo total."""
+
+    def __init__(self, max_shapes: int = MAX_SHAPES):
+        self.max_shapes = max_shapes
+        self._shapes: Dict[str, Dict[str, Any]] = {}
+
+    def observe(self, request: QueryRequest, sql: str, params: List[Any], duration_ms: float):
+        shape = query_shape(sql)
+        entry = self._shapes.get(shape)
+        if entry is None:
+            if len(self._shapes) >= self.max_shapes:
+                return
+            entry = self._shapes[shape] = {"count": 0, "total_ms": 0.0}
+
+        entry.update(request=request, sql=sql, params=params)
+        entry["count"] += 1
+        entry["total_ms"] += duration_ms
+
+    def shapes(self) -> List[Dict[str, Any]]:
+        return list(self._shapes.values())
+
+    def clear(self):
+        self._shapes.clear()
+
+
+workload = WorkloadCollector()
+
+
+def index_key(sql: str) -> Optional[Tuple[str, str]]:
+    """
+    (tabela, chave do índice) para o SQL de um campo: a coluna, para
+    campos simples (`stores.name`), ou a expressão entre parênteses, para
+    expressões sobre uma única coluna (`EXTRACT(HOUR FROM sales.created_at)`).
+    Agregações e expressões sobre várias colunas não são indexáveis.
+    """
+    match = _COLUMN_RE.match(sql.strip())
+    if match:
+        return match.group(1), match.group(2)
+
+    if _AGGREGATE_RE.search(sql):
+        return None
+    references = set(_REFERENCE_RE.findall(sql))
+    if len(references) != 1:
+        return None
+
+    table, _ = references.pop()
+    return table, f"({sql.strip().replace(f'{table}.', '')})"
+
+
+def _join_columns(join_name: str) -> List[Tuple[str, str]]:
+    """Colunas de chave estrangeira de um join (a chave primária 'id' já tem índice)."""
+    match = _JOIN_ON_RE.match(JOIN_PATHS[join_name]["on"])
+    if not match:
+        return []
+    left, right = match.group(1, 2), match.group(3, 4)
+    return [column for column in (left, right) if column[1] != "id"]
+
+
+def column_uses(request: QueryRequest) -> List[Dict[str, Any]]:
+    """
+    Usos indexáveis de uma query: o período (sales.created_at), os
+    filtros de igualdade e de intervalo e as chaves estrangeiras dos joins.
+    """
+    uses = []
+
+    date_clause, _ = _build_date_filter(request.dateRange, request.customDateRange)
+    if date_clause:
+        uses.append({"key": DATE_COLUMN, "kind": "date_range", "field": "created_at"})
+
+    for f in request.filters or []:
+        info = DIMENSIONS.get(f.field)
+        if not info:
+            continue
+        key = index_key(info["sql"])
+        if key is None:
+            continue
+        if f.operator in EQUALITY_OPERATORS:
+            uses.append({"key": key, "kind": "filter_eq", "field": f.field})
+        elif f.operator in RANGE_OPERATORS:
+            uses.append({"key": key, "kind": "filter_range", "field": f.field})
+
+    # Os joins vêm do plano final (semi-joins EXISTS, joins eliminados),
+    # não dos campos pedidos: só contam os que aparecem no SQL.
+    builder = QueryBuilder(request)
+    builder.compile()
+    for join_name in builder.rendered_joins:
+        for column in _join_columns(join_name):
+            uses.append({"key": column, "kind": "join", "field": join_name})
+
+    return uses
+
+
+def _normalize(expression: str) -> str:
+    expression = re.sub(r"::[\w ]+", "", expression.lower())
+    return re.sub(r"[\s()\"]", "", expression)
+
+
+def _is_indexed(key: Tuple[str, str], existing: Dict[str, List[str]]) -> bool:
+    """Se algum índice da tabela já começa pela coluna/expressão."""
+    table, expression = key
+    wanted = _normalize(expression)
+    return any(
+        _normalize(definition).startswith(wanted) for definition in existing.get(table, [])
+    )
+
+
+def _selectivity(key: Tuple[str, str], stats: Dict[Tuple[str, str], Dict[str, float]]) -> float:
+    """Fração das linhas com um mesmo valor, pelo n_distinct do pg_stats."""
+    column_stats = stats.get(key)
+    if not column_stats:
+        return DEFAULT_SELECTIVITY
+
+    n_distinct = column_stats["n_distinct"]
+    if n_distinct < 0:
+        n_distinct = -n_distinct * max(column_stats.get("reltuples", 0.0), 1.0)
+    return 1.0 / n_distinct if n_distinct >= 1 else 1.0
+
+
+def _index_name(key: Tuple[str, str]) -> str:
+    table, expression = key
+    slug = re.sub(r"[^a-z0-9]+", "_", expression.lower()).strip("_")
+    return f"idx_{table}_{slug}"[:63]
+
+
+def create_index_sql(key: Tuple[str, str], concurrently: bool = True) -> str:
+    table, expression = key
+    if concurrently:
+        return f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {_index_name(key)} ON {table} ({expression})"
+    return f"CREATE INDEX ON {table} ({expression})"
+
+
+def _is_rollup_sql(sql: str) -> bool:
+    return any(f"FROM {rollup['table']}" in sql for rollup in ROLLUPS.values())
+
+
+def propose_indexes(
+    shapes: Iterable[Dict[str, Any]],
+    existing: Optional[Dict[str, List[str]]] = None,
+    stats: Optional[Dict[Tuple[str, str], Dict[str, float]]] = None,
+    column_types: Optional[Dict[Tuple[str, str], str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Sugestões ordenadas pelo benefício estimado (ms de carga que o índice
+    ajudaria), sem os índices que já existem.
+    """
+    existing = existing or {}
+    stats = stats or {}
+    column_types = column_types or {}
+    candidates: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    for shape in shapes:
+        if _is_rollup_sql(shape["sql"]):
+            continue
+
+        for use in column_uses(shape["request"]):
+            key = use["key"]
+            if key in candidates and any(s is shape for s in candidates[key]["_shapes"]):
+                continue
+
+            if use["kind"] == "filter_eq":
+                factor = 1.0 - _selectivity(key, stats)
+            elif use["kind"] == "filter_range":
+                factor = RANGE_FACTOR
+            elif use["kind"] == "join":
+                factor = JOIN_FACTOR
+            else:
+                factor = 1.0
+
+            candidate = candidates.setdefault(
+                key,
+                {"kinds": set(), "fields": set(), "queries": 0, "workload_ms": 0.0,
+                 "estimated_benefit_ms": 0.0, "_shapes": []},
+            )
+            candidate["kinds"].add(use["kind"])
+            candidate["fields"].add(use["field"])
+            candidate["queries"] += shape["count"]
+            candidate["workload_ms"] += shape["total_ms"]
+            candidate["estimated_benefit_ms"] += shape["total_ms"] * factor
+            candidate["_shapes"].append(shape)
+
+    proposals = []
+    for key, candidate in candidates.items():
+        if _is_indexed(key, existing):
+            continue
+
+        table, expression = key
+        if _TIME_FUNCTION_RE.search(expression) and any(
+            column_types.get((table, column)) == "timestamp with time zone"
+            for column in re.findall(r"\w+", expression)
+        ):
+            # Funções de data sobre timestamptz não são IMMUTABLE e não
+            # podem ser indexadas.
+            continue
+
+        heaviest = max(candidate["_shapes"], key=lambda shape: shape["total_ms"])
+        proposals.append(
+            {
+                "table": table,
+                "key": expression,
+                "statement": create_index_sql(key),
+                "kinds": sorted(candidate["kinds"]),
+                "fields": sorted(candidate["fields"]),
+                "queries": candidate["queries"],
+                "workload_ms": candidate["workload_ms"],
+                "estimated_benefit_ms": candidate["estimated_benefit_ms"],
+                "selectivity": _selectivity(key, stats),
+                "hypothetical": None,
+                "_sample": (heaviest["sql"], heaviest["params"]),
+            }
+        )
+
+    proposals.sort(key=lambda proposal: proposal["estimated_benefit_ms"], reverse=True)
+    return proposals
+
+
+async def _catalog(conn: asyncpg.Connection, tables: List[str]):
+    """Índices existentes, estatísticas e tipos das colunas das tabelas."""
+    existing: Dict[str, List[str]] = {}
+    for row in await conn.fetch(
+        "SELECT tablename, indexdef FROM pg_indexes "
+        "WHERE schemaname = current_schema() AND tablename = ANY($1::text[])",
+        tables,
+    ):
+        definition = re.search(r"USING \w+ \((.*)\)", row["indexdef"])
+        if definition:
+            existing.setdefault(row["tablename"], []).append(definition.group(1))
+
+    stats: Dict[Tuple[str, str], Dict[str, float]] = {}
+    for row in await conn.fetch(
+        """
+        SELECT s.tablename, s.attname, s.n_distinct, c.reltuples
+        FROM pg_stats s
+        JOIN pg_class c ON c.relname = s.tablename
+        JOIN pg_namespace n ON n.oid = c.relnamespace AND n.nspname = s.schemaname
+        WHERE s.schemaname = current_schema() AND s.tablename = ANY($1::text[])
+        """,
+        tables,
+    ):
+        stats[(row["tablename"], row["attname"])] = {
+            "n_distinct": float(row["n_distinct"]),
+            "reltuples": float(row["reltuples"]),
+        }
+
+    column_types: Dict[Tuple[str, str], str] = {}
+    for row in await conn.fetch(
+        "SELECT table_name, column_name, data_type FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = ANY($1::text[])",
+        tables,
+    ):
+        column_types[(row["table_name"], row["column_name"])] = row["data_type"]
+
+    return existing, stats, column_types
+
+
+async def _hypothetical_check(conn: asyncpg.Connection, proposal: Dict[str, Any]):
+    """Custo do EXPLAIN da query mais pesada antes e depois de um índice hipotético (hypopg)."""
+    sql, params = proposal["_sample"]
+    explain = f"EXPLAIN (FORMAT JSON) {sql}"
+
+    before = json.loads(await conn.fetchval(explain, *params))[0]["Plan"]["Total Cost"]
+    await conn.execute(
+        "SELECT hypopg_create_index($1)",
+        create_index_sql((proposal["table"], proposal["key"]), concurrently=False),
+    )
+    try:
+        after = json.loads(await conn.fetchval(explain, *params))[0]["Plan"]["Total Cost"]
+    finally:
+        await conn.execute("SELECT hypopg_reset()")
+
+    proposal["hypothetical"] = {
+        "cost_before": before,
+        "cost_after": after,
+        "improvement": 1.0 - after / before if before else 0.0,
+    }
+
+
+async def advise(
+    shapes: List[Dict[str, Any]], hypothetical: bool = False, limit: int = 20
+) -> Dict[str, Any]:
+    """
+    Sugestões para a carga informada, usando o catálogo do banco
+    (pg_indexes, pg_stats) e, se pedido e disponível, o hypopg.
+    """
+    tables = sorted({JOIN_PATHS[name]["table"] for name in JOIN_PATHS} | {"sales"})
+
+    async with acquire_connection() as conn:
+        existing, stats, column_types = await _catalog(conn, tables)
+        proposals = propose_indexes(shapes, existing, stats, column_types)[:limit]
+
+        hypopg_available = False
+        if hypothetical:
+            hypopg_available = bool(
+                await conn.fetchval("SELECT 1 FROM pg_extension WHERE extname = 'hypopg'")
+            )
+            for proposal in proposals if hypopg_available else []:
+                try:
+                    await _hypothetical_check(conn, proposal)
+                except asyncpg.PostgresError as e:
+                    logging.warning(f"Falha no índice hipotético '{proposal['statement']}': {e}")
+
+    return {
+        "shapes": len(shapes),
+        "hypopg_available": hypopg_available,
+        "proposals": [public_proposal(proposal) for proposal in proposals],
+    }
+
+
+def public_proposal(proposal: Dict[str, Any]) -> Dict[str, Any]:
+    """Sugestão sem os campos internos."""
+    return {key: value for key, value in proposal.items() if not key.startswith("_")}
+
+
+def shapes_from_requests(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Carga a partir de um JSON: QueryRequests ou entradas do log de queries
+    lentas ({"request": ..., "duration_ms": ...}). Sem duração, cada query
+    pesa 1 ms.
+    """
+    collector = WorkloadCollector(max_shapes=len(items) or 1)
+    for item in items:
+        request = QueryRequest(**item.get("request", item))
+        sql, params = QueryBuilder(request).build()
+        collector.observe(request, sql, params, float(item.get("duration_ms", 1.0)))
+    return collector.shapes()
+
+
+def static_shapes() -> List[Dict[str, Any]]:
+    """Carga sintética sem histórico: cada dimensão filtrada por igualdade no último mês."""
+    items = [
+        {
+            "metrics": ["total_vendas"],
+            "dimensions": [],
+            "filters": [{"field": name, "operator": "eq", "value": 0}],
+            "dateRange": "last_30_days",
+        }
+        for name in DIMENSIONS
+    ]
+    return shapes_from_requests(items)
+
+
+def _print_proposals(proposals: List[Dict[str, Any]]):
+    if not proposals:
+        print("Nenhum índice sugerido.")
+        return
+
+    for position, proposal in enumerate(proposals, start=1):
+        print(
+            f"{position:2d}. {proposal['statement']};\n"
+            f"    benefício estimado: {proposal['estimated_benefit_ms']:.0f} ms "
+            f"({proposal['queries']} queries, {', '.join(proposal['kinds'])}: "
+            f"{', '.join(proposal['fields'])})"
+        )
+        hypothetical = proposal.get("hypothetical")
+        if hypothetical:
+            print(
+                f"    hypopg: custo {hypothetical['cost_before']:.0f} → "
+                f"{hypothetical['cost_after']:.0f} ({hypothetical['improvement']:.0%})"
+            )
+
+
+async def _main(args: argparse.Namespace):
+    if args.requests:
+        with open(args.requests, encoding="utf-8") as requests_file:
+            items = json.load(requests_file)
+        if isinstance(items, dict):
+            items = items.get("entries", [])
+        shapes = shapes_from_requests(items)
+    else:
+        shapes = static_shapes()
+
+    if args.offline:
+        _print_proposals([public_proposal(p) for p in propose_indexes(shapes)[: args.limit]])
+        return
+
+    await connect_to_db()
+    try:
+        result = await advise(shapes, args.hypothetical, args.limit)
+    finally:
+        await close_db_connection()
+
+    if args.hypothetical and not result["hypopg_available"]:
+        print("Extensão hypopg não instalada: sem verificação hipotética.\n")
+    _print_proposals(result["proposals"])
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Sugere índices para a carga de queries.")
+    parser.add_argument(
+        "--requests",
+        help="JSON com QueryRequests ou a saída de /api/v1/admin/slow-queries. "
+        "Padrão: cada dimensão filtrada por igualdade.",
+    )
+    parser.add_argument(
+        "--hypothetical",
+        action="store_true",
+        help="Confere cada sugestão com um índice hipotético (requer hypopg).",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Não consulta o banco (sem pg_indexes/pg_stats).",
+    )
+    parser.add_argument("--limit", type=int, default=20, help="Número máximo de sugestões.")
+
+    asyncio.run(_main(parser.parse_args()))
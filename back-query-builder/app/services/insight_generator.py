@@ -1,5 +1,6 @@
 from typing import Any, Optional, Dict, List
-from app.api.v1.schemas import QueryRequest, QueryResponse, DataRow
+from app.api.v1.schemas import QueryRequest
+from app.core.tracing import traced
 from app.services.semantic_layer import METRICS, DIMENSIONS
 
 def _format_value(value: Any, metric_type: Optional[str] = "number") -> str:
@@ -35,13 +36,13 @@ def _format_value(value: Any, metric_type: Optional[str] = "number") -> str:
 class InsightGenerator:
     """
     Gera um insight textual dinâmico baseado na estrutura de uma 
-    QueryRequest e sua QueryResponse.
+    QueryRequest e nas linhas do seu resultado
+    ({"metrics": {...}, "dimensions": {...}}).
     """
 
-    def __init__(self, request: QueryRequest, response: QueryResponse):
+    def __init__(self, request: QueryRequest, data: List[Dict[str, Dict[str, Any]]]):
         self.request = request
-        self.response = response
-        self.data = response.data
+        self.data = data
         self.num_metrics = len(request.metrics)
         self.num_dims = len(request.dimensions)
 
@@ -53,6 +54,7 @@ class InsightGenerator:
             return DIMENSIONS[field_name]
         return {"label": field_name, "type": "unknown"}
 
+    @traced("insights")
     def generate_text(self) -> Optional[str]:
         """Ponto de entrada principal. Roteia para o gerador correto."""
         if not self.data:
@@ -82,7 +84,7 @@ class InsightGenerator:
         row = self.data[0]
         insights = []
 
-        for metric_name, value in row.metrics.items():
+        for metric_name, value in row["metrics"].items():
             info = self._get_field_info(metric_name)
             label = info.get("label", metric_name)
             m_type = info.get("type", "number")
@@ -101,10 +103,10 @@ class InsightGenerator:
         dim_label = self._get_field_info(dim_name).get("label", dim_name)
         
         top_row = self.data[0]
-        top_dim_value = top_row.dimensions.get(dim_name, "N/A")
+        top_dim_value = top_row["dimensions"].get(dim_name, "N/A")
 
         metric_insights = []
-        for m_name, m_value in top_row.metrics.items():
+        for m_name, m_value in top_row["metrics"].items():
             info = self._get_field_info(m_name)
             label = info.get("label", m_name)
             m_type = info.get("type", "number")
@@ -124,8 +126,8 @@ class InsightGenerator:
 
         if primary_metric_name and "medio" not in primary_metric_name.lower():
             try:
-                total_value = sum(float(row.metrics[primary_metric_name]) for row in self.data)
-                top_value = float(top_row.metrics[primary_metric_name])
+                total_value = sum(float(row["metrics"][primary_metric_name]) for row in self.data)
+                top_value = float(top_row["metrics"][primary_metric_name])
                 
                 if total_value > 0:
                     percentage = (top_value / total_value) * 100
@@ -146,12 +148,12 @@ class InsightGenerator:
         top_row = self.data[0]
         
         dim_insights = []
-        for d_name, d_value in top_row.dimensions.items():
+        for d_name, d_value in top_row["dimensions"].items():
             d_label = self._get_field_info(d_name).get("label", d_name)
             dim_insights.append(f"{d_label} **{d_value}**")
 
         met_insights = []
-        for m_name, m_value in top_row.metrics.items():
+        for m_name, m_value in top_row["metrics"].items():
             m_label = self._get_field_info(m_name).get("label", m_name)
             m_type = self._get_field_info(m_name).get("type", "number")
             f_val = _format_value(m_value, m_type)
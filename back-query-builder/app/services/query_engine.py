@@ -1,8 +1,37 @@
 import datetime
+import re
 from dateutil.relativedelta import relativedelta
 from typing import List, Optional, Set, Any, Tuple, Dict
 from app.api.v1.schemas import QueryRequest, FilterOperator, OrderBy, CustomDateRange
-from app.services.semantic_layer import METRICS, DIMENSIONS, JOIN_PATHS
+from app.core.lru import LRUCache
+from app.core.tracing import traced
+from app.services.semantic_layer import (
+    METRICS,
+    DIMENSIONS,
+    JOIN_PATHS,
+    FACT_GRAINS,
+    FAN_OUT_JOINS,
+    ROLLUPS,
+    Cardinality,
+    JoinType,
+)
+
+PLAN_CACHE_MAX_SIZE = 512
+
+# Operadores que nunca aceitam NULL (NULL <op> x não é verdadeiro). Só filtros
+# com esses operadores podem virar semi-joins EXISTS sem mudar o resultado.
+# 'not_in' fica de fora: "NULL != ALL('{}')" é verdadeiro.
+NULL_REJECTING_OPERATORS = {
+    FilterOperator.EQ,
+    FilterOperator.NEQ,
+    FilterOperator.GT,
+    FilterOperator.GTE,
+    FilterOperator.LT,
+    FilterOperator.LTE,
+    FilterOperator.IN,
+    FilterOperator.BETWEEN,
+    FilterOperator.CONTAINS,
+}
 
 
 def _build_date_filter(
@@ -47,6 +76,56 @@ def _build_date_filter(
     ]
 
 
+# Primeiro dia que cada rollup ainda não tem por inteiro: o dia do
+# watermark da última refresh. Os dias a partir dele são lidos de `sales`.
+# Um rollup sem refresh conhecida não é usado.
+rollup_coverage: Dict[str, datetime.date] = {}
+
+
+def set_rollup_coverage(rollup_name: str, covered_until: Optional[datetime.date]):
+    """Atualiza até onde o rollup está consolidado (None: rollup indisponível)."""
+    if covered_until is None:
+        rollup_coverage.pop(rollup_name, None)
+    else:
+        rollup_coverage[rollup_name] = covered_until
+
+
+def find_covering_rollup(request: QueryRequest) -> Optional[str]:
+    """
+    Primeiro rollup (o menor, pela ordem de declaração em ROLLUPS) que cobre
+    as métricas, dimensões e filtros da requisição e já tem uma refresh
+    conhecida, ou None.
+    """
+    dimension_names = set(request.dimensions)
+    dimension_names.update(f.field for f in request.filters)
+
+    for rollup_name, rollup in ROLLUPS.items():
+        if rollup_name not in rollup_coverage:
+            continue
+        if not all(m in rollup["measures"] for m in request.metrics):
+            continue
+        if not all(d in rollup["dimensions"] for d in dimension_names):
+            continue
+        return rollup_name
+
+    return None
+
+
+class CompiledPlan:
+    """
+    SQL já compilado para um formato (shape) de query. Requisições com o
+    mesmo formato reutilizam o mesmo texto SQL; só os parâmetros mudam.
+    """
+
+    def __init__(self, sql: str, source: str = "sales", rollup: Optional[str] = None):
+        self.sql = sql
+        self.source = source
+        self.rollup = rollup
+
+
+plan_cache = LRUCache(PLAN_CACHE_MAX_SIZE)
+
+
 class QueryBuilder:
     """
     Traduz um objeto QueryRequest (da API) em uma string SQL otimizada.
@@ -58,8 +137,11 @@ class QueryBuilder:
       no semantic_layer.py e elas serão suportadas aqui).
     """
 
-    def __init__(self, request: QueryRequest):
+    def __init__(self, request: QueryRequest, use_rollups: bool = False):
         self.request = request
+        self.use_rollups = use_rollups
+        # Tabela de onde os dados são lidos: `sales` ou um rollup.
+        self.source: str = "sales"
 
         self.select_clause: List[str] = []
         self.join_clause: List[str] = []
@@ -71,24 +153,103 @@ class QueryBuilder:
         self.param_count: int = 0
         self.required_joins: List[str] = []
         self.field_map: Dict[str, str] = {}
+        self.semi_join_filters: Dict[int, str] = {}
+        self.inner_joins: Set[str] = set()
+        # Joins que de fato aparecem no SQL gerado (inclusive dentro dos
+        # EXISTS), depois das otimizações do planner.
+        self.rendered_joins: List[str] = []
 
+    @traced("plan")
     def build(self) -> Tuple[str, List[Any]]:
         """
         Constrói a query SQL completa e retorna a string SQL
         junto com a lista de parâmetros.
+
+        Se o formato da query já foi compilado antes, reutiliza o SQL do
+        cache de planos e apenas associa os novos parâmetros.
+        """
+
+        shape = self._shape_key()
+        plan = plan_cache.get(shape)
+        if plan is not None:
+            self.source = plan.source
+            self.params = self._bind_params()
+            if plan.rollup:
+                self.params.append(rollup_coverage[plan.rollup])
+            return plan.sql, self.params
+
+        plan = self.compile()
+        plan_cache.put(shape, plan)
+
+        return plan.sql, self.params
+
+    def compile(self) -> CompiledPlan:
+        """
+        Compila a query sem consultar o cache de planos: resolve os joins,
+        aplica as otimizações (rollup, semi-joins, tipos de join, grãos,
+        eliminação de joins) e gera o SQL. Os parâmetros ficam em
+        self.params e os joins usados em self.rendered_joins.
         """
 
         self._collect_fields_and_joins()
 
-        self._build_select_clause()
-        self._build_join_clause()
+        rollup_name = self._find_covering_rollup() if self.use_rollups else None
+        if rollup_name:
+            self._build_order_by_clause()
+            sql = self._construct_rollup_sql(rollup_name)
+            return CompiledPlan(sql, self.source, rollup_name)
+
+        self._plan_semi_joins()
+        self._plan_join_types()
+
         self._build_where_clause()
-        self._build_group_by_clause()
         self._build_order_by_clause()
 
-        sql = self._construct_final_sql()
+        grain_groups = self._plan_grains()
+        if grain_groups:
+            sql = self._construct_grain_sql(grain_groups)
+        else:
+            self._build_select_clause()
+            self._build_group_by_clause()
+            self._build_join_clause()
+            sql = self._construct_final_sql()
 
-        return sql, self.params
+        return CompiledPlan(sql)
+
+    def _shape_key(self) -> Tuple:
+        """
+        Chave do formato da query: tudo que influencia o texto SQL
+        (campos, operadores, ordenação, limite, presença de filtro de
+        data e rollups disponíveis), mas não os valores dos filtros.
+        """
+        date_fragment, _ = _build_date_filter(
+            self.request.dateRange, self.request.customDateRange
+        )
+
+        return (
+            tuple(self.request.metrics),
+            tuple(self.request.dimensions),
+            tuple((f.field, f.operator.value) for f in self.request.filters),
+            tuple((o.field, o.direction.value) for o in self.request.order_by),
+            self.request.limit,
+            date_fragment is not None,
+            tuple(sorted(rollup_coverage)) if self.use_rollups else None,
+        )
+
+    def _bind_params(self) -> List[Any]:
+        """
+        Monta a lista de parâmetros na mesma ordem dos placeholders
+        gerados por _build_where_clause.
+        """
+        _, date_params = _build_date_filter(
+            self.request.dateRange, self.request.customDateRange
+        )
+
+        params = list(date_params)
+        for f in self.request.filters:
+            params.extend(self._filter_params(f.operator, f.value))
+
+        return params
 
     def get_chart_suggestion(self) -> str:
         """
@@ -160,12 +321,315 @@ class QueryBuilder:
                 for join_name in field_info["joins_needed"]:
                     self._add_join_with_dependencies(join_name)
 
-    def _add_join_with_dependencies(self, join_name: str):
+    def _find_covering_rollup(self) -> Optional[str]:
+        """
+        Retorna o primeiro rollup (o menor, pela ordem de declaração) que
+        cobre todas as métricas, dimensões e filtros da query, ou None.
+        """
+
+        return find_covering_rollup(self.request)
+
+    def _construct_rollup_sql(self, rollup_name: str) -> str:
+        """
+        Constrói a query reescrita sobre um rollup: as métricas são
+        reagregadas a partir das medidas armazenadas e o filtro de período
+        usa a coluna de data do rollup. Os placeholders seguem a mesma
+        ordem de _bind_params (período, depois filtros); o dia em que a
+        cobertura do rollup termina vem por último.
+        """
+
+        rollup = ROLLUPS[rollup_name]
+        table = rollup["table"]
+        dimensions = rollup["dimensions"]
+        self.source = table
+
+        select_parts = [
+            f'{rollup["measures"][m]} AS "{m}"' for m in self.request.metrics
+        ] + [f'{dimensions[d]["sql"]} AS "{d}"' for d in self.request.dimensions]
+
+        _, date_params = _build_date_filter(
+            self.request.dateRange, self.request.customDateRange
+        )
+        if date_params:
+            date_column = f"{table}.{rollup['date_column']}"
+            start = self._get_next_placeholder()
+            end = self._get_next_placeholder()
+            self.where_clause.append(
+                f"{date_column} >= {start} AND {date_column} < {end}"
+            )
+            self.params.extend(date_params)
+
+        for f in self.request.filters:
+            sql_fragment, params = self._build_filter_fragment(
+                dimensions[f.field]["sql"], f.operator, f.value
+            )
+            self.where_clause.append(sql_fragment)
+            self.params.extend(params)
+
+        joins: List[str] = []
+        for dim_name in list(self.request.dimensions) + [
+            f.field for f in self.request.filters
+        ]:
+            for join_name in dimensions[dim_name].get("joins_needed", []):
+                self._add_rollup_join(rollup, join_name, joins)
+
+        query_parts = [
+            f"SELECT {', '.join(select_parts)}",
+            f"FROM {self._rollup_source_sql(rollup_name)}",
+        ]
+        query_parts.extend(
+            f"{rollup['joins'][j]['type'].value} {rollup['joins'][j]['table']} "
+            f"ON {rollup['joins'][j]['on']}"
+            for j in joins
+        )
+        if self.where_clause:
+            query_parts.append(f"WHERE {' AND '.join(self.where_clause)}")
+        if self.request.dimensions:
+            group_by = ", ".join(
+                dimensions[d]["sql"] for d in self.request.dimensions
+            )
+            query_parts.append(f"GROUP BY {group_by}")
+        query_parts.extend(self._order_by_and_limit())
+
+        return "\n".join(part for part in query_parts if part)
+
+    def _rollup_source_sql(self, rollup_name: str) -> str:
+        """
+        Fonte da query sobre o rollup: os dias consolidados vêm da tabela
+        e os dias a partir do watermark da última refresh são agregados de
+        `sales` no mesmo grão (UNION ALL). A subquery leva o nome da
+        tabela, então medidas, dimensões e joins do rollup valem sobre ela.
+        """
+
+        rollup = ROLLUPS[rollup_name]
+        table = rollup["table"]
+        specs = {**rollup["keys"], **rollup["columns"]}
+
+        covered_until = self._get_next_placeholder()
+        self.params.append(rollup_coverage[rollup_name])
+
+        tail_columns = ", ".join(f"{spec['sql']} AS {name}" for name, spec in specs.items())
+        group_by = ", ".join(spec["sql"] for spec in rollup["keys"].values())
+        return "\n".join(
+            [
+                f"(SELECT {', '.join(specs)} FROM {table}",
+                f"WHERE {table}.{rollup['date_column']} < {covered_until}::date",
+                "UNION ALL",
+                f"SELECT {tail_columns}",
+                f"FROM sales WHERE sales.created_at >= {covered_until}::date",
+                f"GROUP BY {group_by}) AS {table}",
+            ]
+        )
+
+    def _add_rollup_join(self, rollup: Dict, join_name: str, joins: List[str]):
+        """Adiciona um join de rollup e suas dependências, em ordem."""
+
+        if join_name in joins:
+            return
+
+        join_info = rollup["joins"].get(join_name)
+        if not join_info:
+            raise ValueError(
+                f"Configuração de Join inválida: '{join_name}' não encontrado no rollup '{rollup['table']}'."
+            )
+
+        for dependency in join_info.get("depends_on") or []:
+            self._add_rollup_join(rollup, dependency, joins)
+
+        joins.append(join_name)
+
+    def _plan_semi_joins(self):
+        """
+        Otimização: filtros cujos joins só existem por causa deles e começam
+        numa tabela one-to-many ligada a `sales` (ex: produto_nome,
+        cupom_codigo) viram semi-joins EXISTS (...). Assim a agregação
+        principal continua no grão de `sales`, sem fan-out nem DISTINCT.
+
+        Filtros que passam pela mesma tabela one-to-many ficam no mesmo
+        EXISTS, preservando a semântica do join (mesma linha).
+        """
+
+        select_fields = (
+            list(self.request.metrics)
+            + list(self.request.dimensions)
+            + [o.field for o in self.request.order_by]
+        )
+        select_joins = set(self._resolve_joins(select_fields))
+
+        candidates: Dict[int, str] = {}
+        blocked_roots = set()
+
+        for index, f in enumerate(self.request.filters):
+            filter_joins = [
+                join_name
+                for join_name in self._resolve_joins([f.field])
+                if join_name not in select_joins
+            ]
+            if not filter_joins:
+                continue
+
+            root = filter_joins[0]
+            if root not in FAN_OUT_JOINS or JOIN_PATHS[root]["depends_on"]:
+                continue
+
+            if f.operator not in NULL_REJECTING_OPERATORS:
+                blocked_roots.add(root)
+                continue
+
+            candidates[index] = root
+
+        self.semi_join_filters = {
+            index: root
+            for index, root in candidates.items()
+            if root not in blocked_roots
+        }
+
+        if self.semi_join_filters:
+            self.required_joins = self._resolve_joins(
+                select_fields + self._joined_filter_fields()
+            )
+
+    def _joined_filter_fields(self) -> List[str]:
+        """Campos dos filtros aplicados via JOIN (fora dos semi-joins)."""
+
+        return [
+            f.field
+            for index, f in enumerate(self.request.filters)
+            if index not in self.semi_join_filters
+        ]
+
+    def _build_exists_fragment(self, root: str, fragments: List[str]) -> str:
+        """
+        Constrói o semi-join EXISTS de um grupo de filtros, correlacionado
+        com `sales` pela condição do join raiz (one-to-many).
+        """
+
+        filter_fields = [
+            self.request.filters[index].field
+            for index, filter_root in self.semi_join_filters.items()
+            if filter_root == root
+        ]
+        inner_joins = [
+            join_name
+            for join_name in self._resolve_joins(filter_fields)
+            if join_name != root
+        ]
+
+        # Dentro do EXISTS todo join está no caminho de algum filtro que
+        # rejeita NULL, então pode ser INNER.
+        root_info = JOIN_PATHS[root]
+        if root not in self.rendered_joins:
+            self.rendered_joins.append(root)
+        conditions = " AND ".join([root_info["on"]] + fragments)
+        parts = [f"SELECT 1 FROM {root_info['table']}"]
+        parts.extend(
+            self._join_sql(join_name, JoinType.INNER) for join_name in inner_joins
+        )
+        parts.append(f"WHERE {conditions}")
+
+        return f"EXISTS ({' '.join(part for part in parts if part)})"
+
+    def _plan_join_types(self):
+        """
+        Promove LEFT JOINs a INNER quando um filtro do WHERE sobre a tabela
+        juntada (ou sobre uma tabela que depende dela) rejeita NULLs: as
+        linhas sem correspondente seriam descartadas de qualquer forma, e o
+        INNER JOIN dá mais liberdade de ordem de join ao planner.
+        """
+
+        for index, f in enumerate(self.request.filters):
+            if index in self.semi_join_filters:
+                continue
+            if f.operator not in NULL_REJECTING_OPERATORS:
+                continue
+            self.inner_joins.update(self._resolve_joins([f.field]))
+
+    def _join_sql(self, join_name: str, join_type: Optional[JoinType] = None) -> str:
         """
-        Adiciona um join e suas dependências recursivamente.
+        Renderiza um join a partir da sua definição, respeitando o tipo
+        declarado ou a promoção a INNER.
         """
 
-        if join_name in self.required_joins:
+        join_info = JOIN_PATHS[join_name]
+        if join_name not in self.rendered_joins:
+            self.rendered_joins.append(join_name)
+        if join_type is None:
+            join_type = join_info["type"]
+            if join_name in self.inner_joins:
+                join_type = JoinType.INNER
+
+        return f"{join_type.value} {join_info['table']} ON {join_info['on']}"
+
+    def _is_removable_join(self, join_name: str) -> bool:
+        """
+        Um join que não multiplica linhas (many-to-one/one-to-one) pode ser
+        removido se for LEFT, ou se for INNER com FK não nula (sempre
+        encontra correspondente).
+        """
+
+        join_info = JOIN_PATHS[join_name]
+        if join_info.get("cardinality") == Cardinality.ONE_TO_MANY:
+            return False
+
+        if join_info["type"] == JoinType.LEFT and join_name not in self.inner_joins:
+            return True
+
+        return join_info.get("nullable") is False
+
+    def _join_str(self, joins: List[str], referenced_sql: List[str]) -> str:
+        """
+        Concatena o SQL de uma lista de joins, eliminando os joins
+        removíveis cujas colunas não aparecem em nenhum trecho de SQL
+        referenciado (SELECT, GROUP BY, WHERE) nem em outro join mantido.
+        """
+
+        referenced_tables = set(
+            re.findall(r"\b([a-z_][a-z0-9_]*)\.", " ".join(referenced_sql))
+        )
+
+        kept: List[str] = []
+        for join_name in reversed(joins):
+            is_referenced = JOIN_PATHS[join_name]["table"] in referenced_tables
+            is_dependency = any(
+                join_name in JOIN_PATHS[kept_join].get("depends_on", [])
+                for kept_join in kept
+            )
+            if is_referenced or is_dependency or not self._is_removable_join(join_name):
+                kept.append(join_name)
+
+        return "\n".join(self._join_sql(join_name) for join_name in reversed(kept))
+
+    def _resolve_joins(
+        self, field_names: List[str], extra_joins: List[str] = ()
+    ) -> List[str]:
+        """
+        Resolve (com dependências) os joins necessários para um subconjunto
+        de campos, mais joins extras. Usado na compilação por grão.
+        """
+
+        joins: List[str] = []
+        for field_name in field_names:
+            field_info = METRICS.get(field_name) or DIMENSIONS.get(field_name)
+            for join_name in field_info.get("joins_needed", []):
+                self._add_join_with_dependencies(join_name, joins)
+
+        for join_name in extra_joins:
+            self._add_join_with_dependencies(join_name, joins)
+
+        return joins
+
+    def _add_join_with_dependencies(
+        self, join_name: str, joins: Optional[List[str]] = None
+    ):
+        """
+        Adiciona um join e suas dependências recursivamente
+        (por padrão, na lista de joins da query principal).
+        """
+
+        if joins is None:
+            joins = self.required_joins
+
+        if join_name in joins:
             return
 
         join_info = JOIN_PATHS.get(join_name)
@@ -177,10 +641,10 @@ class QueryBuilder:
         dependencies = join_info.get("depends_on")
         if dependencies:
             for dependency in dependencies:
-                self._add_join_with_dependencies(dependency)
+                self._add_join_with_dependencies(dependency, joins)
 
-        if join_name not in self.required_joins:
-            self.required_joins.append(join_name)
+        if join_name not in joins:
+            joins.append(join_name)
 
     def _build_join_clause(self):
         """
@@ -188,27 +652,43 @@ class QueryBuilder:
         """
 
         for join_name in self.required_joins:
-            join_info = JOIN_PATHS.get(join_name)
-            if join_info:
-                self.join_clause.append(join_info["sql"])
-            else:
+            if join_name not in JOIN_PATHS:
                 raise ValueError(
                     f"Join '{join_name}' é necessário mas não foi encontrado em JOIN_PATHS."
                 )
 
+        join_str = self._join_str(
+            self.required_joins,
+            self.select_clause + self.group_by_clause + self.where_clause,
+        )
+        if join_str:
+            self.join_clause.extend(join_str.split("\n"))
+
     def _build_select_clause(self):
         """
         Constrói a cláusula SELECT usando os aliases (AS).
         """
 
         for metric_name in self.request.metrics:
-            sql = self.field_map[metric_name]
+            sql = self._metric_sql(metric_name)
             self.select_clause.append(f'{sql} AS "{metric_name}"')
 
         for dim_name in self.request.dimensions:
             sql = self.field_map[dim_name]
             self.select_clause.append(f'{sql} AS "{dim_name}"')
 
+    def _metric_sql(self, metric_name: str) -> str:
+        """
+        SQL de uma métrica. O builder sempre agrega cada métrica sem fan-out
+        (no seu próprio grão), então usa a versão "grain_sql" quando existir
+        (ex: COUNT(sales.id) em vez de COUNT(DISTINCT sales.id)).
+        """
+
+        metric_info = METRICS.get(metric_name)
+        if metric_info and metric_info.get("grain_sql"):
+            return metric_info["grain_sql"]
+        return self.field_map[metric_name]
+
     def _build_where_clause(self):
         """
         Constrói a cláusula WHERE com base nos filtros.
@@ -231,15 +711,24 @@ class QueryBuilder:
             self.where_clause.append(sql_date_fragment)
             self.params.extend(date_params)
 
-        for f in self.request.filters:
+        semi_join_fragments: Dict[str, List[str]] = {}
+
+        for index, f in enumerate(self.request.filters):
             field_sql = self.field_map[f.field]
             sql_fragment, params = self._build_filter_fragment(
                 field_sql, f.operator, f.value
             )
 
-            self.where_clause.append(sql_fragment)
+            root = self.semi_join_filters.get(index)
+            if root:
+                semi_join_fragments.setdefault(root, []).append(sql_fragment)
+            else:
+                self.where_clause.append(sql_fragment)
             self.params.extend(params)
 
+        for root, fragments in semi_join_fragments.items():
+            self.where_clause.append(self._build_exists_fragment(root, fragments))
+
     def _get_next_placeholder(self) -> str:
         """
         Retorna o próximo placeholder numerando os parâmetro (ex: $1, $2)
@@ -265,32 +754,45 @@ class QueryBuilder:
             FilterOperator.LTE: "<=",
         }
 
+        params = self._filter_params(op, value)
+
         if op in op_map:
             placeholder = self._get_next_placeholder()
-            return f"{field_sql} {op_map[op]} {placeholder}", [value]
+            return f"{field_sql} {op_map[op]} {placeholder}", params
 
         if op == FilterOperator.CONTAINS:
             placeholder = self._get_next_placeholder()
-            return f"{field_sql} LIKE {placeholder}", [f"%{value}%"]
+            return f"{field_sql} LIKE {placeholder}", params
 
         if op == FilterOperator.IN:
             placeholder = self._get_next_placeholder()
-            return f"{field_sql} = ANY({placeholder})", [value]
+            return f"{field_sql} = ANY({placeholder})", params
 
         if op == FilterOperator.NOT_IN:
             placeholder = self._get_next_placeholder()
-            return f"{field_sql} != ALL({placeholder})", [value]
+            return f"{field_sql} != ALL({placeholder})", params
 
         if op == FilterOperator.BETWEEN:
             placeholder1 = self._get_next_placeholder()
             placeholder2 = self._get_next_placeholder()
-            return f"{field_sql} BETWEEN {placeholder1} AND {placeholder2}", [
-                value[0],
-                value[1],
-            ]
+            return f"{field_sql} BETWEEN {placeholder1} AND {placeholder2}", params
 
         raise ValueError(f"Operador de filtro desconhecido: {op}")
 
+    @staticmethod
+    def _filter_params(op: FilterOperator, value: Any) -> List[Any]:
+        """
+        Retorna os parâmetros de um filtro, na ordem dos seus placeholders.
+        """
+
+        if op == FilterOperator.CONTAINS:
+            return [f"%{value}%"]
+
+        if op == FilterOperator.BETWEEN:
+            return [value[0], value[1]]
+
+        return [value]
+
     def _build_group_by_clause(self):
         """
         Constrói a cláusula GROUP BY baseada nas dimensões.
@@ -319,6 +821,155 @@ class QueryBuilder:
             direction = order.direction.value.upper()
             self.order_by_clause.append(f'"{order.field}" {direction}')
 
+    def _plan_grains(self) -> Optional[Dict[str, List[str]]]:
+        """
+        Verifica se algum join da query multiplica as linhas de uma métrica
+        (fan-out fora do caminho do seu grão, ex: SUM(sales.total_amount)
+        com JOIN product_sales). Nesse caso retorna as métricas agrupadas
+        por grão, para compilação com pré-agregação; senão retorna None.
+        """
+
+        fan_out = set(self.required_joins) & FAN_OUT_JOINS
+
+        groups: Dict[str, List[str]] = {}
+        for metric_name in dict.fromkeys(self.request.metrics):
+            metric_info = METRICS.get(metric_name, {})
+            groups.setdefault(metric_info.get("grain", "sales"), []).append(
+                metric_name
+            )
+
+        if all(fan_out <= set(FACT_GRAINS[grain]["joins"]) for grain in groups):
+            return None
+
+        return groups
+
+    def _build_grain_cte(self, grain: str, metric_names: List[str]) -> str:
+        """
+        Constrói a subquery que agrega as métricas de um grão pelas
+        dimensões da query.
+
+        Se as dimensões/filtros não multiplicam as linhas do grão, é um
+        GROUP BY direto. Caso contrário, primeiro seleciona as chaves
+        distintas (id do grão + dimensões) e só então junta a tabela do
+        grão para agregar, de modo que cada linha seja contada uma vez.
+        """
+
+        grain_info = FACT_GRAINS[grain]
+        grain_path = grain_info["joins"]
+        dimensions = self.request.dimensions
+
+        base_fields = list(dimensions) + self._joined_filter_fields()
+        base_joins = self._resolve_joins(base_fields)
+
+        where_str = ""
+        if self.where_clause:
+            where_str = f"WHERE {' AND '.join(self.where_clause)}"
+
+        dim_selects = [f'{self.field_map[d]} AS "{d}"' for d in dimensions]
+        metric_selects = [f'{self._metric_sql(m)} AS "{m}"' for m in metric_names]
+
+        if set(base_joins) & FAN_OUT_JOINS <= set(grain_path):
+            joins = self._resolve_joins(base_fields + metric_names)
+            parts = [
+                f"SELECT {', '.join(dim_selects + metric_selects)}",
+                "FROM sales",
+                self._join_str(joins, dim_selects + metric_selects + [where_str]),
+                where_str,
+            ]
+            if dimensions:
+                group_by = ", ".join(self.field_map[d] for d in dimensions)
+                parts.append(f"GROUP BY {group_by}")
+
+            return "\n".join(part for part in parts if part)
+
+        table = grain_info["table"]
+        key_joins = self._resolve_joins(base_fields, extra_joins=grain_path)
+        key_parts = [
+            f"SELECT DISTINCT {', '.join([f'{table}.id AS grain_id'] + dim_selects)}",
+            "FROM sales",
+            self._join_str(key_joins, [table + ".id"] + dim_selects + [where_str]),
+            where_str,
+        ]
+        key_sql = "\n".join(part for part in key_parts if part)
+
+        metric_joins = [
+            join_name
+            for join_name in self._resolve_joins(metric_names)
+            if join_name not in grain_path
+        ]
+        key_dims = [f'grain_keys."{d}"' for d in dimensions]
+        key_dim_selects = [f'grain_keys."{d}" AS "{d}"' for d in dimensions]
+
+        parts = [
+            f"SELECT {', '.join(key_dim_selects + metric_selects)}",
+            f"FROM (\n{key_sql}\n) AS grain_keys",
+            f"JOIN {table} ON {table}.id = grain_keys.grain_id",
+            self._join_str(metric_joins, metric_selects),
+        ]
+        if key_dims:
+            parts.append(f"GROUP BY {', '.join(key_dims)}")
+
+        return "\n".join(part for part in parts if part)
+
+    def _construct_grain_sql(self, groups: Dict[str, List[str]]) -> str:
+        """
+        Constrói a query pré-agregada: uma CTE por grão, unidas pelas
+        dimensões compartilhadas (UNION ALL + GROUP BY, que trata NULLs
+        das dimensões como iguais).
+        """
+
+        ctes = [
+            f"grain_{grain} AS (\n{self._build_grain_cte(grain, metric_names)}\n)"
+            for grain, metric_names in groups.items()
+        ]
+
+        metric_names = list(dict.fromkeys(self.request.metrics))
+        dimensions = self.request.dimensions
+
+        if len(groups) == 1:
+            (grain,) = groups
+            columns = [f'"{name}"' for name in metric_names + list(dimensions)]
+            query_parts = [f"SELECT {', '.join(columns)}", f"FROM grain_{grain}"]
+        else:
+            branches = []
+            for grain, grain_metrics in groups.items():
+                columns = [f'"{d}"' for d in dimensions] + [
+                    f'"{m}"' if m in grain_metrics else f'NULL AS "{m}"'
+                    for m in metric_names
+                ]
+                branches.append(f"SELECT {', '.join(columns)} FROM grain_{grain}")
+
+            columns = [f'MAX(grains."{m}") AS "{m}"' for m in metric_names] + [
+                f'grains."{d}" AS "{d}"' for d in dimensions
+            ]
+            union_sql = "\nUNION ALL\n".join(branches)
+            query_parts = [
+                f"SELECT {', '.join(columns)}",
+                f"FROM (\n{union_sql}\n) AS grains",
+            ]
+            if dimensions:
+                group_by = ", ".join(f'grains."{d}"' for d in dimensions)
+                query_parts.append(f"GROUP BY {group_by}")
+
+        query_parts.extend(self._order_by_and_limit())
+
+        return "WITH " + ",\n".join(ctes) + "\n" + "\n".join(
+            part for part in query_parts if part
+        )
+
+    def _order_by_and_limit(self) -> List[str]:
+        """Cláusulas ORDER BY e LIMIT (comuns a todas as formas de query)."""
+
+        order_by_str = ""
+        if self.order_by_clause:
+            order_by_str = f"ORDER BY {', '.join(self.order_by_clause)}"
+
+        limit_str = ""
+        if self.request.limit:
+            limit_str = f"LIMIT {self.request.limit}"
+
+        return [order_by_str, limit_str]
+
     def _construct_final_sql(self) -> str:
         """
         Constrói a query SQL final combinando todas as cláusulas.
@@ -341,22 +992,13 @@ class QueryBuilder:
         if self.group_by_clause:
             group_by_str = f"GROUP BY {', '.join(self.group_by_clause)}"
 
-        order_by_str = ""
-        if self.order_by_clause:
-            order_by_str = f"ORDER BY {', '.join(self.order_by_clause)}"
-
-        limit_str = ""
-        if self.request.limit:
-            limit_str = f"LIMIT {self.request.limit}"
-
         query_parts = [
             select_str,
             from_str,
             join_str,
             where_str,
             group_by_str,
-            order_by_str,
-            limit_str,
+            *self._order_by_and_limit(),
         ]
 
         return "\n".join(part for part in query_parts if part)
@@ -0,0 +1,84 @@
+"""
+Fusão de queries compatíveis de um lote em um único SQL.
+
+Widgets de um dashboard costumam pedir as mesmas dimensões, filtros e
+período, mudando só as métricas. Essas requisições são compiladas como uma
+só (união das métricas), o que custa uma varredura de `sales` em vez de N,
+e o resultado é depois separado por requisição.
+"""
+
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from app.api.v1.schemas import QueryRequest
+from app.services.query_engine import _build_date_filter, find_covering_rollup
+from app.services.result_cache import canonical_filters
+from app.services.semantic_layer import METRICS
+
+
+def fusion_key(request: QueryRequest, use_rollups: bool = False) -> Optional[Tuple]:
+    """
+    Chave de compatibilidade: requisições com a mesma chave podem ser
+    fundidas. Retorna None para requisições que devem rodar sozinhas.
+
+    Além de dimensões, filtros, período, ordenação e limite iguais, as
+    métricas precisam ser do mesmo grão (senão a união força a
+    pré-agregação por grão) e cair no mesmo rollup (senão uma métrica não
+    coberta tiraria as outras do rollup).
+    """
+    if any(metric not in METRICS for metric in request.metrics):
+        return None
+
+    grains = {METRICS[metric].get("grain", "sales") for metric in request.metrics}
+    if len(grains) != 1:
+        return None
+
+    _, date_params = _build_date_filter(request.dateRange, request.customDateRange)
+    rollup = find_covering_rollup(request) if use_rollups else None
+
+    return (
+        grains.pop(),
+        rollup,
+        tuple(sorted(set(request.dimensions))),
+        tuple(tuple(f) for f in canonical_filters(request)),
+        tuple((o.field, o.direction.value) for o in request.order_by),
+        request.limit,
+        tuple(date_params),
+    )
+
+
+def plan_fusion(requests: List[QueryRequest], use_rollups: bool = False) -> List[List[int]]:
+    """
+    Agrupa os índices das requisições compatíveis, na ordem em que
+    aparecem. Requisições sem par ficam em grupos de um elemento.
+    """
+    groups: Dict[Hashable, List[int]] = {}
+    singles: List[List[int]] = []
+
+    for index, request in enumerate(requests):
+        key = fusion_key(request, use_rollups)
+        if key is None:
+            singles.append([index])
+        else:
+            groups.setdefault(key, []).append(index)
+
+    return sorted(list(groups.values()) + singles, key=lambda group: group[0])
+
+
+def fuse_requests(requests: List[QueryRequest]) -> QueryRequest:
+    """Requisição única com a união (ordenada) das métricas do grupo."""
+    metrics = list(dict.fromkeys(m for request in requests for m in request.metrics))
+    return requests[0].model_copy(update={"metrics": metrics})
+
+
+def split_rows(
+    data: List[Dict[str, Dict[str, Any]]], request: QueryRequest
+) -> List[Dict[str, Dict[str, Any]]]:
+    """Recorta do resultado fundido as métricas de uma das requisições."""
+    metric_keys = list(dict.fromkeys(request.metrics))
+    return [
+        {
+            "metrics": {key: row["metrics"][key] for key in metric_keys},
+            "dimensions": row["dimensions"],
+        }
+        for row in data
+    ]
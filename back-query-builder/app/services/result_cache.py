@@ -0,0 +1,244 @@
+import datetime
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from app.api.v1.schemas import QueryRequest, FilterOperator
+from app.services.query_engine import _build_date_filter
+
+
+def _canonical_json(value: Any) -> str:
+    """Serializa um valor de forma determinística (chaves ordenadas)."""
+    return json.dumps(value, sort_keys=True, default=str, ensure_ascii=False)
+
+
+def canonical_filters(request: QueryRequest) -> List[List[str]]:
+    """
+    Filtros da requisição em forma canônica: ordenados, com os valores de
+    'in'/'not_in' também ordenados.
+    """
+    filters = []
+    for f in request.filters or []:
+        value = f.value
+        if f.operator in (FilterOperator.IN, FilterOperator.NOT_IN):
+            value = sorted(value, key=_canonical_json)
+        filters.append([f.field, f.operator.value, _canonical_json(value)])
+    filters.sort()
+    return filters
+
+
+def canonical_request_key(request: QueryRequest) -> str:
+    """
+    Gera a chave canônica (SHA-256) de uma QueryRequest.
+
+    Duas requisições que produzem o mesmo resultado geram a mesma chave:
+    - métricas e dimensões têm a ordem normalizada;
+    - filtros são ordenados (e os valores de 'in'/'not_in' também);
+    - presets de 'dateRange' são resolvidos para datas concretas via
+      _build_date_filter, então 'last_7_days' muda de chave à meia-noite.
+    """
+    _, date_params = _build_date_filter(request.dateRange, request.customDateRange)
+
+    canonical = {
+        "metrics": sorted(set(request.metrics)),
+        "dimensions": sorted(set(request.dimensions)),
+        "filters": canonical_filters(request),
+        "order_by": [[o.field, o.direction.value] for o in request.order_by or []],
+        "limit": request.limit,
+        "date_range": [d.isoformat() for d in date_params],
+    }
+
+    return hashlib.sha256(_canonical_json(canonical).encode("utf-8")).hexdigest()
+
+
+def request_date_bounds(
+    request: QueryRequest,
+) -> Optional[Tuple[datetime.date, datetime.date]]:
+    """
+    Retorna o intervalo [início, fim exclusivo) resolvido da requisição,
+    ou None quando não há filtro de período.
+    """
+    _, date_params = _build_date_filter(request.dateRange, request.customDateRange)
+    if not date_params:
+        return None
+    return date_params[0], date_params[1]
+
+
+def _estimate_size(value: Any) -> int:
+    """Estimativa (em bytes) do espaço ocupado por um resultado."""
+    return len(json.dumps(value, default=str))
+
+
+class _CacheEntry:
+    """
+    Um resultado armazenado com seus prazos de validade e as suas
+    representações já codificadas (variantes, ex: corpo JSON comprimido).
+    """
+
+    def __init__(self, value: Any, size: int, expires_at: float, stale_until: float):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.stale_until = stale_until
+        self.variants: Dict[Hashable, Any] = {}
+
+
+class ResultCache:
+    """
+    Cache LRU em memória para resultados de queries.
+
+    - Cada entrada tem TTL próprio; depois de expirar ela ainda pode ser
+      servida como "stale" por 'stale_ttl' segundos enquanto é revalidada
+      em background (stale-while-revalidate).
+    - O cache é limitado por número de entradas e por memória estimada;
+      ao ultrapassar qualquer limite as entradas menos usadas são removidas.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        default_ttl: float,
+        stale_ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self._clock = clock
+
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._refreshing: Set[str] = set()
+        self.total_bytes = 0
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Tuple[Optional[Any], bool]:
+        """
+        Busca uma entrada. Retorna (valor, is_stale); o valor é None em
+        caso de miss.
+        """
+        entry = self._entries.get(key)
+        now = self._clock()
+
+        if entry is None or now >= entry.stale_until:
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None, False
+
+        self._entries.move_to_end(key)
+
+        if now >= entry.expires_at:
+            self.stale_hits += 1
+            return entry.value, True
+
+        self.hits += 1
+        return entry.value, False
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """
+        Armazena um valor. Resultados maiores que o limite de memória
+        inteiro do cache não são armazenados.
+        """
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        now = self._clock()
+        expires_at = now + (self.default_ttl if ttl is None else ttl)
+        self._entries[key] = _CacheEntry(
+            value, size, expires_at, expires_at + self.stale_ttl
+        )
+        self.total_bytes += size
+        self._evict()
+
+    def get_variant(self, key: str, name: Hashable) -> Optional[Any]:
+        """
+        Retorna uma variante codificada de uma entrada (sem contar como
+        acesso; use depois de get()).
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return entry.variants.get(name)
+
+    def set_variant(self, key: str, name: Hashable, value: Any, size: int, source: Any):
+        """
+        Anexa uma variante codificada a uma entrada. 'source' é o valor a
+        partir do qual a variante foi gerada: se a entrada foi substituída
+        nesse meio tempo (ex: revalidação), a variante é descartada.
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry.value is not source or name in entry.variants:
+            return
+        if entry.size + size > self.max_bytes:
+            return
+
+        entry.variants[name] = value
+        entry.size += size
+        self.total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        """Remove as entradas menos usadas até respeitar os limites."""
+        while (
+            len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes
+        ):
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def invalidate(self, key: Optional[str] = None):
+        """Remove uma entrada específica, ou todas se 'key' for None."""
+        if key is None:
+            self._entries.clear()
+            self.total_bytes = 0
+        elif key in self._entries:
+            self._remove(key)
+
+    def begin_refresh(self, key: str) -> bool:
+        """
+        Marca uma entrada como em revalidação. Retorna False se outra
+        revalidação da mesma chave já estiver em andamento.
+        """
+        if key in self._refreshing:
+            return False
+        self._refreshing.add(key)
+        return True
+
+    def end_refresh(self, key: str):
+        """Libera a marcação de revalidação de uma entrada."""
+        self._refreshing.discard(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de uso do cache."""
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "refreshing": len(self._refreshing),
+            "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+        }
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry.size
@@ -0,0 +1,238 @@
+"""
+Codificação dos resultados de queries (JSON rápido, compressão e formatos
+de exportação).
+Os encoders de NDJSON/CSV trabalham por lote de linhas, para uso em
+respostas em streaming; o formato colunar é montado sobre o resultado
+inteiro do /query.
+"""
+
+import csv
+import datetime
+import decimal
+import gzip
+import io
+import json
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence
+
+import orjson
+
+from app.services.semantic_layer import METRICS, DIMENSIONS
+
+try:
+    import zstandard
+except ImportError:  # zstd é opcional; sem ele só há gzip.
+    zstandard = None
+
+# Uma coluna de dimensão é codificada com dicionário quando o número de
+# valores distintos é no máximo esta fração do número de linhas.
+DICTIONARY_MAX_RATIO = 0.5
+
+
+def json_default(value: Any) -> Any:
+    """Converte os tipos do asyncpg que o json não serializa."""
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_ndjson(
+    records: Iterable[Mapping[str, Any]],
+    metric_keys: List[str],
+    dimension_keys: List[str],
+) -> bytes:
+    """
+    Codifica um lote de linhas em NDJSON, uma linha por registro, no mesmo
+    formato de DataRow ({"metrics": {...}, "dimensions": {...}}).
+    """
+    lines = []
+    for record in records:
+        row = {
+            "metrics": {key: record[key] for key in metric_keys},
+            "dimensions": {key: record[key] for key in dimension_keys},
+        }
+        lines.append(json.dumps(row, default=json_default, ensure_ascii=False))
+
+    if not lines:
+        return b""
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+def encode_csv(
+    records: Iterable[Mapping[str, Any]], columns: List[str], header: bool = False
+) -> bytes:
+    """Codifica um lote de linhas em CSV (com cabeçalho, se pedido)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+
+    if header:
+        writer.writerow(columns)
+    for record in records:
+        writer.writerow([_csv_value(record[column]) for column in columns])
+
+    return buffer.getvalue().encode("utf-8")
+
+
+def dictionary_encode(values: List[Any]) -> Optional[Dict[str, List[Any]]]:
+    """
+    Codifica uma coluna como {"dictionary": [...], "indices": [...]}, ou
+    retorna None se a coluna tiver cardinalidade alta demais para valer a
+    pena.
+    """
+    positions: Dict[Any, int] = {}
+    indices = []
+    max_distinct = len(values) * DICTIONARY_MAX_RATIO
+
+    for value in values:
+        index = positions.get(value)
+        if index is None:
+            index = positions[value] = len(positions)
+            if index + 1 > max_distinct:
+                return None
+        indices.append(index)
+
+    return {"dictionary": list(positions), "indices": indices}
+
+
+def encode_columnar(
+    data: List[Dict[str, Dict[str, Any]]],
+    metric_keys: List[str],
+    dimension_keys: List[str],
+) -> Dict[str, Any]:
+    """
+    Converte as linhas ({"metrics": ..., "dimensions": ...}) em colunas:
+    um array por coluna, com as dimensões de baixa cardinalidade
+    codificadas com dicionário, e um cabeçalho com nome, papel, tipo e
+    rótulo de cada coluna vindos da camada semântica.
+    """
+    columns = []
+    values: Dict[str, Any] = {}
+
+    for key in metric_keys:
+        info = METRICS.get(key, {})
+        columns.append(
+            {
+                "name": key,
+                "role": "metric",
+                "type": info.get("type"),
+                "label": info.get("label"),
+                "encoding": "plain",
+            }
+        )
+        values[key] = [row["metrics"].get(key) for row in data]
+
+    for key in dimension_keys:
+        info = DIMENSIONS.get(key, {})
+        column_values = [row["dimensions"].get(key) for row in data]
+        encoded = dictionary_encode(column_values)
+
+        columns.append(
+            {
+                "name": key,
+                "role": "dimension",
+                "type": info.get("type"),
+                "label": info.get("label"),
+                "encoding": "plain" if encoded is None else "dictionary",
+            }
+        )
+        values[key] = column_values if encoded is None else encoded
+
+    return {"row_count": len(data), "columns": columns, "data": values}
+
+
+def _column_converter(
+    records: Sequence[Mapping[str, Any]], key: str
+) -> Optional[Callable[[Any], Any]]:
+    """
+    Escolhe a conversão de uma coluna pelo tipo do primeiro valor não nulo.
+    Só Decimal precisa de conversão: datas e horas o orjson serializa
+    nativamente.
+    """
+    for record in records:
+        value = record[key]
+        if value is not None:
+            return float if isinstance(value, decimal.Decimal) else None
+    return None
+
+
+def rows_from_records(
+    records: Sequence[Mapping[str, Any]],
+    metric_keys: List[str],
+    dimension_keys: List[str],
+) -> List[Dict[str, Dict[str, Any]]]:
+    """
+    Separa os registros do asyncpg em {"metrics": ..., "dimensions": ...},
+    decidindo a conversão de cada coluna uma única vez (e não por valor).
+    Colunas Decimal viram float: no JSON do /query saem como números (ex:
+    10.5), não como as strings ("10.50") que o pydantic geraria.
+    """
+    if not records:
+        return []
+
+    available = set(records[0].keys())
+    metric_keys = [key for key in metric_keys if key in available]
+    dimension_keys = [key for key in dimension_keys if key in available]
+    converters = {
+        key: _column_converter(records, key) for key in metric_keys + dimension_keys
+    }
+
+    def extract(record: Mapping[str, Any], keys: List[str]) -> Dict[str, Any]:
+        row = {}
+        for key in keys:
+            value = record[key]
+            converter = converters[key]
+            row[key] = converter(value) if converter and value is not None else value
+        return row
+
+    return [
+        {"metrics": extract(record, metric_keys), "dimensions": extract(record, dimension_keys)}
+        for record in records
+    ]
+
+
+def encode_json(payload: Any) -> bytes:
+    """Serializa a resposta direto para bytes com orjson."""
+    return orjson.dumps(payload, default=json_default)
+
+
+def negotiate_encoding(accept_encoding: str) -> str:
+    """
+    Escolhe a compressão a partir do header Accept-Encoding: zstd (se o
+    pacote estiver instalado), gzip ou identity.
+    """
+    accepted = set()
+    for part in accept_encoding.split(","):
+        name, _, parameters = part.partition(";")
+        quality = 1.0
+        parameters = parameters.strip()
+        if parameters.startswith("q="):
+            try:
+                quality = float(parameters[2:])
+            except ValueError:
+                quality = 0.0
+        if quality > 0:
+            accepted.add(name.strip().lower())
+
+    if zstandard is not None and "zstd" in accepted:
+        return "zstd"
+    if "gzip" in accepted:
+        return "gzip"
+    return "identity"
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Comprime o corpo da resposta com a codificação negociada."""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=5)
+    return body
@@ -0,0 +1,347 @@
+"""
+Refresh incremental das tabelas de rollup declaradas em ROLLUPS.
+
+Cada execução recalcula só os dias tocados desde o último watermark
+(MAX(sales.created_at) da execução anterior), recuando uma janela para
+dados que chegam atrasados. Cada dia é recalculado em uma transação curta
+(upsert + remoção de chaves que sumiram), então a refresh convive com as
+queries interativas no mesmo pool.
+
+O dia do watermark de cada rollup é publicado para o QueryBuilder
+(set_rollup_coverage): as queries roteadas para o rollup leem os dias a
+partir dele direto de `sales`.
+
+Uso via CLI:
+    python -m app.services.rollup_refresh [--rollup NOME] [--full]
+"""
+
+import argparse
+import asyncio
+import datetime
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+import asyncpg
+
+from app.core.config import settings
+from app.core.database import (
+    close_db_connection,
+    connect_to_db,
+    invalidate_prepared_statements,
+    scheduled_connection,
+)
+from app.services.query_engine import set_rollup_coverage
+from app.services.semantic_layer import ROLLUPS
+
+STATE_TABLE = "rollup_refresh_state"
+
+_tables_ready = False
+
+# Resultado da última refresh de cada rollup neste processo.
+_last_refresh: Dict[str, Dict[str, Any]] = {}
+
+
+def rollup_refresh_stats() -> Dict[str, Dict[str, Any]]:
+    """Duração, lag e dias recalculados na última refresh de cada rollup."""
+    return {name: dict(stats) for name, stats in _last_refresh.items()}
+
+
+def _create_table_sql(rollup: Dict) -> str:
+    """DDL da tabela de rollup: chaves do grão como PK + medidas."""
+    columns = [f"{name} {spec['type']} NOT NULL" for name, spec in rollup["keys"].items()]
+    columns += [f"{name} {spec['type']}" for name, spec in rollup["columns"].items()]
+    columns.append("refreshed_at TIMESTAMPTZ NOT NULL")
+    columns.append(f"PRIMARY KEY ({', '.join(rollup['keys'])})")
+
+    return f"CREATE TABLE IF NOT EXISTS {rollup['table']} (\n    " + ",\n    ".join(columns) + "\n)"
+
+
+def _upsert_sql(rollup: Dict) -> str:
+    """
+    Recalcula um dia ($1 <= created_at < $2) a partir de `sales` e faz o
+    upsert no rollup, marcando as linhas com o instante da execução ($3).
+    """
+    keys = rollup["keys"]
+    columns = rollup["columns"]
+
+    insert_columns = list(keys) + list(columns) + ["refreshed_at"]
+    select_parts = [spec["sql"] for spec in keys.values()]
+    select_parts += [spec["sql"] for spec in columns.values()]
+    select_parts.append("$3::timestamptz")
+
+    updates = [f"{name} = EXCLUDED.{name}" for name in list(columns) + ["refreshed_at"]]
+
+    return "\n".join(
+        [
+            f"INSERT INTO {rollup['table']} ({', '.join(insert_columns)})",
+            f"SELECT {', '.join(select_parts)}",
+            "FROM sales",
+            "WHERE sales.created_at >= $1::date AND sales.created_at < $2::date",
+            f"GROUP BY {', '.join(spec['sql'] for spec in keys.values())}",
+            f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {', '.join(updates)}",
+        ]
+    )
+
+
+def _delete_stale_sql(rollup: Dict) -> str:
+    """Remove as chaves de um dia que não foram regravadas nesta execução."""
+    return (
+        f"DELETE FROM {rollup['table']} "
+        f"WHERE {rollup['date_column']} = $1 AND refreshed_at < $2::timestamptz"
+    )
+
+
+async def ensure_rollup_tables(conn: asyncpg.Connection):
+    """
+    Cria (se preciso) as tabelas de rollup e a tabela de estado. Como é
+    DDL, invalida os prepared statements em cache.
+    """
+    global _tables_ready
+    if _tables_ready:
+        return
+
+    await conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+            rollup_name TEXT PRIMARY KEY,
+            watermark TIMESTAMPTZ,
+            refreshed_at TIMESTAMPTZ NOT NULL,
+            duration_ms DOUBLE PRECISION NOT NULL,
+            lag_seconds DOUBLE PRECISION,
+            buckets INTEGER NOT NULL
+        )
+        """
+    )
+    for rollup in ROLLUPS.values():
+        await conn.execute(_create_table_sql(rollup))
+
+    invalidate_prepared_statements()
+    _tables_ready = True
+
+
+async def _buckets_to_refresh(
+    conn: asyncpg.Connection, rollup: Dict, start_day: Optional[datetime.date]
+) -> List[datetime.date]:
+    """
+    Dias a recalcular: os que têm vendas a partir de 'start_day' e os que
+    já existem no rollup (para remover dias que ficaram vazios).
+    """
+    sales_where = ""
+    rollup_where = ""
+    params: List[Any] = []
+    if start_day is not None:
+        sales_where = "WHERE sales.created_at >= $1::date"
+        rollup_where = f"WHERE {rollup['date_column']} >= $1"
+        params.append(start_day)
+
+    rows = await conn.fetch(
+        f"""
+        SELECT DISTINCT DATE(sales.created_at) AS day FROM sales {sales_where}
+        UNION
+        SELECT {rollup['date_column']} FROM {rollup['table']} {rollup_where}
+        ORDER BY day
+        """,
+        *params,
+    )
+    return [row["day"] for row in rows if row["day"] is not None]
+
+
+async def refresh_rollup(
+    rollup_name: str,
+    late_window_seconds: Optional[float] = None,
+    full: bool = False,
+) -> Optional[Dict[str, Any]]:
+    """
+    Refresh incremental de um rollup. Retorna as estatísticas da execução,
+    ou None se outra refresh do mesmo rollup já estiver em andamento.
+    """
+    rollup = ROLLUPS.get(rollup_name)
+    if not rollup:
+        raise ValueError(f"Rollup desconhecido: '{rollup_name}'.")
+
+    if late_window_seconds is None:
+        late_window_seconds = settings.ROLLUP_REFRESH_LATE_WINDOW_SECONDS
+
+    start_time = time.perf_counter()
+
+    async with scheduled_connection("background", "rollup-refresh") as conn:
+        await ensure_rollup_tables(conn)
+
+        # Evita duas refreshes simultâneas (ex: vários workers) do mesmo rollup.
+        locked = await conn.fetchval(
+            "SELECT pg_try_advisory_lock(hashtext($1))", rollup["table"]
+        )
+        if not locked:
+            logging.info(f"Refresh de '{rollup_name}' já em andamento; ignorando.")
+            return None
+
+        try:
+            previous_watermark = None
+            if not full:
+                previous_watermark = await conn.fetchval(
+                    f"SELECT watermark FROM {STATE_TABLE} WHERE rollup_name = $1",
+                    rollup_name,
+                )
+
+            # Capturado antes do recálculo: vendas que chegarem durante a
+            # execução ficam para a próxima.
+            new_watermark = await conn.fetchval(
+                "SELECT MAX(sales.created_at)::timestamptz FROM sales"
+            )
+
+            start_day = None
+            if previous_watermark is not None:
+                start_day = await conn.fetchval(
+                    "SELECT DATE($1::timestamptz - make_interval(secs => $2))",
+                    previous_watermark,
+                    float(late_window_seconds),
+                )
+
+            days = await _buckets_to_refresh(conn, rollup, start_day)
+            run_at = datetime.datetime.now(datetime.timezone.utc)
+            upsert_sql = _upsert_sql(rollup)
+            delete_sql = _delete_stale_sql(rollup)
+
+            for day in days:
+                async with conn.transaction():
+                    await conn.execute(
+                        upsert_sql, day, day + datetime.timedelta(days=1), run_at
+                    )
+                    await conn.execute(delete_sql, day, run_at)
+                # Cede o loop entre os dias para não monopolizar o worker.
+                await asyncio.sleep(0)
+
+            duration_ms = (time.perf_counter() - start_time) * 1000
+            watermark = new_watermark or previous_watermark
+
+            state = await conn.fetchrow(
+                f"""
+                INSERT INTO {STATE_TABLE}
+                    (rollup_name, watermark, refreshed_at, duration_ms, lag_seconds, buckets)
+                VALUES ($1, $2, now(), $3, EXTRACT(EPOCH FROM now() - $2::timestamptz), $4)
+                ON CONFLICT (rollup_name) DO UPDATE SET
+                    watermark = EXCLUDED.watermark,
+                    refreshed_at = EXCLUDED.refreshed_at,
+                    duration_ms = EXCLUDED.duration_ms,
+                    lag_seconds = EXCLUDED.lag_seconds,
+                    buckets = EXCLUDED.buckets
+                RETURNING lag_seconds, DATE(watermark) AS covered_until
+                """,
+                rollup_name,
+                watermark,
+                duration_ms,
+                len(days),
+            )
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock(hashtext($1))", rollup["table"])
+
+    lag_seconds = state["lag_seconds"]
+    set_rollup_coverage(rollup_name, state["covered_until"])
+
+    stats = {
+        "watermark": watermark.isoformat() if watermark else None,
+        "buckets": len(days),
+        "duration_ms": duration_ms,
+        "lag_seconds": lag_seconds,
+        "refreshed_at": run_at.isoformat(),
+    }
+    _last_refresh[rollup_name] = stats
+
+    logging.info(
+        f"Rollup '{rollup_name}' atualizado: {len(days)} dia(s) em {duration_ms:.0f} ms."
+    )
+    return stats
+
+
+async def load_rollup_coverage():
+    """
+    Lê da tabela de estado até onde cada rollup está consolidado,
+    incluindo refreshes feitas por outros processos (ex: a CLI).
+    """
+    async with scheduled_connection("background", "rollup-refresh") as conn:
+        await ensure_rollup_tables(conn)
+        rows = await conn.fetch(
+            f"SELECT rollup_name, DATE(watermark) AS covered_until FROM {STATE_TABLE}"
+        )
+
+    for row in rows:
+        if row["rollup_name"] in ROLLUPS:
+            set_rollup_coverage(row["rollup_name"], row["covered_until"])
+
+
+async def refresh_all_rollups(
+    rollup_names: Optional[List[str]] = None,
+    late_window_seconds: Optional[float] = None,
+    full: bool = False,
+):
+    """Atualiza os rollups indicados (por padrão, todos) em sequência."""
+    for rollup_name in rollup_names or list(ROLLUPS):
+        await refresh_rollup(rollup_name, late_window_seconds, full)
+
+
+async def run_periodic_refresh(interval_seconds: float):
+    """
+    Laço da refresh em background (iniciado no lifespan). Erros são
+    registrados e a próxima execução acontece normalmente. A cada ciclo a
+    cobertura dos rollups é relida, para valer também as refreshes feitas
+    por outros workers.
+    """
+    while True:
+        try:
+            await refresh_all_rollups()
+            await load_rollup_coverage()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Erro na refresh dos rollups: {e}")
+
+        await asyncio.sleep(interval_seconds)
+
+
+async def run_periodic_coverage_reload(interval_seconds: float):
+    """
+    Relê a cobertura dos rollups periodicamente, quando a refresh roda em
+    outro processo (ex: a CLI agendada) e não neste.
+    """
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await load_rollup_coverage()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Erro ao ler a cobertura dos rollups: {e}")
+
+
+async def _main(args: argparse.Namespace):
+    await connect_to_db()
+    try:
+        await refresh_all_rollups(args.rollup, args.late_window_seconds, args.full)
+    finally:
+        await close_db_connection()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Atualiza as tabelas de rollup.")
+    parser.add_argument(
+        "--rollup",
+        action="append",
+        choices=list(ROLLUPS),
+        help="Rollup a atualizar (pode repetir). Padrão: todos.",
+    )
+    parser.add_argument(
+        "--late-window-seconds",
+        type=float,
+        default=None,
+        help="Janela para dados atrasados (padrão: ROLLUP_REFRESH_LATE_WINDOW_SECONDS).",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Ignora o watermark e recalcula todos os dias.",
+    )
+
+    asyncio.run(_main(parser.parse_args()))
@@ -6,92 +6,180 @@ class JoinType(str, Enum):
     LEFT = "LEFT JOIN"
 
 
+class Cardinality(str, Enum):
+    """Cardinalidade de um join, do lado já presente na query para a tabela juntada."""
+
+    MANY_TO_ONE = "many_to_one"
+    ONE_TO_ONE = "one_to_one"
+    ONE_TO_MANY = "one_to_many"
+
+
+# Cada join declara:
+# - "table"/"on": a tabela juntada e a condição do join;
+# - "type": o tipo de join padrão (pode ser promovido a INNER pelo builder);
+# - "cardinality": se o join multiplica linhas (one_to_many) ou não;
+# - "nullable": se a linha do lado esquerdo pode ficar sem correspondente
+#   (FK nula ou relação opcional). Joins many-to-one não nulos podem ser
+#   removidos com segurança quando nenhuma coluna deles é usada.
 JOIN_PATHS = {
     "stores": {
-        "sql": "LEFT JOIN stores ON sales.store_id = stores.id",
+        "table": "stores",
+        "on": "sales.store_id = stores.id",
         "depends_on": [],
         "type": JoinType.LEFT,
+        "cardinality": Cardinality.MANY_TO_ONE,
+        "nullable": False,
     },
     "channels": {
-        "sql": "LEFT JOIN channels ON sales.channel_id = channels.id",
+        "table": "channels",
+        "on": "sales.channel_id = channels.id",
         "depends_on": [],
         "type": JoinType.LEFT,
+        "cardinality": Cardinality.MANY_TO_ONE,
+        "nullable": False,
     },
     "customers": {
-        "sql": "LEFT JOIN customers ON sales.customer_id = customers.id",
+        "table": "customers",
+        "on": "sales.customer_id = customers.id",
         "depends_on": [],
         "type": JoinType.LEFT,
+        "cardinality": Cardinality.MANY_TO_ONE,
+        "nullable": True,
     },
     "product_sales": {
-        "sql": "JOIN product_sales ON sales.id = product_sales.sale_id",
+        "table": "product_sales",
+        "on": "sales.id = product_sales.sale_id",
         "depends_on": [],
         "type": JoinType.INNER,
+        "cardinality": Cardinality.ONE_TO_MANY,
+        "nullable": False,
     },
     "products": {
-        "sql": "JOIN products ON product_sales.product_id = products.id",
+        "table": "products",
+        "on": "product_sales.product_id = products.id",
         "depends_on": ["product_sales"],
         "type": JoinType.INNER,
+        "cardinality": Cardinality.MANY_TO_ONE,
+        "nullable": False,
     },
     "categories": {
-        "sql": "JOIN categories ON products.category_id = categories.id",
+        "table": "categories",
+        "on": "products.category_id = categories.id",
         "depends_on": ["products"],
-        "type": JoinType.LEFT,
+        "type": JoinType.INNER,
+        "cardinality": Cardinality.MANY_TO_ONE,
+        "nullable": True,
     },
     "item_product_sales": {
-        "sql": "LEFT JOIN item_product_sales ON item_product_sales.product_sale_id = product_sales.id",
+        "table": "item_product_sales",
+        "on": "item_product_sales.product_sale_id = product_sales.id",
         "depends_on": ["product_sales"],
         "type": JoinType.LEFT,
+        "cardinality": Cardinality.ONE_TO_MANY,
+        "nullable": False,
     },
     "items": {
-        "sql": "LEFT JOIN items ON item_product_sales.item_id = items.id",
+        "table": "items",
+        "on": "item_product_sales.item_id = items.id",
         "depends_on": ["item_product_sales"],
         "type": JoinType.LEFT,
+        "cardinality": Cardinality.MANY_TO_ONE,
+        "nullable": False,
     },
     "option_groups": {
-        "sql": "LEFT JOIN option_groups ON item_product_sales.option_group_id = option_groups.id",
+        "table": "option_groups",
+        "on": "item_product_sales.option_group_id = option_groups.id",
         "depends_on": ["item_product_sales"],
         "type": JoinType.LEFT,
+        "cardinality": Cardinality.MANY_TO_ONE,
+        "nullable": True,
     },
     "brands": {
-        "sql": "LEFT JOIN brands ON stores.brand_id = brands.id",
+        "table": "brands",
+        "on": "stores.brand_id = brands.id",
         "depends_on": ["stores"],
         "type": JoinType.LEFT,
+        "cardinality": Cardinality.MANY_TO_ONE,
+        "nullable": True,
     },
     "sub_brands": {
-        "sql": "LEFT JOIN sub_brands ON stores.sub_brand_id = sub_brands.id",
+        "table": "sub_brands",
+        "on": "stores.sub_brand_id = sub_brands.id",
         "depends_on": ["stores"],
         "type": JoinType.LEFT,
+        "cardinality": Cardinality.MANY_TO_ONE,
+        "nullable": True,
     },
     "payments": {
-        "sql": "LEFT JOIN payments ON payments.sale_id = sales.id",
+        "table": "payments",
+        "on": "payments.sale_id = sales.id",
         "depends_on": [],
         "type": JoinType.LEFT,
+        "cardinality": Cardinality.ONE_TO_MANY,
+        "nullable": False,
     },
     "payment_types": {
-        "sql": "LEFT JOIN payment_types ON payments.payment_type_id = payment_types.id",
+        "table": "payment_types",
+        "on": "payments.payment_type_id = payment_types.id",
         "depends_on": ["payments"],
         "type": JoinType.LEFT,
+        "cardinality": Cardinality.MANY_TO_ONE,
+        "nullable": False,
     },
     "coupon_sales": {
-        "sql": "LEFT JOIN coupon_sales ON coupon_sales.sale_id = sales.id",
+        "table": "coupon_sales",
+        "on": "coupon_sales.sale_id = sales.id",
         "depends_on": [],
         "type": JoinType.LEFT,
+        "cardinality": Cardinality.ONE_TO_MANY,
+        "nullable": False,
     },
     "coupons": {
-        "sql": "LEFT JOIN coupons ON coupon_sales.coupon_id = coupons.id",
+        "table": "coupons",
+        "on": "coupon_sales.coupon_id = coupons.id",
         "depends_on": ["coupon_sales"],
         "type": JoinType.LEFT,
+        "cardinality": Cardinality.MANY_TO_ONE,
+        "nullable": False,
     },
     "delivery_sales": {
-        "sql": "LEFT JOIN delivery_sales ON delivery_sales.sale_id = sales.id",
+        "table": "delivery_sales",
+        "on": "delivery_sales.sale_id = sales.id",
         "depends_on": [],
         "type": JoinType.LEFT,
+        "cardinality": Cardinality.ONE_TO_ONE,
+        "nullable": True,
     },
     "delivery_addresses": {
-        "sql": "LEFT JOIN delivery_addresses ON delivery_addresses.sale_id = sales.id",
+        "table": "delivery_addresses",
+        "on": "delivery_addresses.sale_id = sales.id",
         "depends_on": [],
         "type": JoinType.LEFT,
+        "cardinality": Cardinality.ONE_TO_ONE,
+        "nullable": True,
+    },
+}
+
+
+# Grãos (granularidades) dos fatos. "joins" é o caminho, a partir de `sales`,
+# até a tabela do grão: cada join desse caminho é one-to-many e multiplica
+# as linhas de `sales`. Métricas declaram seu grão em METRICS ("grain") e
+# só podem ser agregadas com segurança quando a query não traz joins que
+# multipliquem linhas fora do caminho do seu grão.
+# `delivery_sales` é 1:1 com `sales`, por isso fica no grão "sales".
+FACT_GRAINS = {
+    "sales": {"table": "sales", "joins": []},
+    "product_sales": {"table": "product_sales", "joins": ["product_sales"]},
+    "item_product_sales": {
+        "table": "item_product_sales",
+        "joins": ["product_sales", "item_product_sales"],
     },
+    "payments": {"table": "payments", "joins": ["payments"]},
+    "coupon_sales": {"table": "coupon_sales", "joins": ["coupon_sales"]},
+}
+
+FAN_OUT_JOINS = {
+    join_name for grain in FACT_GRAINS.values() for join_name in grain["joins"]
 }
 
 
@@ -100,130 +188,158 @@ METRICS = {
         "sql": "SUM(sales.total_amount)",
         "label": "Total de Vendas (Líquido)",
         "type": "currency",
+        "grain": "sales",
     },
     "ticket_medio": {
         "sql": "AVG(sales.total_amount)",
         "label": "Ticket Médio (Líquido)",
         "type": "currency",
+        "grain": "sales",
     },
     "total_bruto_itens": {
         "sql": "SUM(sales.total_amount_items)",
         "label": "Total Bruto (Itens)",
         "type": "currency",
+        "grain": "sales",
     },
     "total_descontos": {
         "sql": "SUM(sales.total_discount)",
         "label": "Total de Descontos (Venda)",
         "type": "currency",
+        "grain": "sales",
     },
     "total_acrescimos": {
         "sql": "SUM(sales.total_increase)",
         "label": "Total de Acréscimos (Venda)",
         "type": "currency",
+        "grain": "sales",
     },
     "total_taxa_entrega": {
         "sql": "SUM(sales.delivery_fee)",
         "label": "Total Taxa de Entrega (Venda)",
         "type": "currency",
+        "grain": "sales",
     },
     "total_taxa_servico": {
         "sql": "SUM(sales.service_tax_fee)",
         "label": "Total Taxa de Serviço",
         "type": "currency",
+        "grain": "sales",
     },
     "total_pago_cliente": {
         "sql": "SUM(sales.value_paid)",
         "label": "Total Pago pelo Cliente",
         "type": "currency",
+        "grain": "sales",
     },
     "total_pedidos": {
         "sql": "COUNT(DISTINCT sales.id)",
         "label": "Total de Pedidos",
         "type": "number",
+        "grain": "sales",
+        "grain_sql": "COUNT(sales.id)",
     },
     "total_pessoas_atendidas": {
         "sql": "SUM(sales.people_quantity)",
         "label": "Total de Pessoas Atendidas",
         "type": "number",
+        "grain": "sales",
     },
     "tempo_medio_preparo_min": {
         "sql": "AVG(sales.production_seconds) / 60.0",
         "label": "T. Médio de Preparo (min)",
         "type": "number",
+        "grain": "sales",
     },
     "tempo_medio_entrega_min": {
         "sql": "AVG(sales.delivery_seconds) / 60.0",
         "label": "T. Médio de Entrega (min)",
         "type": "number",
+        "grain": "sales",
     },
     "total_produtos_vendidos": {
         "sql": "SUM(product_sales.quantity)",
         "label": "Total de Produtos Vendidos",
         "joins_needed": ["product_sales"],
         "type": "number",
+        "grain": "product_sales",
     },
     "total_addons_vendidos": {
         "sql": "SUM(item_product_sales.quantity)",
         "label": "Total de Addons Vendidos",
         "joins_needed": ["item_product_sales"],
         "type": "number",
+        "grain": "item_product_sales",
     },
     "receita_total_addons": {
         "sql": "SUM(item_product_sales.additional_price)",
         "label": "Receita Total de Addons",
         "joins_needed": ["item_product_sales"],
         "type": "currency",
+        "grain": "item_product_sales",
     },
     "total_processado_pagamentos": {
         "sql": "SUM(payments.value)",
         "label": "Total Processado (Pagamentos)",
         "joins_needed": ["payments"],
         "type": "currency",
+        "grain": "payments",
     },
     "total_desconto_cupom": {
         "sql": "SUM(coupon_sales.value)",
         "label": "Total Desconto (Cupons)",
         "joins_needed": ["coupon_sales"],
         "type": "currency",
+        "grain": "coupon_sales",
     },
     "total_cupons_usados": {
         "sql": "COUNT(DISTINCT coupon_sales.id)",
         "label": "Total de Cupons Usados",
         "joins_needed": ["coupon_sales"],
         "type": "number",
+        "grain": "coupon_sales",
+        "grain_sql": "COUNT(coupon_sales.id)",
     },
     "total_custo_entregador": {
         "sql": "SUM(delivery_sales.courier_fee)",
         "label": "Custo Total (Entregador)",
         "joins_needed": ["delivery_sales"],
         "type": "currency",
+        "grain": "sales",
     },
     "ticket_medio_robusto": {
         "sql": "SUM(sales.total_amount) / NULLIF(COUNT(DISTINCT sales.id), 0)",
         "label": "Ticket Médio (Calculado)",
         "type": "currency",
+        "grain": "sales",
+        "grain_sql": "SUM(sales.total_amount) / NULLIF(COUNT(sales.id), 0)",
     },
     "percentual_desconto": {
         "sql": "(SUM(sales.total_discount) / NULLIF(SUM(sales.total_amount_items), 0)) * 100.0",
         "label": "% Desconto (sobre o Bruto)",
         "type": "percentage",
+        "grain": "sales",
     },
     "percentual_taxa_entrega": {
         "sql": "(SUM(sales.delivery_fee) / NULLIF(SUM(sales.total_amount), 0)) * 100.0",
         "label": "% Taxa de Entrega (sobre o Líquido)",
         "type": "percentage",
+        "grain": "sales",
     },
     "valor_por_cliente": {
         "sql": "SUM(sales.total_amount) / NULLIF(COUNT(DISTINCT sales.customer_id), 0)",
         "label": "Valor por Cliente (LTV Simplificado)",
         "joins_needed": [],
         "type": "currency",
+        "grain": "sales",
     },
     "pedidos_por_cliente": {
         "sql": "CAST(COUNT(DISTINCT sales.id) AS FLOAT) / NULLIF(COUNT(DISTINCT sales.customer_id), 0)",
         "label": "Pedidos por Cliente (Frequência)",
         "joins_needed": [],
         "type": "number",
+        "grain": "sales",
+        "grain_sql": "CAST(COUNT(sales.id) AS FLOAT) / NULLIF(COUNT(DISTINCT sales.customer_id), 0)",
     },
 }
 
@@ -409,3 +525,111 @@ DIMENSIONS = {
         "type": "geographic",
     },
 }
+
+
+# Colunas de medida armazenadas pelos rollups de `sales`. São decomponíveis
+# (somas e contagens), então podem ser reagregadas em qualquer grão mais
+# grosso que o do rollup.
+_SALES_ROLLUP_COLUMNS = {
+    "total_amount": {"sql": "SUM(sales.total_amount)", "type": "NUMERIC"},
+    "total_amount_count": {"sql": "COUNT(sales.total_amount)", "type": "BIGINT"},
+    "total_amount_items": {"sql": "SUM(sales.total_amount_items)", "type": "NUMERIC"},
+    "total_discount": {"sql": "SUM(sales.total_discount)", "type": "NUMERIC"},
+    "total_increase": {"sql": "SUM(sales.total_increase)", "type": "NUMERIC"},
+    "delivery_fee": {"sql": "SUM(sales.delivery_fee)", "type": "NUMERIC"},
+    "service_tax_fee": {"sql": "SUM(sales.service_tax_fee)", "type": "NUMERIC"},
+    "value_paid": {"sql": "SUM(sales.value_paid)", "type": "NUMERIC"},
+    "people_quantity": {"sql": "SUM(sales.people_quantity)", "type": "NUMERIC"},
+    "sales_count": {"sql": "COUNT(sales.id)", "type": "BIGINT"},
+}
+
+
+def _sales_rollup_measures(table: str) -> dict:
+    """Métricas da camada semântica reescritas sobre as colunas de um rollup."""
+    return {
+        "total_vendas": f"SUM({table}.total_amount)",
+        "ticket_medio": f"SUM({table}.total_amount) / NULLIF(SUM({table}.total_amount_count), 0)",
+        "total_bruto_itens": f"SUM({table}.total_amount_items)",
+        "total_descontos": f"SUM({table}.total_discount)",
+        "total_acrescimos": f"SUM({table}.total_increase)",
+        "total_taxa_entrega": f"SUM({table}.delivery_fee)",
+        "total_taxa_servico": f"SUM({table}.service_tax_fee)",
+        "total_pago_cliente": f"SUM({table}.value_paid)",
+        "total_pedidos": f"SUM({table}.sales_count)",
+        "total_pessoas_atendidas": f"SUM({table}.people_quantity)",
+        "ticket_medio_robusto": f"SUM({table}.total_amount) / NULLIF(SUM({table}.sales_count), 0)",
+        "percentual_desconto": f"(SUM({table}.total_discount) / NULLIF(SUM({table}.total_amount_items), 0)) * 100.0",
+        "percentual_taxa_entrega": f"(SUM({table}.delivery_fee) / NULLIF(SUM({table}.total_amount), 0)) * 100.0",
+    }
+
+
+def _daily_rollup_dimensions(table: str) -> dict:
+    """Dimensões de tempo derivadas da coluna de data diária de um rollup."""
+    return {
+        "data_venda": {"sql": f"{table}.sale_date::timestamp"},
+        "dia_da_semana": {"sql": f"EXTRACT(DOW FROM {table}.sale_date)"},
+        "mes_venda": {"sql": f"DATE_TRUNC('month', {table}.sale_date::timestamp)"},
+        "ano_venda": {"sql": f"DATE_TRUNC('year', {table}.sale_date::timestamp)"},
+    }
+
+
+# Tabelas de rollup (agregados pré-calculados de `sales`), declaradas da
+# menor para a maior: o QueryBuilder reescreve a query sobre a primeira que
+# cobre todas as métricas, dimensões e filtros pedidos.
+# - "keys": colunas do grão do rollup (chave primária) e seu SQL de origem;
+# - "columns": medidas decomponíveis armazenadas e seu SQL de origem;
+# - "date_column": coluna (DATE) usada pelo filtro de período;
+# - "dimensions"/"measures": como cada campo da camada semântica é lido
+#   do rollup; "joins" segue o formato de JOIN_PATHS.
+ROLLUPS = {
+    "sales_daily": {
+        "table": "rollup_sales_daily",
+        "date_column": "sale_date",
+        "keys": {
+            "sale_date": {"sql": "DATE(sales.created_at)", "type": "DATE"},
+        },
+        "columns": _SALES_ROLLUP_COLUMNS,
+        "joins": {},
+        "dimensions": _daily_rollup_dimensions("rollup_sales_daily"),
+        "measures": _sales_rollup_measures("rollup_sales_daily"),
+    },
+    "sales_daily_store_channel": {
+        "table": "rollup_sales_daily_store_channel",
+        "date_column": "sale_date",
+        "keys": {
+            "sale_date": {"sql": "DATE(sales.created_at)", "type": "DATE"},
+            "store_id": {"sql": "sales.store_id", "type": "INTEGER"},
+            "channel_id": {"sql": "sales.channel_id", "type": "INTEGER"},
+        },
+        "columns": _SALES_ROLLUP_COLUMNS,
+        "joins": {
+            "stores": {
+                "table": "stores",
+                "on": "rollup_sales_daily_store_channel.store_id = stores.id",
+                "depends_on": [],
+                "type": JoinType.LEFT,
+            },
+            "channels": {
+                "table": "channels",
+                "on": "rollup_sales_daily_store_channel.channel_id = channels.id",
+                "depends_on": [],
+                "type": JoinType.LEFT,
+            },
+            "brands": JOIN_PATHS["brands"],
+            "sub_brands": JOIN_PATHS["sub_brands"],
+        },
+        "dimensions": {
+            **_daily_rollup_dimensions("rollup_sales_daily_store_channel"),
+            "loja_nome": {"sql": "stores.name", "joins_needed": ["stores"]},
+            "loja_cidade": {"sql": "stores.city", "joins_needed": ["stores"]},
+            "loja_estado": {"sql": "stores.state", "joins_needed": ["stores"]},
+            "loja_bairro": {"sql": "stores.district", "joins_needed": ["stores"]},
+            "loja_propria": {"sql": "stores.is_own", "joins_needed": ["stores"]},
+            "marca_nome": {"sql": "brands.name", "joins_needed": ["brands"]},
+            "sub_marca_nome": {"sql": "sub_brands.name", "joins_needed": ["sub_brands"]},
+            "canal_nome": {"sql": "channels.name", "joins_needed": ["channels"]},
+            "canal_tipo": {"sql": "channels.type", "joins_needed": ["channels"]},
+        },
+        "measures": _sales_rollup_measures("rollup_sales_daily_store_channel"),
+    },
+}
@@ -0,0 +1,62 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class _Flight:
+    """Uma execução em andamento e quantos chamadores a aguardam."""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalescência de chamadas concorrentes: chamadores com a mesma chave
+    aguardam uma única execução compartilhada.
+
+    A execução roda em uma task própria e cada chamador a aguarda via
+    asyncio.shield, então o cancelamento de um chamador (ex: cliente
+    desconectado) não cancela a execução nem os outros chamadores.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+
+        self.executions = 0
+        self.coalesced = 0
+
+    async def run(self, key: str, function: Callable[[], Awaitable[Any]]) -> Any:
+        """Executa 'function', ou aguarda a execução em andamento da mesma chave."""
+        flight = self._flights.get(key)
+
+        if flight is None:
+            flight = _Flight(asyncio.create_task(function()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda task: self._finish(key, flight))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+
+    def _finish(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+        # Marca a exceção como lida mesmo se todos os chamadores desistiram.
+        if not flight.task.cancelled():
+            flight.task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """Execuções em andamento, chamadores aguardando e totais."""
+        return {
+            "in_flight": len(self._flights),
+            "waiters": sum(flight.waiters for flight in self._flights.values()),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,136 @@
+"""
+Log de queries lentas.
+
+Queries que passam de SLOW_QUERY_THRESHOLD_MS são registradas em um
+buffer circular (as SLOW_QUERY_LOG_SIZE mais recentes) com a requisição,
+o SQL, os parâmetros e o tempo de cada etapa. Uma amostra delas
+(SLOW_QUERY_EXPLAIN_SAMPLE_RATE) é reexecutada em background, em uma
+conexão própria, com EXPLAIN (ANALYZE, BUFFERS) para mostrar onde o tempo
+foi gasto. Esses EXPLAINs passam pelo escalonador na classe "background"
+e são no máximo SLOW_QUERY_EXPLAIN_MAX_CONCURRENCY ao mesmo tempo. É o ponto de partida para decidir índices e rollups.
+"""
+
+import asyncio
+import datetime
+import itertools
+import json
+import logging
+import random
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+
+from app.api.v1.schemas import QueryRequest
+from app.core.config import settings
+from app.core.database import apply_statement_timeout, query_shape, scheduled_connection
+from app.core.tracing import current_durations
+
+
+class SlowQueryLog:
+    """Buffer circular das queries lentas, com captura amostrada de EXPLAIN."""
+
+    def __init__(
+        self,
+        max_entries: int,
+        threshold_ms: float,
+        explain_sample_rate: float,
+        max_concurrent_explains: int = 1,
+        random_fn: Callable[[], float] = random.random,
+    ):
+        self.threshold_ms = threshold_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.max_concurrent_explains = max_concurrent_explains
+        self._entries: Deque[Dict[str, Any]] = deque(maxlen=max_entries)
+        self._ids = itertools.count(1)
+        self._random = random_fn
+        self._explaining: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def observe(
+        self,
+        request: QueryRequest,
+        sql: str,
+        params: List[Any],
+        duration_ms: float,
+        query_class: str,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Registra a query se ela passou do limite. Retorna a entrada criada
+        (ou None, se a query não foi lenta).
+        """
+        if duration_ms < self.threshold_ms:
+            return None
+
+        shape = query_shape(sql)
+        entry = {
+            "id": next(self._ids),
+            "recorded_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "duration_ms": duration_ms,
+            "query_class": query_class,
+            "shape": shape,
+            "request": request.model_dump(mode="json"),
+            "sql": sql,
+            "params": params,
+            "stages_ms": current_durations(),
+            "explain": None,
+        }
+        self._entries.append(entry)
+        logging.warning(f"Query lenta ({duration_ms:.0f} ms, formato {shape}).")
+
+        # Um EXPLAIN por formato de cada vez, e poucos ao todo: rajadas de
+        # queries lentas não viram rajadas de EXPLAIN ANALYZE.
+        if (
+            shape not in self._explaining
+            and len(self._explaining) < self.max_concurrent_explains
+            and self._random() < self.explain_sample_rate
+        ):
+            entry["explain"] = {"status": "pending"}
+            self._explaining.add(shape)
+            task = asyncio.create_task(self._capture_explain(entry, sql, params))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        return entry
+
+    async def _capture_explain(self, entry: Dict[str, Any], sql: str, params: List[Any]):
+        """
+        Reexecuta a query com EXPLAIN (ANALYZE, BUFFERS) em uma transação
+        somente leitura, desfeita ao final. A conexão vem do escalonador,
+        na classe de menor prioridade.
+        """
+        try:
+            async with scheduled_connection("background", "slow-query-log") as conn:
+                await apply_statement_timeout(conn, settings.STATEMENT_TIMEOUTS_MS["export"])
+                transaction = conn.transaction(readonly=True)
+                await transaction.start()
+                try:
+                    plan = await conn.fetchval(
+                        f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", *params
+                    )
+                finally:
+                    await transaction.rollback()
+
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            entry["explain"] = {"status": "done", "plan": plan[0]}
+        except Exception as e:
+            logging.warning(f"Falha ao capturar o EXPLAIN da query lenta: {e}")
+            entry["explain"] = {"status": "error", "error": str(e)}
+        finally:
+            self._explaining.discard(entry["shape"])
+
+    def entries(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Entradas mais recentes primeiro."""
+        entries = list(reversed(self._entries))
+        return entries[:limit] if limit is not None else entries
+
+    def clear(self):
+        """Remove todas as entradas."""
+        self._entries.clear()
+
+
+slow_query_log = SlowQueryLog(
+    max_entries=settings.SLOW_QUERY_LOG_SIZE,
+    threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+    explain_sample_rate=settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+    max_concurrent_explains=settings.SLOW_QUERY_EXPLAIN_MAX_CONCURRENCY,
+)
@@ -0,0 +1,18 @@
+"""
+Micro-benchmarks do caminho da query, sem banco de dados.
+
+As configurações obrigatórias (DB_*, MARITACA_API_KEY) recebem valores
+fictícios quando ausentes: nenhuma conexão é aberta pelos benchmarks.
+"""
+
+import os
+
+for _name, _value in {
+    "DB_HOST": "localhost",
+    "DB_PORT": "5432",
+    "DB_USER": "benchmark",
+    "DB_PASSWORD": "benchmark",
+    "DB_NAME": "benchmark",
+    "MARITACA_API_KEY": "benchmark",
+}.items():
+    os.environ.setdefault(_name, _value)
@@ -0,0 +1,101 @@
+"""
+Medição, gravação e comparação dos resultados dos benchmarks.
+
+Cada caso roda em várias rodadas; em cada rodada a função é chamada em
+laço por pelo menos `min_time` segundos. O tempo de referência de um caso
+é a menor média por chamada entre as rodadas (a menos afetada por ruído
+da máquina).
+"""
+
+import datetime
+import json
+import platform
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+DEFAULT_ROUNDS = 5
+DEFAULT_MIN_TIME = 0.1
+DEFAULT_THRESHOLD = 0.25
+
+
+def measure(
+    function: Callable[[], Any], rounds: int = DEFAULT_ROUNDS, min_time: float = DEFAULT_MIN_TIME
+) -> Dict[str, float]:
+    """Tempo por chamada (µs): melhor e mediana das rodadas."""
+    function()  # aquecimento
+
+    # Quantas chamadas por rodada para durar pelo menos min_time.
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        calls *= 2 if elapsed < min_time / 10 else 1 + int(min_time / max(elapsed, 1e-9))
+
+    per_call = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        per_call.append((time.perf_counter() - start) / calls * 1e6)
+
+    per_call.sort()
+    return {
+        "best_us": per_call[0],
+        "median_us": per_call[len(per_call) // 2],
+        "calls_per_round": calls,
+        "rounds": rounds,
+    }
+
+
+def build_report(results: Dict[str, Dict[str, float]]) -> Dict[str, Any]:
+    """Resultados com metadados da máquina, no formato do arquivo de baseline."""
+    return {
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "results": results,
+    }
+
+
+def load_report(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, encoding="utf-8") as report_file:
+            return json.load(report_file)
+    except FileNotFoundError:
+        return None
+
+
+def save_report(path: str, report: Dict[str, Any]):
+    with open(path, "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=2, sort_keys=True)
+        report_file.write("\n")
+
+
+def compare(
+    baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = DEFAULT_THRESHOLD
+) -> List[Dict[str, Any]]:
+    """
+    Compara os casos presentes nos dois relatórios. Um caso regrediu
+    quando o tempo atual passa do baseline em mais de 'threshold' (fração).
+    """
+    comparison = []
+    for name, result in current["results"].items():
+        reference = baseline["results"].get(name)
+        if reference is None:
+            continue
+
+        ratio = result["best_us"] / reference["best_us"]
+        comparison.append(
+            {
+                "name": name,
+                "baseline_us": reference["best_us"],
+                "current_us": result["best_us"],
+                "ratio": ratio,
+                "regressed": ratio > 1 + threshold,
+            }
+        )
+    return comparison
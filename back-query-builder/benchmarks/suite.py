@@ -0,0 +1,235 @@
+"""
+Micro-benchmarks do caminho da query que não dependem do banco:
+compilação da SQL, conversão dos registros, insights e serialização.
+
+Uso:
+    python -m benchmarks.suite                          # mede e imprime
+    python -m benchmarks.suite --output results.json    # salva o resultado
+    python -m benchmarks.suite --save-baseline          # grava o baseline
+    python -m benchmarks.suite --baseline benchmarks/baseline.json --threshold 0.25
+
+Com --baseline, compara com o arquivo e sai com código 1 se algum caso
+ficou mais lento que o limite (fração sobre o tempo do baseline). O
+baseline deve ser gerado na mesma máquina (ou no mesmo runner de CI) em
+que a comparação roda.
+"""
+
+import argparse
+import datetime
+import decimal
+import random
+import sys
+from typing import Any, Callable, Dict, List
+
+from benchmarks import harness
+
+from app.api.v1.schemas import QueryRequest
+from app.services.insight_generator import InsightGenerator, _format_value
+from app.services.query_engine import QueryBuilder, plan_cache
+from app.services.result_formats import encode_columnar, encode_json, rows_from_records
+
+DEFAULT_BASELINE_PATH = "benchmarks/baseline.json"
+ROW_COUNTS = [1_000, 10_000, 100_000]
+
+DATE_RANGE = {"start_date": "2025-01-01", "end_date": "2025-06-30"}
+
+# Formatos de query representativos do front-end: KPIs, rankings,
+# séries temporais, cruzamentos e filtros em tabelas ligadas.
+QUERY_SHAPES: Dict[str, Dict[str, Any]] = {
+    "kpi": {"metrics": ["total_vendas", "total_pedidos", "ticket_medio"]},
+    "leaderboard": {
+        "metrics": ["total_vendas"],
+        "dimensions": ["loja_nome"],
+        "order_by": [{"field": "total_vendas", "direction": "desc"}],
+        "limit": 10,
+    },
+    "timeseries": {
+        "metrics": ["total_vendas", "total_pedidos"],
+        "dimensions": ["data_venda"],
+        "customDateRange": DATE_RANGE,
+    },
+    "crosstab": {
+        "metrics": ["total_vendas", "percentual_desconto"],
+        "dimensions": ["canal_nome", "dia_da_semana"],
+        "customDateRange": DATE_RANGE,
+    },
+    "filtered": {
+        "metrics": ["total_vendas", "total_pedidos"],
+        "dimensions": ["loja_cidade"],
+        "filters": [
+            {"field": "canal_nome", "operator": "in", "value": ["iFood", "Rappi"]},
+            {"field": "loja_estado", "operator": "eq", "value": "SP"},
+        ],
+        "customDateRange": DATE_RANGE,
+    },
+    "product_grain": {
+        "metrics": ["total_vendas", "total_produtos_vendidos"],
+        "dimensions": ["produto_nome", "categoria_produto"],
+        "customDateRange": DATE_RANGE,
+    },
+}
+
+# Dimensões que atravessam as cadeias de join mais longas (venda ->
+# produto -> addon, venda -> pagamento, venda -> cupom, loja -> marca).
+DEEP_JOIN_SHAPE: Dict[str, Any] = {
+    "metrics": ["total_vendas", "receita_total_addons", "total_desconto_cupom"],
+    "dimensions": [
+        "addon_grupo",
+        "categoria_produto",
+        "marca_nome",
+        "metodo_pagamento",
+        "cupom_codigo",
+        "bairro_entrega",
+    ],
+    "filters": [
+        {"field": "sub_marca_nome", "operator": "neq", "value": "Teste"},
+        {"field": "cliente_genero", "operator": "eq", "value": "F"},
+    ],
+    "customDateRange": DATE_RANGE,
+}
+
+RECORD_METRICS = ["total_vendas", "total_pedidos", "ticket_medio"]
+RECORD_DIMENSIONS = ["loja_nome", "canal_nome", "data_venda"]
+
+
+def _records(count: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """Registros no formato devolvido pelo asyncpg (Decimal, texto, data)."""
+    rng = random.Random(seed)
+    stores = [f"Loja {i}" for i in range(50)]
+    channels = ["Presencial", "iFood", "Rappi", "WhatsApp", "App Próprio"]
+    start = datetime.date(2025, 1, 1)
+    return [
+        {
+            "total_vendas": decimal.Decimal(rng.randint(100, 10_000_000)) / 100,
+            "total_pedidos": rng.randint(1, 500),
+            "ticket_medio": decimal.Decimal(rng.randint(1_000, 20_000)) / 100,
+            "loja_nome": rng.choice(stores),
+            "canal_nome": rng.choice(channels),
+            "data_venda": start + datetime.timedelta(days=rng.randrange(365)),
+        }
+        for _ in range(count)
+    ]
+
+
+def _build(shape: Dict[str, Any], cold: bool) -> Callable[[], Any]:
+    request = QueryRequest(**shape)
+
+    def run():
+        if cold:
+            plan_cache.clear()
+        return QueryBuilder(request).build()
+
+    return run
+
+
+def _collect_joins(shape: Dict[str, Any]) -> Callable[[], Any]:
+    request = QueryRequest(**shape)
+    return lambda: QueryBuilder(request)._collect_fields_and_joins()
+
+
+def cases() -> Dict[str, Callable[[], Any]]:
+    """Todos os casos, por nome. Nomes estáveis: são as chaves do baseline."""
+    suite: Dict[str, Callable[[], Any]] = {}
+
+    for name, shape in {**QUERY_SHAPES, "deep_joins": DEEP_JOIN_SHAPE}.items():
+        suite[f"build.cold.{name}"] = _build(shape, cold=True)
+        suite[f"build.warm.{name}"] = _build(shape, cold=False)
+    suite["collect_joins.deep"] = _collect_joins(DEEP_JOIN_SHAPE)
+
+    for count in ROW_COUNTS:
+        records = _records(count)
+        rows = rows_from_records(records, RECORD_METRICS, RECORD_DIMENSIONS)
+        suite[f"rows_from_records.{count}"] = (
+            lambda records=records: rows_from_records(records, RECORD_METRICS, RECORD_DIMENSIONS)
+        )
+        suite[f"encode_json.rows.{count}"] = lambda rows=rows: encode_json({"data": rows})
+        suite[f"encode_columnar.{count}"] = lambda rows=rows: encode_json(
+            encode_columnar(rows, RECORD_METRICS, RECORD_DIMENSIONS)
+        )
+
+    rows = rows_from_records(_records(1_000), RECORD_METRICS, RECORD_DIMENSIONS)
+    insight_requests = {
+        "kpi": QueryRequest(metrics=["total_vendas", "total_pedidos"]),
+        "leaderboard": QueryRequest(metrics=["total_vendas"], dimensions=["loja_nome"]),
+        "crosstab": QueryRequest(metrics=["total_vendas"], dimensions=["loja_nome", "canal_nome"]),
+    }
+    for name, request in insight_requests.items():
+        data = rows[:1] if name == "kpi" else rows
+        suite[f"insights.{name}"] = (
+            lambda request=request, data=data: InsightGenerator(request, data).generate_text()
+        )
+
+    values = [1234567.891, 42, 0.1234, decimal.Decimal("98765.4"), "n/a"] * 200
+    for metric_type in ["currency", "number", "percentage"]:
+        suite[f"format_value.{metric_type}"] = (
+            lambda metric_type=metric_type: [_format_value(v, metric_type) for v in values]
+        )
+
+    return suite
+
+
+def run(
+    selected: List[str] = None,
+    rounds: int = harness.DEFAULT_ROUNDS,
+    min_time: float = harness.DEFAULT_MIN_TIME,
+) -> Dict[str, Dict[str, float]]:
+    """Mede os casos (todos, ou os que começam com um dos prefixos dados)."""
+    results = {}
+    for name, function in cases().items():
+        if selected and not any(name.startswith(prefix) for prefix in selected):
+            continue
+        results[name] = harness.measure(function, rounds=rounds, min_time=min_time)
+        print(f"{name:<36} {results[name]['best_us']:>14.1f} µs", flush=True)
+    return results
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="*", help="Prefixos dos casos a medir (ex: build encode_json).")
+    parser.add_argument("--rounds", type=int, default=harness.DEFAULT_ROUNDS)
+    parser.add_argument("--min-time", type=float, default=harness.DEFAULT_MIN_TIME)
+    parser.add_argument("--output", help="Arquivo JSON para salvar o resultado.")
+    parser.add_argument("--baseline", help="Baseline com que comparar o resultado.")
+    parser.add_argument(
+        "--save-baseline",
+        nargs="?",
+        const=DEFAULT_BASELINE_PATH,
+        help=f"Grava o resultado como baseline (padrão: {DEFAULT_BASELINE_PATH}).",
+    )
+    parser.add_argument("--threshold", type=float, default=harness.DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    report = harness.build_report(run(args.only, args.rounds, args.min_time))
+
+    if args.output:
+        harness.save_report(args.output, report)
+    if args.save_baseline:
+        harness.save_report(args.save_baseline, report)
+        print(f"Baseline gravado em {args.save_baseline}.")
+
+    if not args.baseline:
+        return 0
+
+    baseline = harness.load_report(args.baseline)
+    if baseline is None:
+        print(f"Baseline {args.baseline} não encontrado; nada a comparar.")
+        return 0
+
+    comparison = harness.compare(baseline, report, args.threshold)
+    print()
+    for item in comparison:
+        flag = "REGRESSÃO" if item["regressed"] else ""
+        print(
+            f"{item['name']:<36} {item['baseline_us']:>12.1f} -> {item['current_us']:>12.1f} µs "
+            f"({item['ratio']:.2f}x) {flag}"
+        )
+
+    regressions = [item["name"] for item in comparison if item["regressed"]]
+    if regressions:
+        print(f"\n{len(regressions)} caso(s) acima do limite de {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
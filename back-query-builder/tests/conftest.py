@@ -1,8 +1,9 @@
 import pytest
 import httpx
+from contextlib import asynccontextmanager
 from fastapi.testclient import TestClient
 from app.main import app
-from app.core.database import get_db_connection
+from app.core.database import get_db_connection, get_connection_factory
 
 
 async def override_get_db_connection():
@@ -22,7 +23,14 @@ class MockAsyncConnection:
         return [{"total_vendas": 100.0, "canal_nome": "iFood (Mock)"}]
 
 
+@asynccontextmanager
+async def mock_connect(query_class: str = "interactive"):
+    """Fábrica de conexões mockada (endpoints que obtêm a conexão sob demanda)."""
+    yield MockAsyncConnection()
+
+
 app.dependency_overrides[get_db_connection] = override_get_db_connection
+app.dependency_overrides[get_connection_factory] = lambda: mock_connect
 
 
 @pytest.fixture
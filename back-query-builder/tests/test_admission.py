@@ -0,0 +1,124 @@
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.api.v1.schemas import QueryRequest
+from app.core.config import settings
+from app.services.admission import (
+    QueryClass,
+    QueryRejectedError,
+    admit_query,
+    admitted_connection,
+    estimate_cache,
+)
+
+
+class FakeConnection:
+    """Conexão com EXPLAIN de custo fixo, que registra o statement_timeout."""
+
+    def __init__(self, cost: float, rows: float = 10):
+        self.cost = cost
+        self.rows = rows
+        self.explains = 0
+        self.timeout_ms = None
+
+    async def explain(self, sql, *params):
+        self.explains += 1
+        return {"Total Cost": self.cost, "Plan Rows": self.rows}
+
+    async def set_statement_timeout(self, timeout_ms):
+        self.timeout_ms = timeout_ms
+
+
+REQUEST = QueryRequest(metrics=["total_vendas"], dimensions=["canal_nome"], dateRange="last_7_days")
+
+
+@pytest.fixture(autouse=True)
+def clear_estimates():
+    estimate_cache.clear()
+
+
+async def test_admissao_rebaixa_e_recusa_por_custo():
+    """Acima do orçamento a query vai para 'export'; acima deste, é recusada."""
+    budgets = settings.ADMISSION_COST_BUDGETS
+
+    cheap = FakeConnection(cost=budgets["interactive"] / 2)
+    assert await admit_query(cheap, REQUEST, "SELECT 1", [], QueryClass.INTERACTIVE) == QueryClass.INTERACTIVE
+    assert cheap.timeout_ms == settings.STATEMENT_TIMEOUTS_MS["interactive"]
+
+    estimate_cache.clear()
+    heavy = FakeConnection(cost=budgets["interactive"] * 2)
+    assert await admit_query(heavy, REQUEST, "SELECT 1", [], QueryClass.INTERACTIVE) == QueryClass.EXPORT
+    # A conexão é da vaga 'interactive': o timeout de 'export' não vai nela.
+    assert heavy.timeout_ms is None
+
+    estimate_cache.clear()
+    huge = FakeConnection(cost=budgets["export"] * 2)
+    with pytest.raises(QueryRejectedError):
+        await admit_query(huge, REQUEST, "SELECT 1", [], QueryClass.INTERACTIVE)
+
+
+async def test_admissao_rebaixa_e_recusa_por_linhas():
+    """Uma query barata que devolveria linhas demais também é rebaixada ou recusada."""
+    rows = settings.ADMISSION_ROW_BUDGETS
+
+    many = FakeConnection(cost=1.0, rows=rows["interactive"] * 2)
+    assert await admit_query(many, REQUEST, "SELECT 1", [], QueryClass.INTERACTIVE) == QueryClass.EXPORT
+
+    estimate_cache.clear()
+    too_many = FakeConnection(cost=1.0, rows=rows["export"] * 2)
+    with pytest.raises(QueryRejectedError) as rejected:
+        await admit_query(too_many, REQUEST, "SELECT 1", [], QueryClass.INTERACTIVE)
+    assert rejected.value.rows == rows["export"] * 2
+
+
+async def test_admissao_reusa_estimativa_por_formato_e_periodo():
+    """A mesma SQL com período de tamanho parecido não repete o EXPLAIN."""
+    conn = FakeConnection(cost=1.0)
+    other_week = QueryRequest(
+        metrics=["total_vendas"],
+        dimensions=["canal_nome"],
+        customDateRange={"start_date": "2024-01-01", "end_date": "2024-01-06"},
+    )
+    year = QueryRequest(metrics=["total_vendas"], dimensions=["canal_nome"], dateRange="last_12_months")
+
+    await admit_query(conn, REQUEST, "SELECT 1", [], QueryClass.INTERACTIVE)
+    await admit_query(conn, other_week, "SELECT 1", [], QueryClass.INTERACTIVE)
+    assert conn.explains == 1
+
+    await admit_query(conn, year, "SELECT 1", [], QueryClass.INTERACTIVE)
+    assert conn.explains == 2
+
+
+async def test_query_rebaixada_roda_com_a_vaga_de_export():
+    """O rebaixamento devolve a vaga pedida e reobtém a conexão como 'export'."""
+    heavy_cost = settings.ADMISSION_COST_BUDGETS["interactive"] * 2
+    events = []
+    connections = []
+
+    @asynccontextmanager
+    async def connect(query_class="interactive"):
+        conn = FakeConnection(cost=heavy_cost)
+        connections.append((query_class, conn))
+        events.append(("acquire", query_class))
+        try:
+            yield conn
+        finally:
+            events.append(("release", query_class))
+
+    async with admitted_connection(
+        connect, REQUEST, "SELECT 1", [], QueryClass.INTERACTIVE
+    ) as (conn, admitted):
+        events.append(("run", admitted.value))
+        assert conn is connections[-1][1]
+
+    assert admitted == QueryClass.EXPORT
+    assert events == [
+        ("acquire", "interactive"),
+        ("release", "interactive"),
+        ("acquire", "export"),
+        ("run", "export"),
+        ("release", "export"),
+    ]
+    assert connections[0][1].timeout_ms is None
+    assert connections[1][1].timeout_ms == settings.STATEMENT_TIMEOUTS_MS["export"]
@@ -1,5 +1,10 @@
+import itertools
+from types import SimpleNamespace
+
 from fastapi.testclient import TestClient
 
+from app.api.v1 import endpoints
+
 
 def test_api_query_sucesso(client: TestClient):
     """
@@ -42,4 +47,59 @@ def test_api_query_erro_validacao(client: TestClient):
     response = client.post("/api/v1/query", json=query_json)
 
     assert response.status_code == 400
-    assert "Campo desconhecido" in response.json()["detail"]
\ No newline at end of file
+    assert "Campo desconhecido" in response.json()["detail"]
+
+def test_api_query_batch(client: TestClient):
+    """Testa o /api/v1/query/batch: ordem preservada e erro por query."""
+    query_json = {"metrics": ["total_vendas"], "dimensions": ["canal_nome"]}
+    batch_json = {
+        "queries": [
+            query_json,
+            {"metrics": ["campo_invalido"]},
+            query_json,
+        ]
+    }
+
+    response = client.post("/api/v1/query/batch", json=batch_json)
+
+    assert response.status_code == 200
+
+    results = response.json()["results"]
+
+    assert [r["status_code"] for r in results] == [200, 400, 200]
+    assert "Campo desconhecido" in results[1]["error"]
+    assert results[0]["response"]["data"] == results[2]["response"]["data"]
+
+
+def test_api_query_cache_informa_o_tempo_de_cada_requisicao(client: TestClient, monkeypatch):
+    """O corpo em cache é reaproveitado, mas o execution_time_ms é o da requisição atual."""
+    query_json = {"metrics": ["total_vendas"], "dimensions": ["canal_nome"]}
+    endpoints.result_cache.invalidate()
+
+    monkeypatch.setattr(endpoints, "time", SimpleNamespace(perf_counter=lambda: 0.0))
+    first = client.post("/api/v1/query", json=query_json).json()
+
+    ticks = itertools.count()
+    monkeypatch.setattr(endpoints, "time", SimpleNamespace(perf_counter=lambda: next(ticks)))
+    cached = client.post("/api/v1/query", json=query_json).json()
+
+    assert cached["data"] == first["data"]
+    assert first["execution_time_ms"] == 0.0
+    assert cached["execution_time_ms"] == 1000.0
+
+
+def test_api_query_cache_respeita_a_ordem_dos_campos(client: TestClient):
+    """A mesma query com outra ordem de métricas não recebe o corpo da primeira."""
+    endpoints.result_cache.invalidate()
+    base = {"dimensions": ["canal_nome"]}
+
+    first = client.post(
+        "/api/v1/query?format=columnar", json={"metrics": ["total_vendas", "total_pedidos"], **base}
+    ).json()
+    second = client.post(
+        "/api/v1/query?format=columnar", json={"metrics": ["total_pedidos", "total_vendas"], **base}
+    ).json()
+
+    assert [c["name"] for c in first["columns"]][:2] == ["total_vendas", "total_pedidos"]
+    assert [c["name"] for c in second["columns"]][:2] == ["total_pedidos", "total_vendas"]
+    assert first["query_sql"] != second["query_sql"]
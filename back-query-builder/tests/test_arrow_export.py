@@ -0,0 +1,68 @@
+import datetime
+import decimal
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import HTTPException
+
+pa = pytest.importorskip("pyarrow")
+
+from app.api.v1 import endpoints
+from app.api.v1.schemas import ArrowFormat, QueryRequest
+from app.services.arrow_export import build_table, to_ipc_stream
+
+
+def test_build_table_tipos_da_camada_semantica():
+    """Os tipos Arrow seguem o 'type' de cada campo da camada semântica."""
+    records = [
+        {
+            "total_vendas": decimal.Decimal("10.505"),
+            "total_pedidos": 3,
+            "data_venda": datetime.datetime(2025, 1, 1),
+            "canal_nome": "iFood",
+        },
+        {
+            "total_vendas": None,
+            "total_pedidos": 4,
+            "data_venda": datetime.datetime(2025, 1, 2),
+            "canal_nome": "iFood",
+        },
+    ]
+
+    table = build_table(
+        records,
+        ["total_vendas", "total_pedidos"],
+        ["data_venda", "canal_nome"],
+        metadata={"source": "sales"},
+    )
+
+    assert table.schema.field("total_vendas").type == pa.decimal128(38, 2)
+    assert table.schema.field("total_pedidos").type == pa.float64()
+    assert table.schema.field("data_venda").type == pa.timestamp("us")
+    assert pa.types.is_dictionary(table.schema.field("canal_nome").type)
+    assert table.schema.field("canal_nome").metadata[b"role"] == b"dimension"
+
+    restored = pa.ipc.open_stream(to_ipc_stream(table)).read_all()
+    assert restored.column("total_vendas").to_pylist() == [decimal.Decimal("10.50"), None]
+    assert restored.schema.metadata[b"source"] == b"sales"
+
+
+async def test_export_arrow_erro_na_conversao_vira_http_exception(monkeypatch):
+    """Qualquer erro ao montar a tabela passa por _query_error (não é um 500 sem tratamento)."""
+
+    @asynccontextmanager
+    async def fake_admitted_connection(connect, request, sql, params, query_class):
+        yield object(), query_class
+
+    async def fake_fetch_rows(conn, sql, *params):
+        return [{"total_vendas": "não é número", "canal_nome": "iFood"}]
+
+    monkeypatch.setattr(endpoints, "admitted_connection", fake_admitted_connection)
+    monkeypatch.setattr(endpoints, "fetch_rows", fake_fetch_rows)
+    request = QueryRequest(metrics=["total_vendas"], dimensions=["canal_nome"])
+
+    with pytest.raises(HTTPException) as exc_info:
+        await endpoints.export_query_arrow(request, ArrowFormat.PARQUET, connect=None)
+
+    assert exc_info.value.status_code == 500
+    assert exc_info.value.detail.startswith("Erro interno no servidor")
@@ -0,0 +1,40 @@
+from benchmarks import harness, suite
+from app.services.semantic_layer import DIMENSIONS
+
+
+def _report(**times):
+    return {"results": {name: {"best_us": value} for name, value in times.items()}}
+
+
+def test_comparacao_com_baseline_aponta_regressoes():
+    """Só casos acima do limite regridem; casos novos ou removidos são ignorados."""
+    baseline = _report(build=100.0, encode=200.0, removido=50.0)
+    current = _report(build=130.0, encode=210.0, novo=10.0)
+
+    comparison = {item["name"]: item for item in harness.compare(baseline, current, threshold=0.25)}
+
+    assert set(comparison) == {"build", "encode"}
+    assert comparison["build"]["regressed"] is True
+    assert comparison["encode"]["regressed"] is False
+    assert comparison["build"]["ratio"] == 1.3
+
+
+def test_medicao_e_relatorio(tmp_path):
+    """A medição gera o tempo por chamada, e o relatório volta igual do disco."""
+    result = harness.measure(lambda: sum(range(100)), rounds=2, min_time=0.001)
+    assert 0 < result["best_us"] <= result["median_us"]
+
+    path = str(tmp_path / "baseline.json")
+    report = harness.build_report({"soma": result})
+    harness.save_report(path, report)
+
+    assert harness.load_report(path) == report
+    assert harness.load_report(str(tmp_path / "inexistente.json")) is None
+
+
+def test_formatos_da_suite_filtram_so_por_dimensoes():
+    """Os filtros vão para o WHERE: filtrar por métrica geraria SQL inválida."""
+    shapes = {**suite.QUERY_SHAPES, "deep_joins": suite.DEEP_JOIN_SHAPE}
+    for name, shape in shapes.items():
+        for query_filter in shape.get("filters", []):
+            assert query_filter["field"] in DIMENSIONS, name
@@ -0,0 +1,37 @@
+import collections
+import datetime
+
+from app.services.data_generator import SCHEMA, Catalog, generate_sales
+
+
+def _catalog(seed=7):
+    return Catalog(seed, stores=20, products=100, customers=2_000, start_date=datetime.date(2025, 1, 1), days=90)
+
+
+def test_geracao_deterministica_por_semente():
+    """Mesma semente e mesmo bloco geram as mesmas linhas; outra semente, outras."""
+    first = generate_sales(_catalog(), seed=7, first_id=1, count=500)
+    again = generate_sales(_catalog(), seed=7, first_id=1, count=500)
+    other = generate_sales(_catalog(), seed=8, first_id=1, count=500)
+
+    assert first == again
+    assert first["sales"] != other["sales"]
+    assert all(len(row) == len(SCHEMA[table]) for table, rows in first.items() for row in rows)
+
+    # Ids das tabelas filhas são únicos e apontam para vendas do bloco.
+    product_sale_ids = [row[0] for row in first["product_sales"]]
+    assert len(product_sale_ids) == len(set(product_sale_ids))
+    assert {row[1] for row in first["product_sales"]} <= set(range(1, 501))
+
+
+def test_distribuicao_com_assimetria_e_picos():
+    """Lojas seguem Zipf e as vendas se concentram no almoço e no jantar."""
+    sales = generate_sales(_catalog(), seed=7, first_id=1, count=5_000)["sales"]
+
+    by_store = collections.Counter(row[1] for row in sales).most_common()
+    assert by_store[0][1] > 5 * by_store[-1][1]
+
+    by_hour = collections.Counter(row[4].hour for row in sales)
+    assert by_hour[12] > 3 * by_hour[16]
+    assert by_hour[20] > 3 * by_hour[16]
+    assert by_hour[4] < by_hour[16]
@@ -0,0 +1,88 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.core.http_client import HTTP_REQUESTS, HTTP_RETRIES, create_http_client
+from app.services.ai_translator import AITranslator
+
+
+class MockAIHandler(BaseHTTPRequestHandler):
+    """Imita a API de IA: responde os status da fila do servidor, depois 200."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.requests += 1
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        body = json.dumps({"answer": '```json\n{"metrics": ["total_vendas"]}\n```'}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def mock_ai_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockAIHandler)
+    server.connections = 0
+    server.requests = 0
+    server.statuses = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/api/chat/inference"
+
+
+async def test_cliente_compartilhado_reaproveita_conexao(mock_ai_server):
+    """Chamadas seguidas usam a mesma conexão (keep-alive)."""
+    reused = HTTP_REQUESTS.value(connection="reused")
+    new = HTTP_REQUESTS.value(connection="new")
+
+    async with create_http_client() as client:
+        translator = AITranslator(api_key="teste", client=client, api_url=_url(mock_ai_server))
+        for _ in range(3):
+            assert await translator.generate_query_json("vendas") == '{"metrics": ["total_vendas"]}'
+
+    assert mock_ai_server.requests == 3
+    assert mock_ai_server.connections == 1
+    assert HTTP_REQUESTS.value(connection="new") == new + 1
+    assert HTTP_REQUESTS.value(connection="reused") == reused + 2
+
+
+async def test_cliente_repete_erros_5xx(mock_ai_server, monkeypatch):
+    """Respostas 5xx são repetidas até o limite; 4xx não."""
+    monkeypatch.setattr("app.core.http_client.settings.AI_HTTP_RETRY_BACKOFF_SECONDS", 0.0)
+    retries = HTTP_RETRIES.value(reason="503")
+
+    async with create_http_client() as client:
+        translator = AITranslator(api_key="teste", client=client, api_url=_url(mock_ai_server))
+
+        mock_ai_server.statuses = [503, 503]
+        assert await translator.generate_query_json("vendas") == '{"metrics": ["total_vendas"]}'
+        assert HTTP_RETRIES.value(reason="503") == retries + 2
+
+        mock_ai_server.statuses = [503, 503, 503]
+        with pytest.raises(Exception, match="503"):
+            await translator.generate_query_json("vendas")
+
+        mock_ai_server.statuses = [400]
+        requests = mock_ai_server.requests
+        with pytest.raises(Exception, match="400"):
+            await translator.generate_query_json("vendas")
+        assert mock_ai_server.requests == requests + 1
@@ -0,0 +1,71 @@
+from app.api.v1.schemas import QueryRequest
+from app.services.index_advisor import column_uses, index_key, propose_indexes
+from app.services.query_engine import QueryBuilder
+from app.services.semantic_layer import DIMENSIONS
+
+
+def _shape(total_ms, **request_fields):
+    request = QueryRequest(**request_fields)
+    sql, params = QueryBuilder(request).build()
+    return {"request": request, "sql": sql, "params": params, "count": 1, "total_ms": total_ms}
+
+
+def test_chave_do_indice_para_colunas_e_expressoes():
+    """Colunas viram índice simples; expressões de uma coluna, índice de expressão."""
+    assert index_key("stores.name") == ("stores", "name")
+    assert index_key("EXTRACT(HOUR FROM sales.created_at)") == (
+        "sales",
+        "(EXTRACT(HOUR FROM created_at))",
+    )
+    assert index_key("SUM(sales.total_amount)") is None
+
+
+def test_advisor_ordena_por_beneficio_e_ignora_indices_existentes():
+    """O benefício soma o tempo das queries que usam a coluna, ponderado pela seletividade."""
+    shapes = [
+        _shape(900, metrics=["total_vendas"], dimensions=["produto_nome"], dateRange="last_7_days"),
+        _shape(300, metrics=["total_vendas"], filters=[{"field": "canal_nome", "operator": "eq", "value": "iFood"}]),
+    ]
+    stats = {("channels", "name"): {"n_distinct": 4.0, "reltuples": 4.0}}
+
+    proposals = propose_indexes(shapes, existing={"sales": ["created_at"]}, stats=stats)
+    statements = [proposal["statement"] for proposal in proposals]
+
+    assert not any("ON sales (created_at)" in statement for statement in statements)
+    assert statements[0] == (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_product_sales_sale_id ON product_sales (sale_id)"
+    )
+
+    channel_name = next(p for p in proposals if p["table"] == "channels")
+    assert channel_name["estimated_benefit_ms"] == 300 * (1 - 1 / 4)
+
+
+def test_usos_de_join_vem_do_plano_final(monkeypatch):
+    """
+    Joins eliminados pelo planner e filtros convertidos em EXISTS: só as
+    chaves dos joins que ficam no SQL são usos de join.
+    """
+    # Dimensão que pede o join de clientes sem usar colunas dele: o LEFT
+    # JOIN many-to-one é eliminado do SQL.
+    monkeypatch.setitem(
+        DIMENSIONS,
+        "cliente_id",
+        {
+            "sql": "sales.customer_id",
+            "label": "Cliente",
+            "joins_needed": ["customers"],
+            "type": "category",
+        },
+    )
+    request = QueryRequest(
+        metrics=["total_vendas"],
+        dimensions=["cliente_id"],
+        filters=[{"field": "produto_nome", "operator": "eq", "value": "X-Burger"}],
+    )
+
+    sql = QueryBuilder(request).compile().sql
+    join_keys = {use["key"] for use in column_uses(request) if use["kind"] == "join"}
+
+    assert "customers" not in sql
+    assert ("sales", "customer_id") not in join_keys
+    assert join_keys == {("product_sales", "sale_id"), ("product_sales", "product_id")}
@@ -0,0 +1,24 @@
+from app.core.metrics import Counter, Histogram, MetricsRegistry
+
+
+def test_metricas_formato_prometheus():
+    """Histogramas acumulam os buckets e limitam a cardinalidade dos labels."""
+    registry = MetricsRegistry()
+    timeouts = registry.register(Counter("acquire_timeouts_total", "Timeouts."))
+    duration = registry.register(
+        Histogram("query_seconds", "Duração.", labelnames=("shape",), buckets=(0.1, 1.0), max_series=1)
+    )
+
+    timeouts.inc()
+    duration.observe(0.05, shape="a")
+    duration.observe(0.5, shape="a")
+    duration.observe(5.0, shape="b")
+
+    text = registry.render()
+
+    assert "# TYPE acquire_timeouts_total counter\nacquire_timeouts_total 1.0" in text
+    assert 'query_seconds_bucket{shape="a",le="0.1"} 1' in text
+    assert 'query_seconds_bucket{shape="a",le="1.0"} 2' in text
+    assert 'query_seconds_bucket{shape="a",le="+Inf"} 2' in text
+    assert 'query_seconds_count{shape="other"} 1' in text
+    assert 'shape="b"' not in text
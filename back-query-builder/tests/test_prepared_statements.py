@@ -0,0 +1,106 @@
+import asyncpg
+import pytest
+
+from app.core import database
+from app.core.config import settings
+from app.core.database import (
+    QueryConnection,
+    invalidate_prepared_statements,
+    prepared_statement_stats,
+)
+from app.core.lru import LRUCache
+
+
+class FakeStatement:
+    """Prepared statement que devolve o próprio SQL, ou falha como statement inválido."""
+
+    def __init__(self, sql: str, fail: bool = False):
+        self.sql = sql
+        self.fail = fail
+
+    async def fetch(self, *params):
+        if self.fail:
+            raise asyncpg.exceptions.InvalidCachedStatementError("cached statement plan is invalid")
+        return [(self.sql, params)]
+
+
+def make_connection(in_transaction: bool = False, failures=()):
+    """
+    QueryConnection sem conexão real: o prepare() é falso e registra os
+    SQLs preparados; os SQLs em 'failures' falham na primeira execução.
+    """
+    conn = QueryConnection.__new__(QueryConnection)
+    conn._aborted, conn._protocol = True, None  # fechada para o Connection.__del__
+    conn._prepared = LRUCache(settings.PREPARED_STATEMENT_CACHE_SIZE)
+    conn._prepared_generation = database._schema_generation
+    conn.prepared = []
+    pending_failures = set(failures)
+
+    async def prepare(sql):
+        conn.prepared.append(sql)
+        fail = sql in pending_failures
+        pending_failures.discard(sql)
+        return FakeStatement(sql, fail)
+
+    conn.prepare = prepare
+    conn.is_in_transaction = lambda: in_transaction
+    return conn
+
+
+def counters_delta(before):
+    after = prepared_statement_stats()
+    return {key: after[key] - before[key] for key in ("hits", "misses", "evictions", "invalidations")}
+
+
+async def test_cache_conta_acertos_faltas_e_remocoes():
+    """O cache guarda até PREPARED_STATEMENT_CACHE_SIZE statements por conexão."""
+    size = settings.PREPARED_STATEMENT_CACHE_SIZE
+    conn = make_connection()
+    before = prepared_statement_stats()
+
+    for i in range(size):
+        await conn.fetch_prepared(f"SELECT {i}")
+    await conn.fetch_prepared("SELECT 0")
+    assert counters_delta(before) == {"hits": 1, "misses": size, "evictions": 0, "invalidations": 0}
+
+    # Passar do limite remove o menos usado recentemente ("SELECT 1").
+    await conn.fetch_prepared(f"SELECT {size}")
+    assert counters_delta(before)["evictions"] == 1
+    assert len(conn._prepared) == size
+
+    await conn.fetch_prepared("SELECT 1")
+    assert counters_delta(before)["misses"] == size + 2
+    assert conn.prepared.count("SELECT 1") == 2
+
+
+async def test_invalidacao_descarta_os_statements_da_conexao():
+    """Depois de invalidate_prepared_statements() o SQL é preparado de novo."""
+    conn = make_connection()
+    await conn.fetch_prepared("SELECT 1")
+    before = prepared_statement_stats()
+
+    invalidate_prepared_statements()
+    await conn.fetch_prepared("SELECT 1")
+
+    assert conn.prepared == ["SELECT 1", "SELECT 1"]
+    assert counters_delta(before) == {"hits": 0, "misses": 1, "evictions": 0, "invalidations": 1}
+
+
+async def test_statement_invalido_e_repreparado_uma_vez_fora_de_transacao():
+    conn = make_connection(failures={"SELECT 1"})
+    before = prepared_statement_stats()
+
+    assert await conn.fetch_prepared("SELECT 1", 42) == [("SELECT 1", (42,))]
+    assert conn.prepared == ["SELECT 1", "SELECT 1"]
+    assert counters_delta(before)["invalidations"] == 1
+
+
+async def test_statement_invalido_dentro_de_transacao_nao_e_repetido():
+    """Dentro de uma transação o erro a abortou: repetir só geraria outro erro."""
+    conn = make_connection(in_transaction=True, failures={"SELECT 1"})
+
+    with pytest.raises(asyncpg.exceptions.InvalidCachedStatementError):
+        await conn.fetch_prepared("SELECT 1")
+
+    assert conn.prepared == ["SELECT 1"]
+    assert len(conn._prepared) == 0
@@ -1,6 +1,9 @@
+import datetime
+
 import pytest
 from app.api.v1.schemas import QueryRequest
-from app.services.query_engine import QueryBuilder
+from app.services import query_engine
+from app.services.query_engine import QueryBuilder, plan_cache
 
 
 def test_query_builder_simples():
@@ -21,7 +24,7 @@ def test_query_builder_simples():
     expected_sql = """
         SELECT SUM(sales.total_amount) AS "total_vendas", channels.name AS "canal_nome"
         FROM sales
-        LEFT JOIN channels ON sales.channel_id = channels.id
+        JOIN channels ON sales.channel_id = channels.id
         WHERE channels.name = $1
         GROUP BY channels.name
         LIMIT 1000
@@ -39,3 +42,255 @@ def test_query_builder_campo_invalido():
 
     with pytest.raises(ValueError, match="Campo desconhecido"):
         QueryBuilder(request).build()
+
+
+def test_query_builder_cache_de_planos():
+    """
+    Queries com o mesmo formato reutilizam o SQL compilado e só trocam
+    os parâmetros; formatos diferentes geram SQL diferente.
+    """
+    request_a = QueryRequest(
+        metrics=["total_vendas"],
+        dimensions=["loja_nome"],
+        filters=[{"field": "hora_venda", "operator": "gte", "value": 18}],
+    )
+    request_b = QueryRequest(
+        metrics=["total_vendas"],
+        dimensions=["loja_nome"],
+        filters=[{"field": "hora_venda", "operator": "gte", "value": 11}],
+    )
+    request_c = QueryRequest(
+        metrics=["total_vendas"],
+        dimensions=["loja_nome"],
+        filters=[{"field": "hora_venda", "operator": "lt", "value": 11}],
+    )
+
+    sql_a, params_a = QueryBuilder(request_a).build()
+
+    hits_before = plan_cache.hits
+    sql_b, params_b = QueryBuilder(request_b).build()
+
+    assert plan_cache.hits == hits_before + 1
+    assert sql_b == sql_a
+    assert params_a == [18]
+    assert params_b == [11]
+
+    sql_c, params_c = QueryBuilder(request_c).build()
+
+    assert sql_c != sql_a
+    assert params_c == [11]
+
+
+def test_query_builder_pre_agregacao_por_grao():
+    """
+    Métricas de grãos diferentes (venda x produto) são agregadas em CTEs
+    separadas, sem inflar SUM(sales.total_amount) com o JOIN de produtos.
+    """
+    request = QueryRequest(
+        metrics=["total_vendas", "total_produtos_vendidos"],
+        dimensions=["produto_nome"],
+        order_by=[{"field": "total_vendas", "direction": "desc"}],
+    )
+
+    sql, params = QueryBuilder(request).build()
+
+    assert sql.startswith("WITH grain_sales AS (")
+    assert "grain_product_sales AS (" in sql
+    assert "SELECT DISTINCT sales.id AS grain_id" in sql
+    assert "JOIN sales ON sales.id = grain_keys.grain_id" in sql
+    assert "UNION ALL" in sql
+    assert 'ORDER BY "total_vendas" DESC' in sql
+    assert params == []
+
+
+def test_query_builder_sem_fan_out_usa_sql_do_grao():
+    """Sem joins que multiplicam linhas, COUNT(DISTINCT) não é necessário."""
+    request = QueryRequest(metrics=["total_pedidos"], dimensions=["canal_nome"])
+
+    sql, _ = QueryBuilder(request).build()
+
+    assert "COUNT(sales.id)" in sql
+    assert "WITH" not in sql
+
+
+def test_query_builder_filtro_one_to_many_vira_exists():
+    """
+    Filtros em tabelas one-to-many que não são selecionadas viram
+    semi-joins EXISTS, e a query principal não faz JOIN nessas tabelas.
+    """
+    request = QueryRequest(
+        metrics=["total_vendas"],
+        dimensions=["canal_nome"],
+        filters=[
+            {"field": "produto_nome", "operator": "eq", "value": "X-Burger"},
+            {"field": "cupom_codigo", "operator": "in", "value": ["PROMO10"]},
+        ],
+    )
+
+    sql, params = QueryBuilder(request).build()
+
+    expected_sql = """
+        SELECT SUM(sales.total_amount) AS "total_vendas", channels.name AS "canal_nome"
+        FROM sales
+        LEFT JOIN channels ON sales.channel_id = channels.id
+        WHERE EXISTS (SELECT 1 FROM product_sales JOIN products ON product_sales.product_id = products.id
+            WHERE sales.id = product_sales.sale_id AND products.name = $1)
+        AND EXISTS (SELECT 1 FROM coupon_sales JOIN coupons ON coupon_sales.coupon_id = coupons.id
+            WHERE coupon_sales.sale_id = sales.id AND coupons.code = ANY($2))
+        GROUP BY channels.name
+        LIMIT 1000
+    """
+
+    assert " ".join(sql.split()) == " ".join(expected_sql.split())
+    assert params == ["X-Burger", ["PROMO10"]]
+
+
+def test_query_builder_promove_e_elimina_joins():
+    """
+    Filtros que rejeitam NULL promovem o LEFT JOIN (e suas dependências)
+    a INNER; joins many-to-one sem colunas referenciadas são removidos.
+    """
+    request = QueryRequest(
+        metrics=["total_vendas"],
+        dimensions=["canal_nome"],
+        filters=[{"field": "marca_nome", "operator": "eq", "value": "Marca A"}],
+    )
+
+    builder = QueryBuilder(request)
+    sql, _ = builder.build()
+
+    assert "JOIN stores ON sales.store_id = stores.id" in sql
+    assert "LEFT JOIN stores" not in sql
+    assert "JOIN brands ON stores.brand_id = brands.id" in sql
+    assert "LEFT JOIN channels ON sales.channel_id = channels.id" in sql
+
+    join_str = builder._join_str(
+        ["channels", "customers", "payments"], ['channels.name AS "canal_nome"']
+    )
+
+    assert "channels" in join_str
+    assert "customers" not in join_str
+    assert "LEFT JOIN payments" in join_str
+
+
+@pytest.fixture
+def rollups_atualizados(monkeypatch):
+    """Rollups com refresh até 2025-01-10 (dias a partir dele vêm de `sales`)."""
+    coverage = {
+        "sales_daily": datetime.date(2025, 1, 10),
+        "sales_daily_store_channel": datetime.date(2025, 1, 10),
+    }
+    monkeypatch.setattr(query_engine, "rollup_coverage", coverage)
+    return coverage
+
+
+ROLLUP_SOURCE_SQL = """
+    (SELECT sale_date, store_id, channel_id, total_amount, total_amount_count,
+    total_amount_items, total_discount, total_increase, delivery_fee,
+    service_tax_fee, value_paid, people_quantity, sales_count
+    FROM rollup_sales_daily_store_channel
+    WHERE rollup_sales_daily_store_channel.sale_date < {p}::date
+    UNION ALL
+    SELECT DATE(sales.created_at) AS sale_date, sales.store_id AS store_id,
+    sales.channel_id AS channel_id, SUM(sales.total_amount) AS total_amount,
+    COUNT(sales.total_amount) AS total_amount_count,
+    SUM(sales.total_amount_items) AS total_amount_items,
+    SUM(sales.total_discount) AS total_discount,
+    SUM(sales.total_increase) AS total_increase,
+    SUM(sales.delivery_fee) AS delivery_fee,
+    SUM(sales.service_tax_fee) AS service_tax_fee,
+    SUM(sales.value_paid) AS value_paid,
+    SUM(sales.people_quantity) AS people_quantity,
+    COUNT(sales.id) AS sales_count
+    FROM sales WHERE sales.created_at >= {p}::date
+    GROUP BY DATE(sales.created_at), sales.store_id, sales.channel_id)
+    AS rollup_sales_daily_store_channel
+"""
+
+
+def test_query_builder_roteia_para_rollup(rollups_atualizados):
+    """
+    Queries cobertas por um rollup são reescritas sobre o menor rollup que
+    as cobre; as demais continuam nas tabelas brutas.
+    """
+    request = QueryRequest(
+        metrics=["total_vendas", "total_pedidos"],
+        dimensions=["data_venda"],
+        filters=[{"field": "canal_nome", "operator": "eq", "value": "iFood"}],
+        dateRange="last_7_days",
+    )
+
+    builder = QueryBuilder(request, use_rollups=True)
+    sql, params = builder.build()
+
+    expected_sql = """
+        SELECT SUM(rollup_sales_daily_store_channel.total_amount) AS "total_vendas",
+        SUM(rollup_sales_daily_store_channel.sales_count) AS "total_pedidos",
+        rollup_sales_daily_store_channel.sale_date::timestamp AS "data_venda"
+        FROM {source}
+        LEFT JOIN channels ON rollup_sales_daily_store_channel.channel_id = channels.id
+        WHERE rollup_sales_daily_store_channel.sale_date >= $1
+        AND rollup_sales_daily_store_channel.sale_date < $2
+        AND channels.name = $3
+        GROUP BY rollup_sales_daily_store_channel.sale_date::timestamp
+        LIMIT 1000
+    """.format(source=ROLLUP_SOURCE_SQL.format(p="$4"))
+
+    assert " ".join(sql.split()) == " ".join(expected_sql.split())
+    assert params[2:] == ["iFood", datetime.date(2025, 1, 10)]
+    assert builder.source == "rollup_sales_daily_store_channel"
+
+    daily = QueryBuilder(
+        QueryRequest(metrics=["ticket_medio"], dimensions=["mes_venda"]),
+        use_rollups=True,
+    )
+    daily.build()
+    assert daily.source == "rollup_sales_daily"
+
+    raw = QueryBuilder(
+        QueryRequest(metrics=["total_vendas"], dimensions=["hora_venda"]),
+        use_rollups=True,
+    )
+    sql, _ = raw.build()
+    assert raw.source == "sales"
+    assert "FROM sales" in sql
+
+    cached = QueryBuilder(request, use_rollups=True)
+    cached.build()
+    assert cached.source == "rollup_sales_daily_store_channel"
+
+
+def test_rollup_le_de_sales_os_dias_apos_o_watermark(rollups_atualizados):
+    """
+    Um período que passa do watermark da última refresh não pode perder
+    as vendas mais recentes: esses dias vêm de `sales`, e o limite é
+    atualizado a cada refresh também nos planos em cache.
+    """
+    request = QueryRequest(
+        metrics=["total_vendas"],
+        dimensions=["canal_nome"],
+        customDateRange={"start_date": "2025-01-01", "end_date": "2025-01-15"},
+    )
+
+    sql, params = QueryBuilder(request, use_rollups=True).build()
+    assert " ".join(ROLLUP_SOURCE_SQL.format(p="$3").split()) in " ".join(sql.split())
+    assert params == [
+        datetime.date(2025, 1, 1),
+        datetime.date(2025, 1, 16),
+        datetime.date(2025, 1, 10),
+    ]
+
+    rollups_atualizados["sales_daily_store_channel"] = datetime.date(2025, 1, 14)
+    cached_sql, cached_params = QueryBuilder(request, use_rollups=True).build()
+    assert cached_sql == sql
+    assert cached_params[-1] == datetime.date(2025, 1, 14)
+
+
+def test_rollup_sem_refresh_nao_e_usado(monkeypatch):
+    """Sem watermark conhecido o rollup pode estar vazio: a query vai para `sales`."""
+    monkeypatch.setattr(query_engine, "rollup_coverage", {})
+    builder = QueryBuilder(QueryRequest(metrics=["total_vendas"]), use_rollups=True)
+    sql, _ = builder.build()
+
+    assert builder.source == "sales"
+    assert "rollup" not in sql
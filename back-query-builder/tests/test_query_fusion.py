@@ -0,0 +1,36 @@
+from app.api.v1.schemas import QueryRequest
+from app.services.query_fusion import fuse_requests, plan_fusion, split_rows
+
+
+def test_fusao_agrupa_queries_compativeis():
+    """Só queries com mesmas dimensões/filtros/período e mesmo grão se fundem."""
+    base = {
+        "dimensions": ["data_venda"],
+        "filters": [{"field": "canal_nome", "operator": "eq", "value": "iFood"}],
+        "dateRange": "last_7_days",
+    }
+    requests = [
+        QueryRequest(metrics=["total_vendas"], **base),
+        QueryRequest(metrics=["total_produtos_vendidos"], **base),
+        QueryRequest(metrics=["total_pedidos", "ticket_medio"], **base),
+        QueryRequest(metrics=["total_vendas"], **{**base, "dateRange": "last_30_days"}),
+    ]
+
+    assert plan_fusion(requests) == [[0, 2], [1], [3]]
+
+    fused = fuse_requests([requests[0], requests[2]])
+    assert fused.metrics == ["total_vendas", "total_pedidos", "ticket_medio"]
+    assert fused.dimensions == ["data_venda"]
+
+    data = [
+        {
+            "metrics": {"total_vendas": 10, "total_pedidos": 2, "ticket_medio": 5},
+            "dimensions": {"data_venda": "2025-01-01"},
+        }
+    ]
+    assert split_rows(data, requests[2]) == [
+        {
+            "metrics": {"total_pedidos": 2, "ticket_medio": 5},
+            "dimensions": {"data_venda": "2025-01-01"},
+        }
+    ]
@@ -0,0 +1,165 @@
+import pytest
+
+from app.core import database
+from app.core.config import settings
+from app.core.replicas import ReplicaRouter
+from app.core.scheduler import FairScheduler
+
+
+class FakePool:
+    """Pool mínimo: entrega um objeto por conexão ou falha ao conectar."""
+
+    def __init__(self, name, error=None):
+        self.name = name
+        self.error = error
+        self.released = 0
+
+    async def acquire(self, timeout=None):
+        if self.error:
+            raise self.error
+        return self.name
+
+    async def release(self, connection):
+        self.released += 1
+
+
+def _router(*lags):
+    router = ReplicaRouter(check_interval_seconds=5.0, clock=lambda: 100.0)
+    for index, lag in enumerate(lags, start=1):
+        replica = router.add(f"replica-{index}", FakePool(f"replica-{index}"))
+        replica.healthy = True
+        replica.lag_seconds = lag
+        replica.checked_at = 100.0
+    return router
+
+
+class LagPool:
+    """Pool cuja conexão responde à medição de atraso com uma linha fixa."""
+
+    def __init__(self, row):
+        self.row = row
+
+    def acquire(self, timeout=None):
+        pool = self
+
+        class Acquire:
+            async def __aenter__(self):
+                return pool
+
+            async def __aexit__(self, *exc_info):
+                return False
+
+        return Acquire()
+
+    async def fetchrow(self, sql, timeout=None):
+        return self.row
+
+
+async def test_replica_desconectada_usa_o_tempo_desde_a_ultima_transacao():
+    """
+    Sem o WAL receiver em streaming a réplica não sabe o que deixou de
+    receber: o atraso é o tempo desde a última transação aplicada, e ela
+    sai da rotação quando ele passa do limite.
+    """
+    router = ReplicaRouter(check_interval_seconds=5.0, clock=lambda: 100.0)
+    replica = router.add("replica-1", LagPool({"lag_seconds": 45.0, "streaming": False}))
+
+    await router.check(replica)
+
+    assert replica.healthy and replica.streaming is False
+    assert replica.lag_seconds == 45.0
+    assert not router._is_eligible(replica, max_lag_seconds=30.0, now=100.0)
+    assert router._is_eligible(replica, max_lag_seconds=60.0, now=100.0)
+    assert router.choose(max_lag_seconds=30.0) is None
+
+
+def test_roteador_escolhe_replica_elegivel_com_menos_leituras():
+    """Menos leituras em andamento vence; atraso acima do limite tira da rotação."""
+    router = _router(0.0, 1.0, 20.0)
+    first, second, lagging = router.replicas
+
+    first.outstanding = 3
+    second.outstanding = 1
+    assert router.choose(max_lag_seconds=30.0) is lagging
+    assert router.choose(max_lag_seconds=10.0) is second
+
+    # Requisição mais exigente (X-Max-Staleness) só aceita réplicas em dia.
+    assert router.choose(max_lag_seconds=0.5) is first
+
+    # Sem réplica saudável, com medição recente e dentro do limite: primário.
+    first.healthy = False
+    second.checked_at = 100.0 - 60.0
+    assert router.choose(max_lag_seconds=0.5) is None
+    assert router.stats()["primary_fallbacks"] == 1
+
+
+async def test_leitura_volta_ao_primario_quando_replica_nao_conecta(monkeypatch):
+    """Falha ao conectar na réplica a tira da rotação e a leitura vai ao primário."""
+    router = _router(0.0)
+    router.replicas[0].pool.error = ConnectionRefusedError("réplica fora do ar")
+    primary = FakePool("primary")
+    monkeypatch.setattr(database, "replica_router", router)
+    monkeypatch.setattr(database, "db_pool", primary)
+
+    async with database.read_connection(max_lag_seconds=30.0) as connection:
+        assert connection == "primary"
+
+    replica = router.replicas[0]
+    assert replica.healthy is False and replica.outstanding == 0
+    assert primary.released == 1
+
+    replica.pool.error = None
+    replica.healthy = True
+    async with database.read_connection(max_lag_seconds=30.0) as connection:
+        assert connection == "replica-1"
+        assert replica.outstanding == 1
+    assert replica.outstanding == 0
+
+
+async def test_vagas_do_escalonador_acompanham_as_replicas_em_rotacao(monkeypatch):
+    """Uma réplica fora da rotação devolve as suas vagas ao escalonador."""
+    base = settings.SCHEDULER_MAX_CONCURRENCY
+    router = _router(0.0, 0.0)
+    router.on_change = database._resize_scheduler
+    scheduler = FairScheduler(
+        capacity=base,
+        weights=settings.SCHEDULER_WEIGHTS,
+        deadlines_ms=settings.SCHEDULER_DEADLINES_MS,
+    )
+    monkeypatch.setattr(database, "replica_router", router)
+    monkeypatch.setattr(database, "pool_scheduler", scheduler)
+
+    database._resize_scheduler()
+    assert scheduler.capacity == base * 3
+
+    router.mark_unhealthy(router.replicas[0], RuntimeError("fora do ar"))
+    assert scheduler.capacity == base * 2
+
+    # Atraso acima do limite também tira a réplica (e as vagas dela).
+    router.replicas[1].lag_seconds = settings.REPLICA_MAX_LAG_SECONDS + 1
+    database._resize_scheduler()
+    assert scheduler.capacity == base
+
+
+@pytest.mark.replicas
+@pytest.mark.skipif(not settings.DB_REPLICA_URLS, reason="DB_REPLICA_URLS não configurado.")
+async def test_roteamento_com_replica_real():
+    """Com primário e réplica reais: leituras vão à réplica até ela sair da rotação."""
+    await database.connect_to_db()
+    try:
+        replica = database.replica_router.replicas[0]
+        assert replica.healthy and replica.lag_seconds is not None
+
+        routed = database.READ_ROUTING.value(target=replica.name)
+        async with database.read_connection(settings.REPLICA_MAX_LAG_SECONDS) as conn:
+            assert await conn.fetchval("SELECT 1") == 1
+        assert database.READ_ROUTING.value(target=replica.name) == routed + 1
+
+        for other in database.replica_router.replicas:
+            database.replica_router.mark_unhealthy(other, RuntimeError("teste"))
+        fallbacks = database.READ_ROUTING.value(target="primary")
+        async with database.read_connection(settings.REPLICA_MAX_LAG_SECONDS) as conn:
+            assert await conn.fetchval("SELECT pg_is_in_recovery()") is False
+        assert database.READ_ROUTING.value(target="primary") == fallbacks + 1
+    finally:
+        await database.close_db_connection()
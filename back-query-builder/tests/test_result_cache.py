@@ -0,0 +1,100 @@
+from app.api.v1.schemas import QueryRequest
+from app.services.result_cache import ResultCache, canonical_request_key
+
+
+class FakeClock:
+    """Relógio controlável para testar expiração."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_chave_canonica_ignora_ordem():
+    """Métricas, dimensões e filtros em outra ordem geram a mesma chave."""
+    request_a = QueryRequest(
+        metrics=["total_vendas", "total_pedidos"],
+        dimensions=["canal_nome", "loja_nome"],
+        filters=[
+            {"field": "canal_nome", "operator": "eq", "value": "iFood"},
+            {"field": "hora_venda", "operator": "gte", "value": 18},
+        ],
+        dateRange="last_7_days",
+    )
+    request_b = QueryRequest(
+        metrics=["total_pedidos", "total_vendas"],
+        dimensions=["loja_nome", "canal_nome"],
+        filters=[
+            {"field": "hora_venda", "operator": "gte", "value": 18},
+            {"field": "canal_nome", "operator": "eq", "value": "iFood"},
+        ],
+        dateRange="last_7_days",
+    )
+    request_c = QueryRequest(
+        metrics=["total_vendas", "total_pedidos"],
+        dimensions=["canal_nome", "loja_nome"],
+        dateRange="last_30_days",
+    )
+
+    assert canonical_request_key(request_a) == canonical_request_key(request_b)
+    assert canonical_request_key(request_a) != canonical_request_key(request_c)
+
+
+def test_cache_ttl_e_stale_while_revalidate():
+    """Entradas expiradas são servidas como stale até o fim da janela."""
+    clock = FakeClock()
+    cache = ResultCache(max_entries=10, max_bytes=10_000, default_ttl=10, stale_ttl=5, clock=clock)
+
+    cache.set("q", [{"metrics": {"total_vendas": 1}, "dimensions": {}}])
+
+    assert cache.get("q") == ([{"metrics": {"total_vendas": 1}, "dimensions": {}}], False)
+
+    clock.now = 12
+    value, is_stale = cache.get("q")
+    assert value is not None and is_stale
+
+    clock.now = 16
+    assert cache.get("q") == (None, False)
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["stale_hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_cache_lru_respeita_limites():
+    """As entradas menos usadas são removidas ao exceder os limites."""
+    cache = ResultCache(max_entries=2, max_bytes=10_000, default_ttl=60, stale_ttl=0)
+
+    cache.set("a", [1])
+    cache.set("b", [2])
+    cache.get("a")
+    cache.set("c", [3])
+
+    assert cache.get("b") == (None, False)
+    assert cache.get("a") == ([1], False)
+    assert cache.stats()["evictions"] == 1
+
+    small_cache = ResultCache(max_entries=10, max_bytes=8, default_ttl=60, stale_ttl=0)
+    small_cache.set("x", [1, 2])
+    small_cache.set("y", [3, 4])
+
+    assert len(small_cache) == 1
+    assert small_cache.total_bytes <= 8
+
+
+def test_cache_variantes_codificadas():
+    """Variantes ficam presas à entrada que as gerou e contam na memória."""
+    cache = ResultCache(max_entries=10, max_bytes=10_000, default_ttl=60, stale_ttl=0)
+    rows = [{"metrics": {"total_vendas": 1}, "dimensions": {}}]
+
+    cache.set("q", rows)
+    cache.set_variant("q", "rows:gzip", ("gzip", b"abc"), 3, source=rows)
+
+    assert cache.get_variant("q", "rows:gzip") == ("gzip", b"abc")
+    assert cache.total_bytes == len('[{"metrics": {"total_vendas": 1}, "dimensions": {}}]') + 3
+
+    cache.set("q", [{"metrics": {"total_vendas": 2}, "dimensions": {}}])
+    cache.set_variant("q", "rows:gzip", ("gzip", b"old"), 3, source=rows)
+
+    assert cache.get_variant("q", "rows:gzip") is None
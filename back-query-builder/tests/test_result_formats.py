@@ -0,0 +1,94 @@
+import datetime
+import decimal
+import gzip
+import json
+
+from app.services.result_formats import (
+    compress,
+    encode_columnar,
+    encode_csv,
+    encode_json,
+    encode_ndjson,
+    negotiate_encoding,
+    rows_from_records,
+)
+
+
+RECORDS = [
+    {
+        "total_vendas": decimal.Decimal("10.50"),
+        "data_venda": datetime.datetime(2025, 1, 1),
+        "canal_nome": "iFood",
+    },
+    {"total_vendas": None, "data_venda": datetime.datetime(2025, 1, 2), "canal_nome": "Balcão"},
+]
+
+
+def test_encode_ndjson_uma_linha_por_registro():
+    """Cada registro vira uma DataRow em uma linha JSON."""
+    payload = encode_ndjson(RECORDS, ["total_vendas"], ["data_venda", "canal_nome"])
+    lines = payload.decode("utf-8").splitlines()
+
+    assert len(lines) == 2
+    assert json.loads(lines[0]) == {
+        "metrics": {"total_vendas": 10.5},
+        "dimensions": {"data_venda": "2025-01-01T00:00:00", "canal_nome": "iFood"},
+    }
+    assert json.loads(lines[1])["metrics"] == {"total_vendas": None}
+    assert encode_ndjson([], ["total_vendas"], []) == b""
+
+
+def test_encode_csv_com_cabecalho():
+    """O CSV tem cabeçalho opcional e NULL vira campo vazio."""
+    columns = ["total_vendas", "data_venda", "canal_nome"]
+
+    assert encode_csv([], columns, header=True) == b"total_vendas,data_venda,canal_nome\n"
+    assert encode_csv(RECORDS, columns).decode("utf-8") == (
+        "10.50,2025-01-01T00:00:00,iFood\n"
+        ",2025-01-02T00:00:00,Balcão\n"
+    )
+
+
+def test_encode_columnar_com_dicionario():
+    """Dimensões de baixa cardinalidade usam dicionário; as demais não."""
+    data = [
+        {"metrics": {"total_vendas": 10 * i}, "dimensions": {"canal_nome": canal, "data_venda": i}}
+        for i, canal in enumerate(["iFood", "iFood", "Balcão", "iFood"])
+    ]
+
+    result = encode_columnar(data, ["total_vendas"], ["canal_nome", "data_venda"])
+
+    assert result["row_count"] == 4
+    assert [(c["name"], c["role"], c["type"], c["encoding"]) for c in result["columns"]] == [
+        ("total_vendas", "metric", "currency", "plain"),
+        ("canal_nome", "dimension", "category", "dictionary"),
+        ("data_venda", "dimension", "time", "plain"),
+    ]
+    assert result["data"] == {
+        "total_vendas": [0, 10, 20, 30],
+        "canal_nome": {"dictionary": ["iFood", "Balcão"], "indices": [0, 0, 1, 0]},
+        "data_venda": [0, 1, 2, 3],
+    }
+
+
+def test_caminho_rapido_registros_para_bytes():
+    """Decimal vira float por coluna e o JSON sai direto em bytes."""
+    rows = rows_from_records(RECORDS, ["total_vendas"], ["data_venda", "canal_nome"])
+
+    assert rows[0] == {
+        "metrics": {"total_vendas": 10.5},
+        "dimensions": {"data_venda": datetime.datetime(2025, 1, 1), "canal_nome": "iFood"},
+    }
+    assert rows[1]["metrics"] == {"total_vendas": None}
+    assert json.loads(encode_json({"data": rows}))["data"][0]["dimensions"] == {
+        "data_venda": "2025-01-01T00:00:00",
+        "canal_nome": "iFood",
+    }
+
+    # Decimal sai como número JSON, não como a string do pydantic ("10.50").
+    assert b'"metrics":{"total_vendas":10.5}' in encode_json({"data": rows})
+
+    assert negotiate_encoding("br, gzip;q=0.8") == "gzip"
+    assert negotiate_encoding("gzip;q=0") == "identity"
+    assert negotiate_encoding("") == "identity"
+    assert gzip.decompress(compress(b"{}", "gzip")) == b"{}"
@@ -0,0 +1,151 @@
+import datetime
+from contextlib import asynccontextmanager
+
+import asyncpg
+import pytest
+
+from app.services import query_engine, rollup_refresh
+from app.services.rollup_refresh import _create_table_sql, _delete_stale_sql, _upsert_sql
+from app.services.semantic_layer import ROLLUPS
+
+DAYS = [datetime.date(2025, 1, 1), datetime.date(2025, 1, 2), datetime.date(2025, 1, 3)]
+NEW_WATERMARK = datetime.datetime(2025, 1, 3, 18, 30, tzinfo=datetime.timezone.utc)
+
+
+class FakeConnection:
+    """
+    Conexão que responde às consultas da refresh e guarda os comandos de
+    cada transação: os de uma transação que falhou são descartados.
+    """
+
+    def __init__(self, locked=True, fail_on_day=None):
+        self.locked = locked
+        self.fail_on_day = fail_on_day
+        self.committed = []
+        self.state_writes = []
+        self.unlocked = False
+        self._transaction = None
+
+    async def fetchval(self, sql, *args):
+        if "pg_try_advisory_lock" in sql:
+            return self.locked
+        if "SELECT watermark" in sql:
+            return None
+        if "MAX(sales.created_at)" in sql:
+            return NEW_WATERMARK
+        raise AssertionError(f"Consulta inesperada: {sql}")
+
+    async def fetch(self, sql, *args):
+        return [{"day": day} for day in DAYS]
+
+    async def fetchrow(self, sql, *args):
+        self.state_writes.append(args)
+        return {"lag_seconds": 60.0, "covered_until": NEW_WATERMARK.date()}
+
+    async def execute(self, sql, *args):
+        if "pg_advisory_unlock" in sql:
+            self.unlocked = True
+            return
+        if sql.startswith("INSERT") and args[0] == self.fail_on_day:
+            raise asyncpg.exceptions.DeadlockDetectedError("deadlock detected")
+        self._transaction.append((sql.split()[0], args))
+
+    @asynccontextmanager
+    async def transaction(self):
+        self._transaction = []
+        yield
+        self.committed.extend(self._transaction)
+
+
+@pytest.fixture
+def fake_connection(monkeypatch):
+    """Substitui o pool pela conexão falsa, com as tabelas já criadas."""
+    holder = {}
+
+    @asynccontextmanager
+    async def scheduled_connection(query_class, client_id):
+        conn = holder["conn"]
+        conn.query_classes.append(query_class)
+        yield conn
+
+    monkeypatch.setattr(rollup_refresh, "scheduled_connection", scheduled_connection)
+    monkeypatch.setattr(rollup_refresh, "_tables_ready", True)
+    monkeypatch.setattr(query_engine, "rollup_coverage", {})
+
+    def use(conn):
+        conn.query_classes = []
+        holder["conn"] = conn
+        return conn
+
+    return use
+
+
+def test_rollup_upsert_recalcula_um_dia():
+    """O upsert agrega `sales` de um dia pelo grão do rollup."""
+    rollup = ROLLUPS["sales_daily_store_channel"]
+
+    sql = _upsert_sql(rollup)
+
+    assert sql.startswith(
+        "INSERT INTO rollup_sales_daily_store_channel (sale_date, store_id, channel_id,"
+    )
+    assert "WHERE sales.created_at >= $1::date AND sales.created_at < $2::date" in sql
+    assert "GROUP BY DATE(sales.created_at), sales.store_id, sales.channel_id" in sql
+    assert "ON CONFLICT (sale_date, store_id, channel_id) DO UPDATE SET" in sql
+    assert "refreshed_at = EXCLUDED.refreshed_at" in sql
+
+    ddl = _create_table_sql(rollup)
+    assert "PRIMARY KEY (sale_date, store_id, channel_id)" in ddl
+    assert "sales_count BIGINT" in ddl
+
+    assert _delete_stale_sql(rollup) == (
+        "DELETE FROM rollup_sales_daily_store_channel "
+        "WHERE sale_date = $1 AND refreshed_at < $2::timestamptz"
+    )
+
+
+async def test_refresh_ignora_rollup_com_lock_de_outra_execucao(fake_connection):
+    """Sem o advisory lock outra refresh está em andamento: nada é gravado."""
+    conn = fake_connection(FakeConnection(locked=False))
+
+    assert await rollup_refresh.refresh_rollup("sales_daily") is None
+    assert conn.committed == [] and conn.state_writes == []
+    assert "sales_daily" not in query_engine.rollup_coverage
+
+
+async def test_refresh_recalcula_cada_dia_e_remove_chaves_que_sumiram(fake_connection):
+    """Cada dia tem upsert e remoção das chaves antigas na mesma transação."""
+    conn = fake_connection(FakeConnection())
+
+    stats = await rollup_refresh.refresh_rollup("sales_daily")
+
+    run_at = conn.committed[0][1][2]
+    assert conn.committed == [
+        command
+        for day in DAYS
+        for command in (
+            ("INSERT", (day, day + datetime.timedelta(days=1), run_at)),
+            ("DELETE", (day, run_at)),
+        )
+    ]
+    assert conn.state_writes[0][:2] == ("sales_daily", NEW_WATERMARK)
+    assert stats["buckets"] == 3
+    assert query_engine.rollup_coverage["sales_daily"] == NEW_WATERMARK.date()
+    assert conn.unlocked
+    assert conn.query_classes == ["background"]
+
+
+async def test_falha_em_um_dia_mantem_o_watermark(fake_connection):
+    """
+    Um dia que falha interrompe a refresh sem avançar o watermark: a
+    próxima execução recalcula a partir do mesmo ponto.
+    """
+    conn = fake_connection(FakeConnection(fail_on_day=DAYS[1]))
+
+    with pytest.raises(asyncpg.exceptions.DeadlockDetectedError):
+        await rollup_refresh.refresh_rollup("sales_daily")
+
+    assert [args[0] for _, args in conn.committed] == [DAYS[0], DAYS[0]]
+    assert conn.state_writes == []
+    assert "sales_daily" not in query_engine.rollup_coverage
+    assert conn.unlocked
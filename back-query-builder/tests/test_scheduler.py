@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from app.core.scheduler import FairScheduler, QueueShedError
+
+WEIGHTS = {"interactive": 3.0, "export": 1.0}
+DEADLINES_MS = {"interactive": 60_000, "export": 60_000}
+
+
+async def test_escalonador_divide_vagas_por_peso_e_cliente():
+    """Com fila nas duas classes, interactive recebe 3 vagas para cada 1 de export,
+    e os clientes de uma mesma classe são atendidos em rodízio."""
+    scheduler = FairScheduler(capacity=1, weights=WEIGHTS, deadlines_ms=DEADLINES_MS)
+    holder = await scheduler.acquire("interactive", "a")
+    order = []
+
+    async def request(query_class, client_id):
+        granted_at = await scheduler.acquire(query_class, client_id)
+        order.append((query_class, client_id))
+        scheduler.release(granted_at)
+
+    tasks = [asyncio.create_task(request("export", "e")) for _ in range(2)]
+    tasks += [asyncio.create_task(request("interactive", "a")) for _ in range(3)]
+    tasks += [asyncio.create_task(request("interactive", "b")) for _ in range(3)]
+    await asyncio.sleep(0)
+
+    assert scheduler.stats()["classes"]["interactive"]["depth"] == 6
+
+    scheduler.release(holder)
+    await asyncio.gather(*tasks)
+
+    assert [query_class for query_class, _ in order[:4]].count("interactive") == 3
+    assert [client for query_class, client in order if query_class == "interactive"] == [
+        "a", "b", "a", "b", "a", "b"
+    ]
+    assert scheduler.stats()["in_use"] == 0
+
+
+async def test_escalonador_descarta_pedidos_que_perderiam_o_prazo():
+    """Pedidos sem vaga dentro do prazo da classe são descartados."""
+    scheduler = FairScheduler(
+        capacity=1, weights=WEIGHTS, deadlines_ms={"interactive": 20, "export": 20}
+    )
+    holder = await scheduler.acquire("interactive", "a")
+
+    with pytest.raises(QueueShedError):
+        await scheduler.acquire("interactive", "b")
+
+    stats = scheduler.stats()["classes"]["interactive"]
+    assert stats["shed"] == 1
+    assert stats["depth"] == 0
+
+    scheduler.release(holder)
+    assert scheduler.stats()["in_use"] == 0
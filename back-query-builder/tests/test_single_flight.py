@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from app.services.single_flight import SingleFlight
+
+
+async def test_single_flight_compartilha_execucao():
+    """Chamadas concorrentes com a mesma chave executam uma vez só."""
+    flights = SingleFlight()
+    release = asyncio.Event()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return [1, 2, 3]
+
+    waiters = [asyncio.create_task(flights.run("q", load)) for _ in range(3)]
+    await asyncio.sleep(0)
+
+    assert flights.stats()["waiters"] == 3
+
+    release.set()
+    results = await asyncio.gather(*waiters)
+
+    assert results == [[1, 2, 3]] * 3
+    assert calls == 1
+    assert flights.stats() == {"in_flight": 0, "waiters": 0, "executions": 1, "coalesced": 2}
+
+
+async def test_single_flight_cancelamento_isolado():
+    """Cancelar um chamador não cancela a execução compartilhada."""
+    flights = SingleFlight()
+    release = asyncio.Event()
+
+    async def load():
+        await release.wait()
+        return "ok"
+
+    first = asyncio.create_task(flights.run("q", load))
+    second = asyncio.create_task(flights.run("q", load))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+    release.set()
+    assert await second == "ok"
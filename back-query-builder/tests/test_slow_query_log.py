@@ -0,0 +1,82 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from app.api.v1.schemas import QueryRequest
+from app.services import slow_query_log as slow_query_module
+from app.services.slow_query_log import SlowQueryLog
+
+REQUEST = QueryRequest(metrics=["total_vendas"], dimensions=["canal_nome"])
+
+
+class FakeTransaction:
+    async def start(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+class FakeConnection:
+    """Conexão que responde ao EXPLAIN ANALYZE com um plano fixo."""
+
+    def __init__(self):
+        self.sql = None
+
+    def transaction(self, readonly=False):
+        return FakeTransaction()
+
+    async def fetchval(self, sql, *params):
+        self.sql = sql
+        return '[{"Plan": {"Node Type": "Seq Scan"}, "Execution Time": 1500.0}]'
+
+
+def test_log_guarda_so_queries_lentas_em_buffer_circular():
+    """Só queries acima do limite entram, e o buffer mantém as mais recentes."""
+    log = SlowQueryLog(max_entries=2, threshold_ms=100, explain_sample_rate=0.0)
+
+    assert log.observe(REQUEST, "SELECT 1", [], 50, "interactive") is None
+    for duration in (150, 200, 250):
+        log.observe(REQUEST, "SELECT 1", [], duration, "interactive")
+
+    entries = log.entries()
+    assert [entry["duration_ms"] for entry in entries] == [250, 200]
+    assert entries[0]["request"]["metrics"] == ["total_vendas"]
+    assert entries[0]["explain"] is None
+
+
+async def test_log_captura_explain_analyze_amostrado(monkeypatch):
+    """Queries lentas amostradas são reexecutadas com EXPLAIN (ANALYZE, BUFFERS)."""
+    conn = FakeConnection()
+
+    classes = []
+
+    @asynccontextmanager
+    async def fake_scheduled(query_class, client_id):
+        classes.append(query_class)
+        yield conn
+
+    monkeypatch.setattr(slow_query_module, "scheduled_connection", fake_scheduled)
+    log = SlowQueryLog(max_entries=10, threshold_ms=100, explain_sample_rate=1.0)
+
+    entry = log.observe(REQUEST, "SELECT 1", [], 1500, "interactive")
+    assert entry["explain"] == {"status": "pending"}
+
+    await asyncio.gather(*log._tasks)
+
+    assert conn.sql == "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) SELECT 1"
+    assert classes == ["background"]
+    assert entry["explain"]["status"] == "done"
+    assert entry["explain"]["plan"]["Execution Time"] == 1500.0
+
+
+def test_log_limita_os_explains_simultaneos():
+    """Com o limite atingido, outras queries lentas não disparam EXPLAIN."""
+    log = SlowQueryLog(
+        max_entries=10, threshold_ms=100, explain_sample_rate=1.0, max_concurrent_explains=1
+    )
+    log._explaining.add("outro-formato")
+
+    entry = log.observe(REQUEST, "SELECT 1", [], 1500, "interactive")
+
+    assert entry["explain"] is None
+    assert not log._tasks
@@ -0,0 +1,95 @@
+from contextlib import asynccontextmanager
+
+import asyncpg
+import pytest
+
+from app.api.v1.endpoints import _stream_rows
+from app.api.v1.schemas import QueryRequest, StreamFormat
+
+REQUEST = QueryRequest(metrics=["total_vendas"], dimensions=["canal_nome"])
+
+
+class FakeCursor:
+    """Cursor que devolve os lotes dados e, se houver, falha depois deles."""
+
+    def __init__(self, batches, error=None):
+        self.batches = list(batches)
+        self.error = error
+
+    async def fetch(self, count):
+        if self.batches:
+            return self.batches.pop(0)
+        if self.error:
+            raise self.error
+        return []
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    @asynccontextmanager
+    async def transaction(self, readonly=False):
+        yield
+
+    async def cursor(self, sql, *params):
+        return self._cursor
+
+
+def fake_connect(cursor):
+    """Fábrica de conexões que registra a classe de cada vaga pedida."""
+    classes = []
+
+    @asynccontextmanager
+    async def connect(query_class="interactive"):
+        classes.append(query_class)
+        yield FakeConnection(cursor)
+
+    return connect, classes
+
+
+async def _collect(rows):
+    return [chunk async for chunk in rows]
+
+
+async def test_streaming_usa_uma_unica_vaga_de_export():
+    """Admissão e cursor dividem a mesma vaga e a mesma conexão."""
+    batches = [[{"total_vendas": 10, "canal_nome": "iFood"}]]
+    connect, classes = fake_connect(FakeCursor(batches))
+
+    chunks = await _collect(_stream_rows(connect, REQUEST, "SELECT 1", [], StreamFormat.NDJSON))
+
+    assert classes == ["export"]
+    assert chunks[0] == b""
+    assert b"iFood" in b"".join(chunks)
+
+
+async def test_streaming_ndjson_termina_com_o_erro():
+    """Um erro no meio do cursor vira a última linha do NDJSON."""
+    cursor = FakeCursor(
+        [[{"total_vendas": 10, "canal_nome": "iFood"}]],
+        error=asyncpg.exceptions.QueryCanceledError("canceling statement due to statement timeout"),
+    )
+    connect, _ = fake_connect(cursor)
+
+    chunks = await _collect(_stream_rows(connect, REQUEST, "SELECT 1", [], StreamFormat.NDJSON))
+
+    assert b"statement timeout" in chunks[-1]
+    assert chunks[-1].startswith(b'{"error"')
+
+
+async def test_streaming_csv_interrompe_a_resposta_no_erro():
+    """O CSV não tem como sinalizar o erro: a resposta é interrompida, não truncada."""
+    cursor = FakeCursor(
+        [[{"total_vendas": 10, "canal_nome": "iFood"}]],
+        error=asyncpg.exceptions.QueryCanceledError("canceling statement due to statement timeout"),
+    )
+    connect, _ = fake_connect(cursor)
+    rows = _stream_rows(connect, REQUEST, "SELECT 1", [], StreamFormat.CSV)
+
+    chunks = []
+    with pytest.raises(asyncpg.exceptions.QueryCanceledError):
+        async for chunk in rows:
+            chunks.append(chunk)
+
+    assert chunks[1].startswith(b"total_vendas,canal_nome")
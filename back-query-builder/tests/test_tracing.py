@@ -0,0 +1,64 @@
+import json
+import logging
+import threading
+
+from app.core.config import settings
+from app.core.tracing import close_span_exporter, request_trace, stage, traced
+
+
+@traced("plan")
+def build_plan():
+    with stage("cache"):
+        return "SELECT 1"
+
+
+def test_server_timing_soma_etapas_e_encadeia_spans():
+    """Cada etapa vira um span filho da etapa em volta e entra no Server-Timing."""
+    with request_trace("POST /api/v1/query") as trace:
+        build_plan()
+        build_plan()
+
+    names = [span.name for span in trace.spans]
+    assert names == ["cache", "plan", "cache", "plan", "total"]
+
+    spans = {span.span_id: span for span in trace.spans}
+    cache, plan, total = trace.spans[0], trace.spans[1], trace.spans[-1]
+    assert spans[cache.parent_id] is plan
+    assert spans[plan.parent_id] is total
+    assert total.parent_id is None
+
+    header = trace.server_timing()
+    assert header.split(", ")[0].startswith("cache;dur=")
+    assert [part.split(";")[0] for part in header.split(", ")] == ["cache", "plan", "total"]
+
+
+def test_etapas_fora_de_requisicao_nao_fazem_nada():
+    """Sem requisição em andamento (ex: CLI), as etapas só executam o código."""
+    assert build_plan() == "SELECT 1"
+
+
+def test_exportador_file_escreve_os_spans_fora_da_thread_da_requisicao(monkeypatch, tmp_path):
+    """Os spans vão para uma fila; a thread do QueueListener escreve o arquivo."""
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(settings, "TRACING_EXPORTER", "file")
+    monkeypatch.setattr(settings, "TRACING_FILE_PATH", str(path))
+
+    writer_threads = []
+    emit = logging.FileHandler.emit
+
+    def recording_emit(handler, record):
+        writer_threads.append(threading.current_thread())
+        emit(handler, record)
+
+    monkeypatch.setattr(logging.FileHandler, "emit", recording_emit)
+
+    try:
+        with request_trace("POST /api/v1/query") as trace:
+            build_plan()
+    finally:
+        close_span_exporter()
+
+    spans = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [span["name"] for span in spans] == ["cache", "plan", "total"]
+    assert {span["trace_id"] for span in spans} == {trace.trace_id}
+    assert writer_threads and threading.current_thread() not in writer_threads